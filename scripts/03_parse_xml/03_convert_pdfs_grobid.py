@@ -0,0 +1,47 @@
+"""
+Project: Theory Discourse Analysis
+
+Convert PDF files to TEI XML with a GROBID service, as input for the 04 to 06 stages.
+
+Purpose:
+- Turn the locally stored PDFs (data_raw/pdfs) into the TEI corpus (data_xml/grobid_output)
+- Make reruns after adding PDFs or after an interruption convert only what is missing
+
+Inputs:
+- Directory containing PDF files
+- A running GROBID service (--grobid_url)
+
+Outputs:
+- One TEI XML file per converted PDF
+  (written to: <output_dir>/<pdf name without .pdf>.grobid.tei.xml)
+- Record of every conversion with PDF filename, MD5, TEI filename, and status
+  (written to: grobid_conversions.jsonl beside <output_dir>, or --journal)
+- Log file capturing run metadata, skipped PDFs, retries, and failures
+  (written to: the journal path with .log instead of .jsonl)
+
+Notes:
+- PDFs are sent to /api/processFulltextDocument over one pooled HTTP session, at most
+  --concurrency at a time; keep it at or below the concurrency of the GROBID server
+- Busy answers (503, as GROBID answers when its pool is exhausted, and 429/502/504),
+  connection errors, and timeouts are retried with exponential backoff (--max_tries);
+  PDFs GROBID rejects are recorded as failed and tried again on the next run
+- A PDF is skipped when its MD5 already has a TEI output: either a TEI file in the output
+  directory whose <idno type="MD5"> (written by GROBID) matches, or a conversion recorded in
+  the journal, so TEI files removed later by the 04 filters are not recreated. PDFs with the
+  same content under different names are converted once. --force converts everything again
+- The journal and log stay out of the output directory, which later stages read as the corpus
+- Each TEI file is written atomically and journaled right after it is written, so an
+  interrupted run resumes where it stopped
+- Test without GROBID against the stub in scripts/tda/grobid_stub.py, which returns canned TEI
+- The logic lives in scripts/tda/stages/convert_pdfs.py (importable; run(args) returns a summary)
+"""
+
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tda.stages.convert_pdfs import parser, run
+
+if __name__ == "__main__":
+    run(parser.parse_args())
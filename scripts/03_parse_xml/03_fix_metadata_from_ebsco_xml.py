@@ -16,16 +16,25 @@ Outputs:
 - CSV file with reconstructed metadata fields populated where matches are found
 
 Notes:
-- Matching is heuristic (substring-based DOI/title matching)
+- Matching is heuristic: exact DOI match on normalised identifiers first, then the CSV title
+  contained (as whole words) in the title of exactly one EBSCO record
+- The export is indexed once (tda/ebsco.py): identifiers in a hash map and title tokens in
+  an inverted index used for blocking, so each row is an O(1) lookup instead of two XPath scans
+- Matched fields are written with one vectorised assignment per column
 - Assumes EBSCO XML structure used by standard exports
 - Intended for corpus preparation, not authoritative bibliographic correction
 """
 
 
-import pandas as pd
-from lxml import etree
+import os
+import sys
 import argparse
 
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tda.ebsco import EbscoIndex, read_ebsco_records
+
 parser = argparse.ArgumentParser(
     description="Reconstruct missing article metadata from EBSCO XML records"
 )
@@ -38,10 +47,39 @@ parser.add_argument("--output_csv", type=str, required=True,
                     help="Output CSV with reconstructed metadata")
 
 
-def get_infos_by_doi(root, doi):
-    # Optional helper; safe because root is passed in
-    doi_el = root.find(f".//ui[.='{doi}']")
-    return doi_el
+def match_records(df, index):
+    """Position of the matching EBSCO record for every row (NaN where there is none)."""
+    dois = df["DOI"] if "DOI" in df.columns else pd.Series(None, index=df.index, dtype=object)
+    titles = df["title"] if "title" in df.columns else pd.Series(None, index=df.index, dtype=object)
+
+    positions = dois.map(index.find_doi).astype(float)
+    unmatched = positions.isna()
+    positions[unmatched] = titles[unmatched].map(index.find_title).astype(float)
+    return positions
+
+
+def reconstruct_metadata(df, index):
+    """Fill title, authors, and date of matched rows; returns the number of unmatched rows."""
+    if "date" not in df.columns:
+        df["date"] = ""
+    if "authors" not in df.columns:
+        df["authors"] = ""
+
+    positions = match_records(df, index)
+    matched = positions.notna()
+    records = pd.DataFrame(index.records, columns=["title", "authors", "date"]).iloc[positions[matched].astype(int)]
+    records.index = df.index[matched]
+    records["authors"] = records["authors"].map(lambda authors: ', \n'.join(authors) if authors else None)
+
+    # keep existing values where the EBSCO record lacks the field
+    for column in ["title", "authors", "date"]:
+        values = records[column].dropna()
+        if column not in df.columns:
+            df[column] = None
+        df[column] = df[column].astype(object)
+        df.loc[values.index, column] = values
+
+    return int((~matched).sum())
 
 
 if __name__ == "__main__":
@@ -53,53 +91,10 @@ if __name__ == "__main__":
     print(f"  Output CSV:  {args.output_csv}")
 
     df = pd.read_csv(args.input_csv)
-    tree = etree.parse(args.ebsco_xml)
-    root = tree.getroot()
-
-    if "date" not in df.columns:
-        df["date"] = ""
-    if "authors" not in df.columns:
-        df["authors"] = ""
+    index = EbscoIndex(read_ebsco_records(args.ebsco_xml))
+    print(f"Indexed EBSCO records: {len(index)}")
 
-    missing_matches = 0
-
-    for i, row in df.iterrows():
-        doi = str(row.get("DOI", "")).lower()
-
-        doiEle = root.xpath(
-            f'.//ui[contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "{doi}")]'
-        )
-        doiEle = doiEle[0] if len(doiEle) == 1 else None
-
-        title = str(row.get("title", "")).lower().replace('"', '')
-        titleEle = root.xpath(
-            f'.//btl[contains(translate(., "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"), "{title}")]'
-        )
-        titleEle = titleEle[0] if len(titleEle) == 1 else None
-
-        if doiEle is not None:
-            control_info = doiEle.getparent().getparent()
-        elif titleEle is not None:
-            control_info = titleEle.getparent().getparent()
-        else:
-            missing_matches += 1
-            continue
-
-        title_el = control_info.find('.//atl')
-        df.at[i, 'title'] = title_el.text if title_el is not None and title_el.text else df.at[i, 'title']
-
-        author_els = control_info.findall('.//au')
-        authors = [a.text for a in author_els if a is not None and a.text]
-        if authors:
-            df.at[i, 'authors'] = ', \n'.join(authors)
-
-        dt_el = control_info.find('.//dt')
-        if dt_el is not None and isinstance(dt_el.attrib, dict):
-            year = dt_el.attrib.get("year")
-            month = dt_el.attrib.get("month")
-            day = dt_el.attrib.get("day")
-            if year and month and day:
-                df.at[i, 'date'] = f"{year}-{month}-{day}"
+    missing_matches = reconstruct_metadata(df, index)
 
     print(f"Unmatched rows: {missing_matches}")
     df.to_csv(args.output_csv, index=False)
@@ -2,7 +2,7 @@
 Project: Theory Discourse Analysis
 
 Identify and remove duplicate article XML files based on embedded MD5 identifiers
-in TEI-encoded full-text documents.
+in TEI-encoded full-text documents, and optionally near-duplicates based on their text.
 
 Purpose:
 - Detect duplicate articles produced during bulk XML ingestion (e.g., via GROBID or EBSCO exports)
@@ -13,55 +13,30 @@ Inputs:
 
 Outputs:
 - Duplicate XML files are deleted in-place from the input directory
+- With --near_duplicates, clusters of near-duplicate articles are printed and, with --report,
+  written to a CSV (cluster, filename, kept, match, similarity); they are only deleted
+  with --remove_near_duplicates
 
 Notes:
-- Deduplication relies on the presence and correctness of MD5 identifiers in TEI headers
+- Deduplication relies on the presence and correctness of MD5 identifiers in TEI headers;
+  files without one fall back to a hash of their normalised text (tda.tei.read_article_key)
+- Near-duplicates (e.g., the same paper from two slightly different PDFs) are found with
+  MinHash/LSH over word shingles of the paragraph texts (tda/minhash.py); a pair is a
+  near-duplicate if its estimated Jaccard similarity reaches --threshold
+- Files are parsed in parallel (--workers); files that cannot be parsed are reported and kept
+- With --index, MD5 identifiers are read from the persistent corpus index (tda/corpus_index.py),
+  which only re-parses new or changed files
+- Files are visited in sorted filename order, so the same file of a duplicate group is kept on every run
 - Intended as a preprocessing step prior to text extraction and stance classification
+- The logic lives in scripts/tda/stages/deduplicate.py (importable; run(args, index=...))
 """
 
 
-import xml.etree.ElementTree as ET
 import os
-from tqdm import tqdm
+import sys
 
-# assign directory
-# adapt directories to your needs
-import argparse
-parser = argparse.ArgumentParser()
-parser.add_argument("-i", "--input_dir", required=True, help="Directory containing TEI XML files")
-args = parser.parse_args()
-articles_directory = args.input_dir
-
-def filter_duplicate_articles(directory):
-  i = 0
-  files = os.listdir(directory)
-  seen = set()
-  duplicate_files = []
-
-  # iterate over files in that directory
-  for filename in tqdm(files):
-    if filename.endswith(".xml"):
-      # print(directory, filename)
-      file = os.path.join(directory, filename)
-      # checking if it is a file
-      tree = ET.parse(file)
-      root = tree.getroot()
-      # MD5 hash used as content-based article identifier
-      article_hash = root.find(".//{http://www.tei-c.org/ns/1.0}idno[@type='MD5']").text
-      i += 1
-      if article_hash not in seen:
-        seen.add(article_hash)
-      else:
-        duplicate_files.append(filename)
-
-  print("Total files: ", i)
-  print("Duplicate files: ", len(duplicate_files))
-  return duplicate_files
-
-def remove_duplicate_articles(duplicates):
-  for duplicate in duplicates:
-    os.remove(os.path.join(articles_directory, duplicate))
-
-duplicates = filter_duplicate_articles(articles_directory)
-remove_duplicate_articles(duplicates)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tda.stages.deduplicate import parser, run
 
+if __name__ == "__main__":
+    run(parser.parse_args())
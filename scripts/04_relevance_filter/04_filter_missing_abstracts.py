@@ -15,35 +15,19 @@ Outputs:
 
 Notes:
 - Assumes TEI-compliant XML structure with namespace http://www.tei-c.org/ns/1.0
+- With --index, abstract flags are read from the persistent corpus index (tda/corpus_index.py),
+  which only re-parses new or changed files
+- Files are parsed in parallel (--workers); files that cannot be parsed are reported and kept
 - Intended as an early preprocessing step prior to relevance screening and text extraction
+- The logic lives in scripts/tda/stages/missing_abstracts.py (importable; run(args, index=...))
 """
 
 
-import xml.etree.ElementTree as ET
 import os
+import sys
 
-# assign directory
-import argparse
-parser = argparse.ArgumentParser()
-parser.add_argument("-i", "--input_dir", required=True, help="Directory containing TEI XML files")
-args = parser.parse_args()
-articles_directory = args.input_dir
-
-no_abstract_files = []
-files = os.listdir(articles_directory)
-
-# iterate over files in that directory
-for filename in files:
-  if filename.endswith(".xml"):
-    # print(directory, filename)
-    file = os.path.join(articles_directory, filename)
-    # checking if it is a file
-    tree = ET.parse(file)
-    root = tree.getroot()
-    abstract = root.find(".//{http://www.tei-c.org/ns/1.0}abstract")
-
-    if abstract is None or abstract.text is None:
-      no_abstract_files.append(filename)
-
-for file in no_abstract_files:
-    os.remove(os.path.join(articles_directory, file))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tda.stages.missing_abstracts import parser, run
+
+if __name__ == "__main__":
+    run(parser.parse_args())
@@ -0,0 +1,30 @@
+"""
+Project: Theory Discourse Analysis
+
+Keep the articles the relevance screening rated as relevant, so that only these are
+stance-classified.
+
+Inputs:
+- CSV file written by 04_screen_relevance_gpt4.py (one row per article with mean_rating_relevance)
+
+Outputs:
+- CSV file with the rows whose mean_rating_relevance is at least --threshold, in the input
+  layout (written to: <output>); input for 06_classify_stance_abstracts_gpt4.py and for
+  05_embed_paragraphs.py --filenames
+
+Notes:
+- mean_rating_relevance is the share of "relevant" ratings (0 to 1); articles decided by the
+  relevance cascade have 0 or 1
+- Articles without any valid rating ("NA") are dropped
+- The logic lives in scripts/tda/stages/filter_relevant.py (importable; run(args, df_in=...) returns the table)
+"""
+
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tda.stages.filter_relevant import parser, run
+
+if __name__ == "__main__":
+    run(parser.parse_args())
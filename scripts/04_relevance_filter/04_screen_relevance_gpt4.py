@@ -6,230 +6,57 @@ Screen article abstracts for conceptual relevance to a target theory using LLM-a
 Outputs:
 - CSV file with per-article relevance ratings, rationales, and mean relevance score
   (written to: <output>/<output_filename>.csv)
+- Append-only JSONL journal with one record per completed request
+  (written to: <output>/<output_filename>.jsonl)
 - Log file capturing run metadata and backoff events
   (written to: <output>/<output_filename>.log)
+- With --telemetry, one JSON line per completion call (latency, limiter wait, tokens, retries,
+  backoff time, cache hit) and an end-of-run summary in Prometheus text format
+  (written to: <telemetry> and <telemetry>.prom; see scripts/tda/telemetry.py)
 
 Notes:
 - Uses the OpenAI ChatCompletions API to label abstracts as "relevant" vs "irrelevant"
 - Designed as an annotation aid: automated labels should be reviewed by an expert
 - For reproducibility, record the model name, temperature, and evaluation window
 - Requires an API key in the environment (e.g., GPT4_KEY) and local TEI XML inputs
+- With --async_requests, all articles and iterations are submitted concurrently
+  (bounded by --concurrency and the --rpm/--tpm limits); the output CSV is identical
+  to the serial path and is written once at the end
+- With --early_stop, an article stops receiving iterations once at least --min_iterations
+  ratings are in and the modal rating reaches the --agreement share; the number of calls
+  actually made is recorded per article in n_calls_relevance
+- --batch_export writes every request (tagged with filename and iteration) to one JSONL
+  file for a bulk endpoint without calling the API; --batch_ingest reads the matching
+  results file back into the journal and CSV (see scripts/tda/batch.py)
+- The CSV is materialised from the journal once at the end of a run; after a crash,
+  rerun with --resume to skip filenames and iterations that already completed
+- With --index, article metadata is read from the persistent corpus index
+  (scripts/tda/corpus_index.py), which only re-parses new or changed TEI files
+- With --pack_size N > 1, N abstracts are sent per request with stable item IDs and the
+  model answers with one JSON object per abstract, so the long system prompt is paid once
+  per pack instead of once per abstract; abstracts missing from a packed answer are
+  retried individually (see scripts/tda/packing.py). Packing is not available for the
+  batch modes
+- Labels are read with a tolerant extractor (scripts/tda/labels.py); only answers without a
+  recognisable label are re-asked, at most --max_reasks times, and the number of re-asks is
+  reported at the end of the run
+- With --cascade MODEL, a local TF-IDF + logistic regression model (trained with
+  04_train_relevance_cascade.py, see scripts/tda/cascade.py) decides abstracts with a
+  predicted relevance probability <= --cascade_low (irrelevant) or >= --cascade_high
+  (relevant) without any API call; only the uncertain band (and articles without an abstract)
+  is sent to the LLM. Auto-decided articles get mean_rating_relevance 0 or 1 and
+  n_calls_relevance 0, and every article gets cascade_probability and cascade_decision
+  ("irrelevant", "relevant", or "llm"); the number of avoided calls is reported
+- --api_base redirects requests, e.g. to a local mock server (scripts/tda/mock_server.py)
+- The logic lives in scripts/tda/stages/relevance.py (importable; run(args, index=...) returns the table)
 """
 
 
-import os 
-import xml.etree.ElementTree as ET
-import pandas as pd
-import openai
-import backoff
-from tqdm import tqdm
-import argparse
-import numpy as np
-from openai.error import OpenAIError
-import logging
-from dotenv import load_dotenv
-
-# create argument parser
-parser = argparse.ArgumentParser()
-parser.add_argument("--model", type=str, default="gpt-4", help="OpenAI model name")
-parser.add_argument("--output_filename", type=str, required=True, help="Base name for output CSV/log")
-parser.add_argument("-i", "--input", type=str, required=True, help="directory with input files")
-parser.add_argument("-o", "--output", type=str, required=True, help="directory of output file")
-parser.add_argument("-iter", "--iterations", type=int, required=False, default=10, help="number of iterations per article")
-args = parser.parse_args()
-
-os.makedirs(args.output, exist_ok=True)
-
-out_log = os.path.join(args.output, f"{args.output_filename}.log")
-out_csv = os.path.join(args.output, f"{args.output_filename}.csv")
-
-logging.basicConfig(filename=out_log,
-                    format="%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s",
-                    datefmt="%H:%M:%S",
-                    filemode="w",
-                    level=logging.DEBUG)
-
-logger = logging.getLogger('rating_log')
-
-openai.util.logger.setLevel(logging.INFO)
-logging.getLogger("urllib3").setLevel(logging.INFO)
-
-QUERY = """Human rates will be given a set of scientific articles, and they will have to categorize each article into four categories, \
-        depending on how they relate to the concept of memory decay. The concept of memory decay in psychology describe the theory that \
-        memories traces are stored with an initial strength value and that this strength decays passively over time unless it is reactivated. \
-        They will receive the following instructions: Instructions for human raters: You will read an article about human memory and you \
-        should classify each article depending on how it discusses the idea that the strength of memories decay passively over time. \
-        You can assign one of four categories to the text. Use the following questions in this order to assign the categories: - \
-        Does the text disagree with the idea that memory decay exists or disagree with the idea that it is the major cause of forgetting? \
-        If so, respond 'against'. \
-        Only assign this category if the text explicitly rejects all forms of memory decay, rather than just some version of it. \
-        Does the article implicitly assume that the concept of memory decay is true and then builds on it? If so, respond 'tacit_acceptance'. \
-        Assign this category if the text doesn't explicitly mention or discuss evidence for or against the general idea. \
-        Does the article explicitly agree with or provide evidence for the idea that memory decays over time? If so, respond 'support'. \
-        Only assign this category if the text specifically discusses evidence for the idea, or explicitly agrees that the idea is true. \
-        Does the text explicitly mention memory decay as one of several possibilities without discussing evidence for or against or without \
-        assuming it's true? If so, respond 'neutral'. \
-        Only assign this category if 'tacit_acceptance' doesn't fit.\n\n \
-        We first have to select which articles to present to human raters. We only want to show them articles that can be categorized in one \
-        of the categories above. If articles cannot be categorized in one of the categories above, they are irrelevant. We have several thousand \
-        scientific articles, but many of them are not relevant for the QUERY above. Some articles are irrelevant because they are done with \
-        non-human animals. Others are irrelevant because they do not mention memory decay explicitly. \Others are irrelevant because they discuss \
-        degradation of memory in old age. We will give you an abstract and your task is to rate the abstract as relevant or irrelevant for the \
-        human raters. Provide a clear category label ("relevant" or "irrelevant") on the first line for the abstract below followed by your rationale in a new paragraph."""
-
-
-def log_backoff_exception(details):
-    details["filename"] = details["kwargs"]["filename"]
-    logger.error("Backing off {wait:0.1f} seconds after {tries} tries for file '{filename}'".format(**details))
-
-# access OpenAI API in exponential time intervals
-@backoff.on_exception(backoff.expo, OpenAIError, on_backoff=log_backoff_exception, logger="rating_log")
-def completion_with_backoff(**kwargs):
-    args = kwargs.copy()
-    args.pop("filename")
-    return openai.ChatCompletion.create(**args)
-
-
-def chatGPT_rate_relevance(query, df, iterations=10):
-    ratings = []
-    for i in tqdm(range(iterations), leave=False):
-        logger.info(f"Iteration {i+1} for {df['filename'][0]}")
-        messages = [{"role": "system", "content" : query},
-                    {"role": "user", "content" : df["abstract"][0]},
-                    ]
-        
-        # define parameters
-        model_engine = args.model
-        temperature = 0.0
-
-        # submit the QUERY
-        completion = completion_with_backoff(
-            filename = df["filename"][0],
-            model = model_engine,
-            messages = messages,
-            temperature = temperature)
-        
-        result = completion.choices[0].message.content
-
-        try:
-            # process result
-            result = result.split('\n\n')
-            if len(result) == 2:
-                rating = result[0]
-                rationale = result[1]
-            else:
-                rating = "NA"
-                rationale = "NA"
-
-            # translate rating to distinct id
-            category_labels = {"irrelevant": 0, "relevant": 1}
-
-            if rating.lower() in category_labels:
-                category_id = category_labels[rating.lower()]
-            else:
-                category_id = "NA"
-
-            # write id and rationale to dataframe
-            df[f"rating_relevance{i+1}"] = category_id
-            df[f"rationale{i+1}"] = rationale
-        
-        except Exception as e:
-            df[f"rating_relevance{i+1}"] = "NA"
-            df[f"rationale{i+1}"] = "NA"
-            print(f"Error occured during rating evaluation: {e}")
-        
-        ratings.append(category_id)
-
-    return ratings
+import os
+import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tda.stages.relevance import parser, run
 
 if __name__ == "__main__":
-    load_dotenv()
-
-    import datetime, platform
-    run_info = {
-        "timestamp_utc": datetime.datetime.utcnow().isoformat(),
-        "model": args.model,
-        "temperature": 0.0,
-        "iterations": getattr(args, "iterations", None),
-        "python": platform.python_version(),
-    }
-    logger.info(f"RUN_INFO {run_info}")
-
-    # set OpenAI key
-    openai.api_key = os.getenv("GPT4_KEY")
-
-    xml_dir = args.input
-    dfs = []
-
-    print(f"READING FILES in {args.input}...\n")
-    logger.info(f"READING FILES in {args.input}")
-
-    # start populating dataframe list
-    for file in os.listdir(xml_dir):
-        directory = os.fsdecode(xml_dir)
-        filename = os.fsdecode(file)
-        path = os.path.join(directory, filename)
-        if filename.endswith(".xml"):
-            tree = ET.parse(path)
-            root = tree.getroot()
-
-            title = root.find(".//{http://www.tei-c.org/ns/1.0}fileDesc//{http://www.tei-c.org/ns/1.0}title")
-            if title is not None and title.text is not None:
-                title = title.text
-            else:
-                title = "NA"
-
-            # finds all p tags in namespace http://www.tei-c.org/ns/1.0 and creates a list of these tags.
-            abstract = root.find(".//{http://www.tei-c.org/ns/1.0}abstract")
-
-            # extract content and save into dictionary
-            if abstract is not None and abstract.text is not None:
-                abstract = ''.join(abstract.itertext()).strip("\n")
-            else:
-                abstract = "NA"
-
-            doi = root.find(".//{http://www.tei-c.org/ns/1.0}idno[@type='DOI']")
-            if doi is not None and doi.text is not None:
-                doi = doi.text
-            else:
-                doi = "NA"
-
-            date = root.find(".//{http://www.tei-c.org/ns/1.0}fileDesc//{http://www.tei-c.org/ns/1.0}date")
-            if date is not None and date.text is not None:
-                date = date.text
-            else:
-                date = "NA"
-
-            authors = root.findall(".//{http://www.tei-c.org/ns/1.0}fileDesc//{http://www.tei-c.org/ns/1.0}persName")
-
-            if authors:
-                authors = "\n".join([' '.join(a.itertext()) for a in authors])
-            else:
-                authors = "NA"
-
-            df = pd.DataFrame({"filename": filename, "title": title, "abstract": abstract, "DOI": doi, "date": date, "authors": authors}, index=[0])
-            dfs.append(df)
-
-
-    print("RATING ARTICLES...\n")
-    logger.info(f"RATING ARTICLES")
-    # rate relevance and calculate mean of relevance ratings for each dataframe
-    for i, df in enumerate(tqdm(dfs)):
-        print(f"RATING {df['filename'][0]} ({i}/{len(dfs)}) ...")
-        logger.info(f"RATING {df['filename'][0]} ({i}/{len(dfs)})")
-        ratings = chatGPT_rate_relevance(QUERY, df, args.iterations)
-        ratings = [x for x in ratings if type(x) == int]
-        if len(ratings) > 0:
-            mean = np.asarray(ratings, dtype=int).mean()
-        else:
-            mean = "NA"
-        df["mean_rating_relevance"] = mean
-
-        # saving to csv as safety
-        logger.info(f"SAVING RATINGS for {df['filename'][0]}")
-        df_final = pd.concat(dfs, ignore_index=True)
-        df_final.to_csv(out_csv, index=False)
-    
-    print("DONE")
-
+    run(parser.parse_args())
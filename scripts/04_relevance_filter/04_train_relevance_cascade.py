@@ -0,0 +1,111 @@
+"""
+Project: Theory Discourse Analysis
+
+Train the local relevance classifier used by the cascade mode of 04_screen_relevance_gpt4.py.
+
+Outputs:
+- Relevance model with TF-IDF vocabulary and logistic regression weights
+  (written to: <output>, a .npz file)
+- Cross-validated threshold report with, per (low, high) pair, the number of abstracts that
+  would be auto-decided, forwarded to the LLM, and decided differently from the labels
+  (written to: <output without .npz>.report.csv)
+
+Notes:
+- Training labels come from earlier screening outputs (--ratings: mean_rating_relevance at or
+  above --rating_threshold counts as relevant) and from expert labels (--expert: a filename
+  column and --expert_column with 0/1 or "relevant"/"irrelevant"); expert labels take
+  precedence over screening ratings for the same filename
+- Screening outputs of a cascade run only contribute the articles the LLM rated
+  (cascade_decision "llm"); the 0/1 ratings the local model set itself are not used as labels
+- Abstracts are taken from the screening outputs; with -i, abstracts of expert-labelled
+  articles that do not appear there are read from the TEI files
+- Articles without an abstract are not used for training
+- See scripts/tda/cascade.py for the model
+"""
+
+
+import os
+import sys
+import argparse
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tda.cascade import RelevanceModel, rating_labels, threshold_report
+from tda.tei import read_tei_record, collect_columns
+from tda.scan import scan_directory, report_failures
+
+# create argument parser
+parser = argparse.ArgumentParser()
+parser.add_argument("--ratings", type=str, action="append", default=[], help="csv output of 04_screen_relevance_gpt4.py (repeatable)")
+parser.add_argument("--expert", type=str, action="append", default=[], help="csv file with expert relevance labels (repeatable)")
+parser.add_argument("--expert_column", type=str, default="relevance", help="column of the expert label files with the label")
+parser.add_argument("--rating_threshold", type=float, default=0.5, help="mean_rating_relevance from which a screened article counts as relevant")
+parser.add_argument("-i", "--input", type=str, default=None, help="directory with TEI XML files for abstracts missing from the ratings")
+parser.add_argument("-o", "--output", type=str, required=True, help="output model file (.npz)")
+parser.add_argument("--C", type=float, default=10.0, help="inverse regularisation strength of the logistic regression")
+parser.add_argument("--max_features", type=int, default=5000, help="maximum number of TF-IDF terms")
+parser.add_argument("--min_df", type=int, default=2, help="minimum number of abstracts a term must occur in")
+parser.add_argument("--folds", type=int, default=5, help="number of cross-validation folds for the threshold report")
+parser.add_argument("--workers", type=int, default=None, help="number of TEI parser processes (default: all cores)")
+
+THRESHOLDS = [(0.02, 0.98), (0.05, 0.95), (0.1, 0.9), (0.2, 0.8), (0.3, 0.7)]
+
+
+def read_expert_labels(path, column):
+    labels = pd.read_csv(path)[["filename", column]].dropna()
+    values = labels[column].astype(str).str.strip().str.lower()
+    named = values.map({"relevant": 1, "irrelevant": 0})
+    numeric = pd.to_numeric(values, errors="coerce").ge(0.5).astype(float).where(named.isna())
+    labels["label"] = named.fillna(numeric)
+    return labels.dropna(subset=["label"])[["filename", "label"]]
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if not args.ratings and not args.expert:
+        parser.error("at least one --ratings or --expert file is required")
+
+    # screening outputs: abstracts and rating-based labels
+    frames = []
+    for path in args.ratings:
+        ratings = pd.read_csv(path, usecols=lambda c: c in ("filename", "abstract", "mean_rating_relevance", "cascade_decision"))
+        frames.append(rating_labels(ratings, args.rating_threshold).assign(source="ratings"))
+    data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["filename", "abstract", "label", "source"])
+    data = data.drop_duplicates("filename", keep="last")
+
+    # expert labels replace rating-based labels
+    if args.expert:
+        expert = pd.concat([read_expert_labels(path, args.expert_column) for path in args.expert], ignore_index=True)
+        expert = expert.drop_duplicates("filename", keep="last")
+        abstracts = dict(zip(data["filename"], data["abstract"]))
+        missing = sorted(set(expert["filename"]) - set(abstracts))
+        if missing and args.input:
+            records, failures = scan_directory(args.input, read_tei_record, args.workers, filenames=missing)
+            report_failures(failures)
+            columns = collect_columns(record for _, record in records)
+            abstracts.update(zip(columns["filename"], columns["abstract"]))
+        expert["abstract"] = expert["filename"].map(abstracts)
+        data = pd.concat([data[~data["filename"].isin(expert["filename"])], expert.assign(source="expert")],
+                         ignore_index=True)
+
+    data = data[data["abstract"].notna() & ~data["abstract"].astype(str).str.strip().isin(["", "NA"])]
+    print(f"TRAINING DATA: {len(data)} abstracts ({int(data['label'].sum())} relevant), "
+          f"{(data['source'] == 'expert').sum()} with expert labels\n")
+    if data["label"].nunique() < 2:
+        sys.exit("Training data must contain relevant and irrelevant abstracts")
+
+    texts, labels = data["abstract"].astype(str).tolist(), data["label"].astype(int).to_numpy()
+    fit_kwargs = {"C": args.C, "max_features": args.max_features, "min_df": args.min_df}
+
+    print(f"CROSS-VALIDATING thresholds ({args.folds} folds)...\n")
+    report = threshold_report(texts, labels, THRESHOLDS, folds=args.folds, **fit_kwargs)
+    out_report = f"{os.path.splitext(args.output)[0]}.report.csv"
+    report.to_csv(out_report, index=False)
+    print(report.to_string(index=False))
+    print()
+
+    model = RelevanceModel.fit(texts, labels, **fit_kwargs)
+    model.save(args.output)
+    print(f"SAVED model to {args.output} and threshold report to {out_report}")
+    print("DONE")
@@ -0,0 +1,47 @@
+"""
+Project: Theory Discourse Analysis
+
+Extract paragraphs from TEI XML files and embed them in batched requests for
+embedding-based paragraph selection.
+
+Outputs:
+- float32 matrix with one embedding per paragraph
+  (written to: <output>.npy)
+- Row-to-paragraph index with filename, paragraph_id, and paragraph text
+  (written to: <output>.index.csv)
+- Log file capturing run metadata and backoff events
+  (written to: <output>.log)
+- With --recall_sample, recall of the BM25 prefilter per query and sampled article
+  (written to: <output>.bm25_recall.csv)
+
+Notes:
+- Replaces the per-paragraph get_embedding calls of notebooks/00_pipeline_exploration.ipynb:
+  paragraphs are sent --batch_size at a time and stored in binary instead of as text in a CSV
+- The matrix is written batch by batch through a memory map and can be reloaded memory-mapped
+  with tda.embeddings.load_embeddings
+- paragraph_id is the 1-based position of the paragraph in its TEI file, as in the corpus index
+- With --filenames, only articles listed in that CSV (filename column, e.g. the relevance
+  screening output) are embedded
+- With --index, paragraphs are read from the persistent corpus index (scripts/tda/corpus_index.py)
+- With --cache, embeddings are looked up in a persistent SQLite cache keyed by model and
+  normalised paragraph text (scripts/tda/cache.py), so reruns only embed unseen paragraphs
+- With --bm25_top_m, only the top M + --bm25_margin paragraphs per article by BM25 score
+  against --bm25_query (scripts/tda/bm25.py) are embedded; paragraph_id still refers to the
+  position in the TEI file
+- With --recall_sample N, all paragraphs of N random articles are embedded as well, and the
+  top --recall_top_n selection with and without the prefilter is compared (the queries are
+  embedded too); use --cache so the kept paragraphs of the sample are not embedded twice
+- Requires an API key in the environment (e.g., GPT4_KEY); --api_base redirects requests,
+  e.g. to a local mock server (scripts/tda/mock_server.py)
+- The logic lives in scripts/tda/stages/embed_paragraphs.py (importable; run(args, index=...) returns the paragraphs)
+"""
+
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tda.stages.embed_paragraphs import parser, run
+
+if __name__ == "__main__":
+    run(parser.parse_args())
@@ -0,0 +1,116 @@
+"""
+Project: Theory Discourse Analysis
+
+Search the whole corpus for the paragraphs most similar to a text or to a given paragraph,
+using an approximate nearest-neighbour index over the embeddings written by 05_embed_paragraphs.py.
+
+Outputs:
+- IVF index next to the embeddings, built on first use, when the embeddings changed, or with --rebuild
+  (written to: <embeddings>.ivf.npz and <embeddings>.ivf.npy)
+- Nearest paragraphs with query_id, rank, filename, paragraph_id, score, and text
+  (written to: <output>, or printed when no output is given)
+
+Notes:
+- Unlike 05_select_paragraphs.py, which ranks paragraphs within each article, this ranks
+  paragraphs across all articles (see scripts/tda/ann.py)
+- Queries are either texts (--query, embedded with --model, optionally through --cache) or
+  existing paragraphs (--like filename:paragraph_id, no API call)
+- The index records the size and modification time of the embedding files; when they were
+  rewritten since (e.g. with another model or changed TEI text), the index is rebuilt
+- --n_probe sets how many of the index's clusters are searched; higher is slower but more exact
+"""
+
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import openai
+import pandas as pd
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tda.ann import IVFIndex, embeddings_fingerprint, ivf_paths, query_paragraphs
+from tda.embeddings import embed_batch, embed_cached, load_embeddings
+from tda.cache import EmbeddingCache
+
+# create argument parser
+parser = argparse.ArgumentParser()
+parser.add_argument("-e", "--embeddings", type=str, required=True, help="embedding prefix written by 05_embed_paragraphs.py")
+parser.add_argument("-o", "--output", type=str, default=None, help="output csv file (default: print the results)")
+parser.add_argument("--query", type=str, action="append", default=[], help="query text (repeat for several queries)")
+parser.add_argument("--like", type=str, action="append", default=[], help="query paragraph as filename:paragraph_id (repeatable)")
+parser.add_argument("--top_k", type=int, default=10, help="number of paragraphs to return per query")
+parser.add_argument("--n_probe", type=int, default=8, help="number of index clusters to search per query")
+parser.add_argument("--n_lists", type=int, default=None, help="number of index clusters (default: square root of the number of paragraphs)")
+parser.add_argument("--rebuild", action="store_true", help="rebuild the index even if it exists")
+parser.add_argument("--model", type=str, default="text-embedding-ada-002", help="OpenAI embedding model name (must match the paragraphs)")
+parser.add_argument("--cache", type=str, default=None, help="SQLite embedding cache shared across runs")
+parser.add_argument("--api_base", type=str, default=None, help="alternative API base URL, e.g. a local mock server")
+
+
+def paragraph_rows(index, references):
+    """Row numbers of filename:paragraph_id references in the embeddings' row index."""
+    lookup = {(f, str(p)): row for row, f, p in zip(index["row"], index["filename"], index["paragraph_id"])}
+    rows = []
+    for reference in references:
+        filename, _, paragraph_id = reference.rpartition(":")
+        if (filename, paragraph_id) not in lookup:
+            raise ValueError(f"Paragraph not found in the embeddings: {reference}")
+        rows.append(lookup[(filename, paragraph_id)])
+    return rows
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if not args.query and not args.like:
+        parser.error("at least one --query or --like is required")
+    load_dotenv()
+
+    # set OpenAI key
+    openai.api_key = os.getenv("GPT4_KEY")
+    if args.api_base:
+        openai.api_base = args.api_base
+
+    vectors, index = load_embeddings(args.embeddings)
+
+    source = embeddings_fingerprint(args.embeddings)
+    ann = None
+    if not args.rebuild and all(os.path.exists(p) for p in ivf_paths(args.embeddings)):
+        ann = IVFIndex.load(args.embeddings)
+        if ann.source != source:
+            print("EMBEDDINGS CHANGED since the index was built\n")
+            ann = None
+    if ann is None:
+        print(f"BUILDING INDEX over {len(index)} paragraphs...\n")
+        start = time.time()
+        IVFIndex.build(vectors, args.n_lists, source=source).save(args.embeddings)
+        print(f"INDEX BUILT in {time.time() - start:.1f}s\n")
+        ann = IVFIndex.load(args.embeddings)
+
+    query_vectors = []
+    if args.query:
+        if args.cache:
+            cache = EmbeddingCache(args.cache)
+            query_vectors.append(embed_cached(args.query, args.model, cache))
+            cache.close()
+        else:
+            query_vectors.append(embed_batch(args.query, args.model))
+    if args.like:
+        query_vectors.append(np.asarray(vectors[paragraph_rows(index, args.like)], dtype=np.float32))
+    query_vectors = np.vstack(query_vectors)
+
+    start = time.time()
+    results = query_paragraphs(ann, index, query_vectors, args.top_k, args.n_probe)
+    elapsed = time.time() - start
+    print(f"SEARCHED {len(query_vectors)} queries in {1000 * elapsed:.1f} ms\n")
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"SAVED {len(results)} rows to {args.output}")
+    else:
+        with pd.option_context("display.max_colwidth", 80, "display.width", 200):
+            print(results.to_string(index=False))
+    print("DONE")
@@ -0,0 +1,32 @@
+"""
+Project: Theory Discourse Analysis
+
+Select the paragraphs of each article that are most similar to one or more theory queries,
+based on the paragraph embeddings written by 05_embed_paragraphs.py.
+
+Outputs:
+- CSV with the selected paragraphs (written to: <output>)
+  - wide (default): one row per query and article with p1, p2, ... (in document order),
+    p<j>_paragraph_id, and p<j>_cos_similarity, as produced by the exploration notebook
+  - long (--format long): one row per selected paragraph with query_id, filename, rank,
+    paragraph_id, similarity, and text (input for 06_classify_stance_paragraphs_gpt4.py --long_format)
+
+Notes:
+- Similarities are one matrix product of normalised embeddings against all queries, and
+  per-article top-k comes from a grouped argpartition (see scripts/tda/selection.py)
+- With --cache, query embeddings go through the shared embedding cache (scripts/tda/cache.py),
+  so re-running with another --top_n or an additional query only embeds new query texts
+- Without --query or --queries_file, the memory decay query of the exploration notebook is used
+- With --merge_csv, the selection is merged onto that CSV by filename (left join), as in the notebook
+- The logic lives in scripts/tda/stages/select_paragraphs.py (importable; run(args) returns the selection)
+"""
+
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tda.stages.select_paragraphs import parser, run
+
+if __name__ == "__main__":
+    run(parser.parse_args())
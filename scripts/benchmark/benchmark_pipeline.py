@@ -0,0 +1,231 @@
+"""
+Project: Theory Discourse Analysis
+
+Benchmark the LLM and embedding stages of the pipeline against local mock servers, without
+API credentials or costs.
+
+Outputs:
+- Table with wall time, articles per second, API requests per article, injected or
+  rate-limited errors, and p95 call latency per stage (printed; written to --output as CSV)
+- With --save_baseline, or on the first run of a scenario without a stored baseline, the
+  results of the scenario (written to: --baselines, default scripts/benchmark/baselines.json)
+
+Notes:
+- Writes a synthetic TEI corpus (scripts/tda/synthetic.py) and runs the real stage scripts
+  on it as subprocesses: 04 relevance screening (serial and async), 06 abstract stance,
+  05 paragraph embedding and selection, and 06 paragraph stance (async)
+- Two mock servers (scripts/tda/mock_server.py) answer with a relevance and a stance label;
+  both also serve embeddings. Scenarios (SCENARIOS) set the latency distribution, 429/5xx
+  injection, and server-side RPM/TPM limits; single settings can be overridden on the
+  command line
+- API requests per article count every request the servers received (errors and re-asks
+  included); p95 latency comes from the stage telemetry (scripts/tda/telemetry.py)
+- Results are compared with the stored baseline of the same scenario: a stage regresses
+  when its articles per second drop, or its requests per article rise, by more than
+  --tolerance. The exit code is 1 if any stage fails or regresses
+- Wall times include interpreter start-up and imports of each stage script; baselines are
+  machine-specific, so they are not kept in version control: the first run on a machine
+  records them, and later runs compare against them
+"""
+
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import pandas as pd
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, SCRIPTS_DIR)
+from tda.mock_server import start_mock_server
+from tda.synthetic import write_synthetic_corpus
+from tda.telemetry import read_telemetry, summarise
+
+SCENARIOS = {
+    "default": {"latency": 0.05, "latency_dist": "fixed", "error_rate_429": 0.0, "error_rate_5xx": 0.0,
+                "rpm_limit": None, "tpm_limit": None},
+    "heavy_tail": {"latency": 0.05, "latency_dist": "lognormal", "error_rate_429": 0.0, "error_rate_5xx": 0.0,
+                   "rpm_limit": None, "tpm_limit": None},
+    "flaky": {"latency": 0.05, "latency_dist": "lognormal", "error_rate_429": 0.05, "error_rate_5xx": 0.02,
+              "rpm_limit": None, "tpm_limit": None},
+    "rate_limited": {"latency": 0.05, "latency_dist": "fixed", "error_rate_429": 0.0, "error_rate_5xx": 0.0,
+                     "rpm_limit": 600, "tpm_limit": None},
+}
+
+STAGES = ["04_relevance_serial", "04_relevance_async", "06_stance_abstracts", "05_embed_paragraphs",
+          "05_select_paragraphs", "06_stance_paragraphs"]
+
+# create argument parser
+parser = argparse.ArgumentParser()
+parser.add_argument("--scenario", type=str, default="default", choices=sorted(SCENARIOS), help="mock server scenario")
+parser.add_argument("--stages", type=str, nargs="+", default=STAGES, choices=STAGES, help="stages to run (in pipeline order)")
+parser.add_argument("--articles", type=int, default=40, help="number of synthetic articles")
+parser.add_argument("--paragraphs", type=int, default=20, help="number of body paragraphs per article")
+parser.add_argument("--iterations", type=int, default=3, help="iterations per article for the 04 and 06 abstract stages")
+parser.add_argument("--concurrency", type=int, default=8, help="requests in flight for the async stages")
+parser.add_argument("--latency", type=float, default=None, help="override the scenario's mock latency in seconds")
+parser.add_argument("--latency_dist", type=str, default=None, choices=["fixed", "uniform", "exponential", "lognormal"], help="override the scenario's latency distribution")
+parser.add_argument("--error_rate_429", type=float, default=None, help="override the scenario's 429 probability")
+parser.add_argument("--error_rate_5xx", type=float, default=None, help="override the scenario's 5xx probability")
+parser.add_argument("--rpm_limit", type=int, default=None, help="override the scenario's server-side requests per minute")
+parser.add_argument("--tpm_limit", type=int, default=None, help="override the scenario's server-side tokens per minute")
+parser.add_argument("--seed", type=int, default=1, help="seed for the corpus, latencies, and injected errors")
+parser.add_argument("--baselines", type=str, default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json"), help="json file with stored baselines")
+parser.add_argument("--save_baseline", action="store_true", help="store the results as the scenario's baseline (recorded anyway if it has none)")
+parser.add_argument("--tolerance", type=float, default=0.25, help="relative slowdown or extra requests tolerated before a regression is reported")
+parser.add_argument("--workdir", type=str, default=None, help="directory for corpus and outputs (default: temporary, removed afterwards)")
+parser.add_argument("--output", type=str, default=None, help="csv file for the results table")
+
+
+def stage_command(stage, workdir, args):
+    """(script, arguments, telemetry file or None, server) for one stage."""
+    tei, out = os.path.join(workdir, "tei"), os.path.join(workdir, "out")
+    telemetry = os.path.join(out, f"{stage}.telemetry.jsonl")
+    if stage == "04_relevance_serial":
+        return ("04_relevance_filter/04_screen_relevance_gpt4.py",
+                ["-i", tei, "-o", out, "--output_filename", "relevance_serial", "-iter", str(args.iterations),
+                 "--telemetry", telemetry], telemetry, "relevance")
+    if stage == "04_relevance_async":
+        return ("04_relevance_filter/04_screen_relevance_gpt4.py",
+                ["-i", tei, "-o", out, "--output_filename", "relevance", "-iter", str(args.iterations),
+                 "--async_requests", "--concurrency", str(args.concurrency), "--telemetry", telemetry], telemetry, "relevance")
+    if stage == "06_stance_abstracts":
+        return ("06_stance_classification/06_classify_stance_abstracts_gpt4.py",
+                ["-i", relevance_csv(out), "-o", os.path.join(out, "stance_abstracts"), "-iter", str(args.iterations),
+                 "--telemetry", telemetry], telemetry, "stance")
+    if stage == "05_embed_paragraphs":
+        return ("05_extract_text/05_embed_paragraphs.py",
+                ["-i", tei, "-o", os.path.join(out, "embeddings"), "--batch_size", "64"], None, "stance")
+    if stage == "05_select_paragraphs":
+        return ("05_extract_text/05_select_paragraphs.py",
+                ["-e", os.path.join(out, "embeddings"), "-o", os.path.join(out, "selected.csv")], None, "stance")
+    if stage == "06_stance_paragraphs":
+        return ("06_stance_classification/06_classify_stance_paragraphs_gpt4.py",
+                ["-i", os.path.join(out, "selected.csv"), "-o", os.path.join(out, "stance_paragraphs"),
+                 "--async_requests", "--concurrency", str(args.concurrency), "--telemetry", telemetry], telemetry, "stance")
+    raise ValueError(f"Unknown stage {stage}")
+
+
+def relevance_csv(out):
+    # the 06 abstract stage reads whichever 04 stage ran
+    for name in ("relevance", "relevance_serial"):
+        path = os.path.join(out, f"{name}.csv")
+        if os.path.exists(path):
+            return path
+    return os.path.join(out, "relevance.csv")
+
+
+def run_stage(stage, workdir, args, servers):
+    script, arguments, telemetry, server_name = stage_command(stage, workdir, args)
+    server = servers[server_name]
+    env = dict(os.environ, GPT4_KEY="mock", OPENAI_API_BASE=f"http://127.0.0.1:{server.server_address[1]}/v1")
+
+    before = dict(server.stats)
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, script)] + arguments,
+                             env=env, cwd=workdir, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    counts = {k: server.stats.get(k, 0) - before.get(k, 0) for k in set(server.stats) | set(before)}
+
+    requests = sum(v for k, v in counts.items() if k.endswith("_requests"))
+    ok = sum(v for k, v in counts.items() if k.endswith("_ok"))
+    latency_p95 = None
+    if telemetry is not None:
+        summary = summarise(read_telemetry(telemetry))
+        latency_p95 = next(iter(summary.values()), {}).get("latency_p95_s")
+
+    result = {"stage": stage, "status": "ok" if process.returncode == 0 else "failed",
+              "articles": args.articles, "wall_s": round(wall, 2),
+              "articles_per_s": round(args.articles / wall, 3), "requests": requests,
+              "errors": requests - ok, "calls_per_article": round(requests / args.articles, 3),
+              "latency_p95_s": latency_p95}
+    if process.returncode != 0:
+        print(f"STAGE {stage} FAILED:\n{process.stderr[-2000:]}")
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Add baseline values and a regression flag to each result."""
+    for result in results:
+        base = baseline.get("stages", {}).get(result["stage"])
+        result["baseline_articles_per_s"] = base["articles_per_s"] if base else None
+        result["baseline_calls_per_article"] = base["calls_per_article"] if base else None
+        result["regression"] = bool(base) and (
+            result["articles_per_s"] < (1 - tolerance) * base["articles_per_s"]
+            or result["calls_per_article"] > (1 + tolerance) * base["calls_per_article"] + 1e-9)
+    return results
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    config = dict(SCENARIOS[args.scenario])
+    for key in config:
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+    config.update({"articles": args.articles, "paragraphs": args.paragraphs, "iterations": args.iterations,
+                   "concurrency": args.concurrency, "seed": args.seed})
+    print(f"SCENARIO {args.scenario}: {config}\n")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="tda_benchmark_")
+    os.makedirs(os.path.join(workdir, "out"), exist_ok=True)
+    write_synthetic_corpus(os.path.join(workdir, "tei"), args.articles, args.paragraphs, seed=args.seed)
+
+    server_config = {key: config[key] for key in SCENARIOS["default"]}
+    servers = {
+        "relevance": start_mock_server(response_text="relevant\n\nMock rationale.", seed=args.seed, **server_config),
+        "stance": start_mock_server(response_text="tacit_acceptance\n\nMock rationale.", seed=args.seed + 1,
+                                    embedding_dim=256, **server_config),
+    }
+
+    results = []
+    for stage in [s for s in STAGES if s in args.stages]:
+        print(f"RUNNING {stage}...")
+        results.append(run_stage(stage, workdir, args, servers))
+    for server in servers.values():
+        server.shutdown()
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines, encoding="utf-8") as f:
+            baselines = json.load(f)
+    baseline = baselines.get(args.scenario, {})
+    if baseline and baseline.get("config") != config:
+        print(f"\nWARNING: baseline of scenario {args.scenario} was recorded with {baseline.get('config')}")
+    results = compare(results, baseline, args.tolerance)
+
+    table = pd.DataFrame(results)
+    print()
+    print(table.to_string(index=False))
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+    if not baseline:
+        print(f"\nNO BASELINE of scenario {args.scenario} in {args.baselines}; recording this run")
+    if args.save_baseline or not baseline:
+        baselines[args.scenario] = {
+            "config": config,
+            "python": platform.python_version(),
+            "stages": {r["stage"]: {k: r[k] for k in ("wall_s", "articles_per_s", "calls_per_article")}
+                       for r in results if r["status"] == "ok"},
+        }
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2)
+            f.write("\n")
+        print(f"\nSAVED baseline of scenario {args.scenario} to {args.baselines}")
+
+    if not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    failed = [r["stage"] for r in results if r["status"] != "ok"]
+    regressed = [r["stage"] for r in results if r["regression"]]
+    if failed or regressed:
+        print(f"\nFAILED: {failed}  REGRESSED: {regressed}")
+        sys.exit(1)
+    print("\nDONE")
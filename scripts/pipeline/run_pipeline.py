@@ -0,0 +1,200 @@
+"""
+Project: Theory Discourse Analysis
+
+Run the 04 to 06 stages in order and recompute only what changed since the last run.
+
+Stages:
+- convert_pdfs: 03_convert_pdfs_grobid.py from --pdf_dir into the TEI directory (only with --pdf_dir;
+  its journal and log go to <output_dir>/grobid_conversions.jsonl and .log)
+- deduplicate: 04_filter_deduplicate_xml.py on the TEI directory (in place)
+- missing_abstracts: 04_filter_missing_abstracts.py on the TEI directory (in place)
+- relevance: 04_screen_relevance_gpt4.py (<output_dir>/relevance.csv), per article
+- filter_relevant: 04_filter_relevant.py (<output_dir>/relevant.csv), the articles with a
+  mean_rating_relevance of at least --relevance_threshold
+- stance_abstracts: 06_classify_stance_abstracts_gpt4.py on relevant.csv (<output_dir>/stance_abstracts.csv), per article
+- embed_paragraphs: 05_embed_paragraphs.py on the relevant articles (<output_dir>/embeddings.npy and .index.csv)
+- select_paragraphs: 05_select_paragraphs.py (<output_dir>/selected.csv)
+- stance_paragraphs: 06_classify_stance_paragraphs_gpt4.py (<output_dir>/stance_paragraphs.csv), per article
+
+Outputs:
+- The stage outputs above, plus their logs and journals
+- Fingerprints of the last successful run of every stage
+  (written to: <output_dir>/pipeline_state.json)
+- Log file with the decision and duration of every stage
+  (written to: <output_dir>/pipeline.log)
+
+Notes:
+- A stage is skipped when its script, arguments, prompt (QUERY), input file hashes, and
+  output hashes match the last run; see scripts/tda/pipeline.py
+- Per-article stages only send new and changed articles to the API: an article is changed
+  when its TEI file (relevance), its abstract in relevant.csv (stance_abstracts), or its
+  selected paragraph texts in selected.csv (stance_paragraphs) changed
+- Only relevant articles reach the stance stages; a changed --relevance_threshold reruns
+  filter_relevant, and the stages after it see the changed relevant.csv (articles that are no
+  longer relevant are dropped from the stance journals)
+- embed_paragraphs reruns as a whole when the TEI directory or relevant.csv changed, but goes through the
+  embedding cache (--embedding_cache), so only paragraphs of new or changed articles are embedded
+- --dry_run prints the decision for every stage without running anything; --force reruns
+  the named stages (e.g. after changing shared code in scripts/tda/)
+- With --in_process, the stages run in this interpreter (scripts/tda/stages/) instead of one
+  process per script: the TEI files are parsed once into a shared corpus index (--index, or an
+  in-memory index by default) and the relevance, relevant-article, and paragraph selection tables are handed on
+  without re-reading their CSVs; the outputs are the same as with subprocesses
+- With --index (and without --in_process), the stages that parse TEI files use that
+  persistent corpus index (scripts/tda/corpus_index.py)
+- convert_pdfs reruns when the PDF directory changed and only sends PDFs without a TEI output
+  to GROBID (--grobid_url); see 03_parse_xml/03_convert_pdfs_grobid.py
+- Requires an API key in the environment (e.g., GPT4_KEY); --api_base redirects all stages,
+  e.g. to a local mock server (scripts/tda/mock_server.py)
+"""
+
+
+import os
+import sys
+import argparse
+import logging
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+from tda.pipeline import Stage, Pipeline
+from tda.logs import LOG_FORMAT
+
+STAGE_NAMES = ["convert_pdfs", "deduplicate", "missing_abstracts", "relevance", "filter_relevant", "stance_abstracts",
+               "embed_paragraphs", "select_paragraphs", "stance_paragraphs"]
+
+# create argument parser
+parser = argparse.ArgumentParser()
+parser.add_argument("-i", "--input_dir", type=str, required=True, help="directory with TEI XML files")
+parser.add_argument("-o", "--output_dir", type=str, required=True, help="directory for stage outputs and the pipeline state")
+parser.add_argument("--stages", type=str, nargs="+", default=STAGE_NAMES, choices=STAGE_NAMES, help="stages to run (in pipeline order)")
+parser.add_argument("--force", type=str, nargs="*", default=[], choices=STAGE_NAMES, help="stages to rerun regardless of their fingerprints")
+parser.add_argument("--dry_run", action="store_true", help="print what would run without running it")
+parser.add_argument("--model", type=str, default="gpt-4", help="OpenAI model name for the relevance and stance stages")
+parser.add_argument("--embedding_model", type=str, default="text-embedding-ada-002", help="OpenAI embedding model name")
+parser.add_argument("--relevance_iterations", type=int, default=10, help="number of relevance ratings per article")
+parser.add_argument("--relevance_threshold", type=float, default=0.5, help="mean_rating_relevance from which an article is stance-classified")
+parser.add_argument("--stance_iterations", type=int, default=3, help="number of stance ratings per abstract")
+parser.add_argument("--top_n", type=int, default=3, help="number of paragraphs selected per article")
+parser.add_argument("--near_duplicates", action="store_true", help="also remove near-duplicate articles")
+parser.add_argument("--async_requests", action="store_true", help="submit requests concurrently in the relevance and paragraph stance stages")
+parser.add_argument("--concurrency", type=int, default=8, help="maximum number of requests in flight (async mode)")
+parser.add_argument("--workers", type=int, default=None, help="number of TEI parser processes (default: all cores)")
+parser.add_argument("--cache", type=str, default=None, help="SQLite response cache shared by the LLM stages")
+parser.add_argument("--embedding_cache", type=str, default=None, help="SQLite embedding cache (default: <output_dir>/embedding_cache.sqlite)")
+parser.add_argument("--api_base", type=str, default=None, help="alternative API base URL, e.g. a local mock server")
+parser.add_argument("--in_process", action="store_true", help="run the stages in this process and share parsed data between them")
+parser.add_argument("--index", type=str, default=None, help="SQLite corpus index shared by the stages that parse TEI files")
+parser.add_argument("--pdf_dir", type=str, default=None, help="directory with PDF files to convert into the TEI directory first")
+parser.add_argument("--grobid_url", type=str, default="http://localhost:8070", help="base URL of the GROBID service")
+parser.add_argument("--grobid_concurrency", type=int, default=4, help="maximum number of PDFs in flight to GROBID")
+
+
+def build_stages(args):
+    tei, out = args.input_dir, args.output_dir
+    relevance_csv = os.path.join(out, "relevance.csv")
+    relevant_csv = os.path.join(out, "relevant.csv")
+    selected_csv = os.path.join(out, "selected.csv")
+    embeddings = os.path.join(out, "embeddings")
+    embedding_cache = args.embedding_cache or os.path.join(out, "embedding_cache.sqlite")
+
+    runtime = []
+    if args.workers is not None:
+        runtime.append(("--workers", args.workers))
+    concurrent = [("--async_requests", None), ("--concurrency", args.concurrency)] if args.async_requests else []
+    cache = [("--cache", args.cache)] if args.cache else []
+    # in-process runs pass the open index object instead
+    index = [("--index", args.index)] if args.index and not args.in_process else []
+
+    near_duplicates = [("--near_duplicates", None), ("--remove_near_duplicates", None)] if args.near_duplicates else []
+    convert = []
+    if args.pdf_dir:
+        # no outputs: the filters below change the TEI directory in place
+        convert.append(Stage("convert_pdfs", "03_parse_xml/03_convert_pdfs_grobid.py",
+                             [("-i", args.pdf_dir), ("-o", tei), ("--grobid_url", args.grobid_url),
+                              ("--concurrency", args.grobid_concurrency),
+                              ("--journal", os.path.join(out, "grobid_conversions.jsonl"))] + runtime,
+                             inputs=[args.pdf_dir], module="tda.stages.convert_pdfs"))
+    return convert + [
+        Stage("deduplicate", "04_relevance_filter/04_filter_deduplicate_xml.py",
+              [("-i", tei)] + near_duplicates + index + runtime, inputs=[tei],
+              module="tda.stages.deduplicate", shares_index=True),
+        Stage("missing_abstracts", "04_relevance_filter/04_filter_missing_abstracts.py",
+              [("-i", tei)] + index + runtime, inputs=[tei],
+              module="tda.stages.missing_abstracts", shares_index=True),
+        Stage("relevance", "04_relevance_filter/04_screen_relevance_gpt4.py",
+              [("-i", tei), ("-o", out), ("--output_filename", "relevance"), ("--model", args.model),
+               ("-iter", args.relevance_iterations)] + concurrent + cache + index + runtime,
+              inputs=[tei], outputs=[relevance_csv], journal=os.path.join(out, "relevance.jsonl"), articles=tei,
+              module="tda.stages.relevance", shares_index=True),
+        Stage("filter_relevant", "04_relevance_filter/04_filter_relevant.py",
+              [("-i", relevance_csv), ("-o", relevant_csv), ("--threshold", args.relevance_threshold)],
+              inputs=[relevance_csv], outputs=[relevant_csv],
+              module="tda.stages.filter_relevant", table_from="relevance"),
+        Stage("stance_abstracts", "06_stance_classification/06_classify_stance_abstracts_gpt4.py",
+              [("-i", relevant_csv), ("-o", os.path.join(out, "stance_abstracts")), ("--model", args.model),
+               ("-iter", args.stance_iterations)] + cache,
+              inputs=[relevant_csv], outputs=[os.path.join(out, "stance_abstracts.csv")],
+              journal=os.path.join(out, "stance_abstracts.jsonl"), articles=relevant_csv, article_columns="abstract",
+              module="tda.stages.stance_abstracts", table_from="filter_relevant"),
+        Stage("embed_paragraphs", "05_extract_text/05_embed_paragraphs.py",
+              [("-i", tei), ("-o", embeddings), ("--filenames", relevant_csv), ("--model", args.embedding_model),
+               ("--cache", embedding_cache)] + index + runtime,
+              inputs=[tei, relevant_csv], outputs=[f"{embeddings}.npy", f"{embeddings}.index.csv"],
+              module="tda.stages.embed_paragraphs", shares_index=True),
+        Stage("select_paragraphs", "05_extract_text/05_select_paragraphs.py",
+              [("-e", embeddings), ("-o", selected_csv), ("--model", args.embedding_model),
+               ("--top_n", args.top_n), ("--cache", embedding_cache)],
+              inputs=[f"{embeddings}.npy", f"{embeddings}.index.csv"], outputs=[selected_csv],
+              module="tda.stages.select_paragraphs"),
+        Stage("stance_paragraphs", "06_stance_classification/06_classify_stance_paragraphs_gpt4.py",
+              [("-i", selected_csv), ("-o", os.path.join(out, "stance_paragraphs")), ("--model", args.model)]
+              + concurrent + cache,
+              inputs=[selected_csv], outputs=[os.path.join(out, "stance_paragraphs.csv")],
+              journal=os.path.join(out, "stance_paragraphs.jsonl"), articles=selected_csv, article_columns=r"p\d+",
+              module="tda.stages.stance_paragraphs", table_from="select_paragraphs"),
+    ]
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    load_dotenv()
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # not on the root logger: in-process stages attach their own log files there
+    handler = logging.FileHandler(os.path.join(args.output_dir, "pipeline.log"), mode="a")
+    handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt="%H:%M:%S"))
+    logger = logging.getLogger('pipeline_log')
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+
+    env = dict(os.environ)
+    if args.api_base:
+        # not every stage script has --api_base; the openai client reads it from the environment
+        env["OPENAI_API_BASE"] = args.api_base
+
+    index = None
+    if args.in_process and not args.dry_run:
+        from tda.corpus_index import CorpusIndex
+        index = CorpusIndex(args.index or ":memory:")
+
+    stages = [stage for stage in build_stages(args) if stage.name in args.stages]
+    pipeline = Pipeline(stages, os.path.join(args.output_dir, "pipeline_state.json"), env=env, logger=logger,
+                        in_process=args.in_process, index=index)
+    logger.info(f"RUN_INFO {vars(args)}")
+
+    try:
+        summary = pipeline.run(force=set(args.force), dry_run=args.dry_run)
+    except RuntimeError as e:
+        print(f"FAILED: {e}")
+        sys.exit(1)
+    finally:
+        if index is not None:
+            index.close()
+
+    if not args.dry_run:
+        print()
+        for name, action, reason, seconds in summary:
+            print(f"{name:<20} {action:<8} {seconds:>8.1f} s  {reason}")
+    print("DONE")
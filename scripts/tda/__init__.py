@@ -0,0 +1,9 @@
+"""
+Project: Theory Discourse Analysis
+
+Shared helpers for the pipeline scripts in scripts/.
+
+The stage directories (01_search/, 04_relevance_filter/, ...) are not importable
+Python packages, so code that is reused across stages lives here. Scripts add
+scripts/ to sys.path and import from tda.
+"""
@@ -0,0 +1,148 @@
+"""
+Project: Theory Discourse Analysis
+
+Approximate nearest-neighbour index over all paragraph embeddings of the corpus (pure CPU, numpy).
+
+The index is an inverted file (IVF): paragraphs are clustered with spherical k-means, and
+each cluster keeps the list of its paragraphs. A query is compared to the cluster centroids
+first and then only to the paragraphs of the n_probe closest clusters, instead of to every
+paragraph of the corpus.
+
+Notes:
+- Scores are cosine similarities (vectors are L2-normalised when the index is built)
+- Paragraph vectors are stored reordered by cluster, so each probed list is one contiguous
+  slice; the saved matrix is memory-mapped on load
+- Saved next to the embeddings as <prefix>.ivf.npz (centroids, list offsets, row ids) and
+  <prefix>.ivf.npy (vectors); rows refer to <prefix>.index.csv (tda.embeddings)
+- Larger n_probe trades speed for recall; n_probe = n_lists is an exact (linear) search
+- A saved index records the size and modification time of the embedding files it was built
+  from (embeddings_fingerprint); an index whose fingerprint no longer matches is stale
+"""
+
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from tda.selection import normalise
+
+
+def ivf_paths(prefix):
+    return f"{prefix}.ivf.npz", f"{prefix}.ivf.npy"
+
+
+def embeddings_fingerprint(prefix):
+    """Hash of the size and modification time of <prefix>.npy and <prefix>.index.csv."""
+    stats = [(os.path.getsize(path), os.stat(path).st_mtime_ns) for path in (f"{prefix}.npy", f"{prefix}.index.csv")]
+    return hashlib.sha256(json.dumps(stats).encode("utf-8")).hexdigest()
+
+
+def _nearest_centroid(vectors, centroids, block_size=65536):
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block_size):
+        block = normalise(vectors[start:start + block_size])
+        assignment[start:start + block_size] = np.argmax(block @ centroids.T, axis=1)
+    return assignment
+
+
+def train_centroids(vectors, n_lists, iterations=10, sample_size=None, seed=1):
+    """Spherical k-means on a random sample of the (normalised) vectors."""
+    rng = np.random.default_rng(seed)
+    if sample_size is None:
+        sample_size = n_lists * 64
+    sample_rows = np.sort(rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False))
+    sample = normalise(vectors[sample_rows])
+
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        counts = np.bincount(assignment, minlength=n_lists)
+        # empty clusters restart from a random sample vector
+        empty = counts == 0
+        sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+        centroids = normalise(sums)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index with cosine scores; rows are the row numbers of the embedding matrix."""
+
+    def __init__(self, centroids, offsets, rows, vectors, source=None):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        self.vectors = vectors
+        # embeddings_fingerprint of the embeddings the index was built from
+        self.source = source
+
+    def __len__(self):
+        return len(self.rows)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, vectors, n_lists=None, iterations=10, sample_size=None, seed=1, source=None):
+        if n_lists is None:
+            n_lists = max(1, int(np.sqrt(len(vectors))))
+        n_lists = min(n_lists, len(vectors))
+        centroids = train_centroids(vectors, n_lists, iterations, sample_size, seed)
+
+        assignment = _nearest_centroid(vectors, centroids)
+        rows = np.argsort(assignment, kind="stable")
+        offsets = np.r_[0, np.cumsum(np.bincount(assignment, minlength=n_lists))]
+        return cls(centroids, offsets, rows, normalise(vectors[rows]), source)
+
+    def search(self, query_vectors, k=10, n_probe=8):
+        """
+        (rows, scores) arrays of shape (n_queries, k), best first; rows are -1 and scores -inf
+        where fewer than k paragraphs were probed.
+        """
+        queries = normalise(np.atleast_2d(query_vectors))
+        n_probe = min(n_probe, self.n_lists)
+        probes = np.argpartition(-(queries @ self.centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+
+        out_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        out_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for q, lists in enumerate(probes):
+            positions = np.concatenate([np.arange(self.offsets[i], self.offsets[i + 1]) for i in lists])
+            if len(positions) == 0:
+                continue
+            scores = self.vectors[positions] @ queries[q]
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            top = top[np.argsort(-scores[top], kind="stable")]
+            out_rows[q, :len(top)] = self.rows[positions[top]]
+            out_scores[q, :len(top)] = scores[top]
+        return out_rows, out_scores
+
+    def save(self, prefix):
+        meta_path, vectors_path = ivf_paths(prefix)
+        np.savez(meta_path, centroids=self.centroids, offsets=self.offsets, rows=self.rows, source=str(self.source or ""))
+        np.save(vectors_path, self.vectors)
+
+    @classmethod
+    def load(cls, prefix, mmap=True):
+        meta_path, vectors_path = ivf_paths(prefix)
+        meta = np.load(meta_path)
+        vectors = np.load(vectors_path, mmap_mode="r" if mmap else None)
+        source = str(meta["source"]) if "source" in meta.files else ""
+        return cls(meta["centroids"], meta["offsets"], meta["rows"], vectors, source or None)
+
+
+def query_paragraphs(ann, index, query_vectors, k=10, n_probe=8):
+    """
+    Long DataFrame with query_id, rank, filename, paragraph_id, score, and text of the k
+    nearest paragraphs for each query vector (index: the embeddings' row index).
+    """
+    rows, scores = ann.search(query_vectors, k, n_probe)
+    query_ids, ranks = np.nonzero(rows >= 0)
+    found = index.iloc[rows[query_ids, ranks]][["filename", "paragraph_id", "text"]].reset_index(drop=True)
+    found.insert(0, "query_id", query_ids + 1)
+    found.insert(1, "rank", ranks + 1)
+    found.insert(4, "score", scores[query_ids, ranks])
+    return found
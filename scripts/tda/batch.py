@@ -0,0 +1,136 @@
+"""
+Project: Theory Discourse Analysis
+
+Offline batch-job mode for the LLM-assisted classification scripts.
+
+The 04 and 06 scripts can export every chat request of a run to one JSONL file
+(--batch_export) in the OpenAI Batch API input format, and later ingest the
+matching results file (--batch_ingest, see ingest_results) into their usual journal and output CSV.
+Each request carries a custom_id of the form "<filename>|<iteration>|<paragraph>"
+("-" where a field does not apply), which is all that is needed to map results back.
+
+Running this module directly sends an exported request file to a chat-completions
+endpoint one request at a time and writes a results file in the Batch API output
+format. It is a local stand-in for the bulk endpoint, e.g. against tda/mock_server.py:
+
+    python scripts/tda/batch.py requests.jsonl results.jsonl --api_base http://127.0.0.1:8000/v1
+"""
+
+
+import argparse
+import json
+import os
+
+
+def make_custom_id(filename, iteration=None, paragraph=None):
+    fields = [iteration, paragraph]
+    return "|".join([filename] + ["-" if f is None else str(f) for f in fields])
+
+
+def parse_custom_id(custom_id):
+    """Return (filename, iteration, paragraph); fields that do not apply are None."""
+    filename, iteration, paragraph = custom_id.rsplit("|", 2)
+    return (filename,
+            None if iteration == "-" else int(iteration),
+            None if paragraph == "-" else int(paragraph))
+
+
+def export_requests(path, requests):
+    """
+    Write chat requests to a Batch API input file.
+
+    requests: iterable of (filename, iteration, paragraph, body) where body holds the
+    chat-completion arguments (model, messages, temperature). Returns the number written.
+    """
+    n = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for filename, iteration, paragraph, body in requests:
+            f.write(json.dumps({
+                "custom_id": make_custom_id(filename, iteration, paragraph),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": body,
+            }, ensure_ascii=False) + "\n")
+            n += 1
+    return n
+
+
+def read_results(path):
+    """
+    Read a Batch API output file.
+
+    Returns a dict mapping (filename, iteration, paragraph) to the assistant message
+    content, or to None where the request failed.
+    """
+    results = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            key = parse_custom_id(record["custom_id"])
+
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                results[key] = None
+                continue
+            results[key] = response["body"]["choices"][0]["message"]["content"]
+    return results
+
+
+def ingest_results(path, journal, extractor, done, field="iteration"):
+    """
+    Journal the results of a Batch API output file as {"filename", field, "rating", "rationale"}
+    records, field being "iteration" or "paragraph"; results whose (filename, field value) is in
+    done are skipped, and failed requests stay out of the journal so they can be exported again.
+    Returns (number of journaled results, number of failed requests).
+    """
+    records = []
+    n_failed = 0
+    for (filename, iteration, paragraph), result in read_results(path).items():
+        value = iteration if field == "iteration" else paragraph
+        if (filename, value) in done:
+            continue
+        if result is None:
+            n_failed += 1
+            continue
+        category_id, rationale = extractor.parse(result)
+        records.append({"filename": filename, field: value, "rating": category_id, "rationale": rationale})
+    journal.extend(records)
+    return len(records), n_failed
+
+
+def run_requests_locally(requests_path, results_path):
+    """Send each exported request through completion_with_backoff and write Batch API style results."""
+    from tda.llm import completion_with_backoff
+
+    with open(requests_path, encoding="utf-8") as f_in, open(results_path, "w", encoding="utf-8") as f_out:
+        for line in f_in:
+            request = json.loads(line)
+            filename, iteration, _ = parse_custom_id(request["custom_id"])
+            completion = completion_with_backoff(filename=filename, iteration=iteration or 1, **request["body"])
+            f_out.write(json.dumps({
+                "id": f"batch_req_{request['custom_id']}",
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "body": completion.to_dict_recursive()},
+                "error": None,
+            }, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    import sys
+    import openai
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+    parser = argparse.ArgumentParser(description="Run an exported batch request file against a chat-completions endpoint")
+    parser.add_argument("requests", type=str, help="request JSONL written with --batch_export")
+    parser.add_argument("results", type=str, help="results JSONL to write (input for --batch_ingest)")
+    parser.add_argument("--api_base", type=str, default=None, help="alternative API base URL, e.g. a local mock server")
+    args = parser.parse_args()
+
+    openai.api_key = os.getenv("GPT4_KEY")
+    if args.api_base:
+        openai.api_base = args.api_base
+
+    run_requests_locally(args.requests, args.results)
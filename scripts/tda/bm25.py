@@ -0,0 +1,114 @@
+"""
+Project: Theory Discourse Analysis
+
+BM25 lexical prefilter for paragraph selection.
+
+Most body paragraphs never mention the vocabulary of a theory query (e.g. decay, forgetting,
+interference, retention), yet embedding-based selection embeds all of them to keep a few per
+article. The prefilter ranks each article's paragraphs with Okapi BM25 against the query and
+keeps only the top M plus a safety margin for embedding.
+
+Notes:
+- The inverted index is built in memory over all paragraphs (postings per term), so IDF
+  reflects the whole corpus being filtered
+- Tokens are lowercased alphabetic words; no stemming or stopword list (IDF down-weights
+  frequent words)
+- With several queries, a paragraph is kept if it is among the candidates of any query
+- Articles always keep min(M + margin, #paragraphs) paragraphs, even without any query term,
+  so the embedding stage can still select paragraphs for every article
+- selection_recall measures, on articles whose paragraphs were all embedded, how many of the
+  paragraphs selected without the prefilter are still selected with it
+"""
+
+
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from tda.selection import select_paragraphs, top_k_per_group
+
+TOKEN = re.compile(r"[a-z]+")
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+class BM25:
+    """Okapi BM25 over a list of documents with an in-memory inverted index."""
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+
+        postings = defaultdict(lambda: ([], []))
+        self.lengths = np.zeros(len(documents), dtype=np.float32)
+        for doc, text in enumerate(documents):
+            tokens = tokenize(text)
+            self.lengths[doc] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                postings[term][0].append(doc)
+                postings[term][1].append(tf)
+        self.postings = {term: (np.asarray(docs), np.asarray(tfs, dtype=np.float32))
+                         for term, (docs, tfs) in postings.items()}
+
+        average = self.lengths.mean() if len(documents) else 0.0
+        self._norm = k1 * (1 - b + b * self.lengths / (average or 1.0))
+
+    def idf(self, term):
+        n_docs = len(self.postings[term][0]) if term in self.postings else 0
+        return math.log(1 + (len(self.lengths) - n_docs + 0.5) / (n_docs + 0.5))
+
+    def scores(self, query):
+        """BM25 score of every document for the query (each distinct query term counted once)."""
+        scores = np.zeros(len(self.lengths), dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            docs, tfs = self.postings[term]
+            scores[docs] += self.idf(term) * tfs * (self.k1 + 1) / (tfs + self._norm[docs])
+        return scores
+
+
+def prefilter(paragraphs, queries, top_m, margin=5):
+    """
+    Boolean mask over the rows of paragraphs (DataFrame with filename and text) that keeps the
+    top_m + margin BM25 candidates per article for any of the queries.
+    """
+    keep = np.zeros(len(paragraphs), dtype=bool)
+    if len(paragraphs) == 0:
+        return keep
+    bm25 = BM25(list(paragraphs["text"]))
+
+    codes = pd.factorize(paragraphs["filename"])[0]
+    order = np.argsort(codes, kind="stable")
+    for query in queries:
+        rows, _ = top_k_per_group(bm25.scores(query)[order], codes[order], top_m + margin)
+        keep[order[rows]] = True
+    return keep
+
+
+def selection_recall(vectors, paragraphs, keep, query_vectors, top_n=3):
+    """
+    Per query and article: paragraphs selected from all paragraphs (n_selected), how many of
+    them are also selected from the kept paragraphs only (n_recovered), and paragraph counts.
+
+    vectors: embeddings of all rows of paragraphs (filename, paragraph_id, text); keep: prefilter mask.
+    """
+    full = select_paragraphs(vectors, paragraphs, query_vectors, top_n)
+    kept_rows = np.flatnonzero(keep)
+    filtered = select_paragraphs(np.asarray(vectors)[kept_rows], paragraphs.iloc[kept_rows], query_vectors, top_n)
+
+    key = ["query_id", "filename", "paragraph_id"]
+    full["recovered"] = full.set_index(key).index.isin(filtered.set_index(key).index)
+    report = (full.groupby(["query_id", "filename"])
+                  .agg(n_selected=("recovered", "size"), n_recovered=("recovered", "sum"))
+                  .reset_index())
+    counts = (paragraphs.assign(kept=keep)
+                        .groupby("filename")
+                        .agg(n_paragraphs=("kept", "size"), n_kept=("kept", "sum"))
+                        .reset_index())
+    return report.merge(counts, on="filename", how="left")
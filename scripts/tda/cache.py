@@ -0,0 +1,224 @@
+"""
+Project: Theory Discourse Analysis
+
+Content-addressed on-disk caches of LLM chat completions and text embeddings shared by all stages.
+
+Chat entries are keyed by model, system-prompt hash, input hash, temperature, and iteration
+index, and store the raw API response. Changes to downstream parsing or aggregation
+therefore never trigger new API traffic, while a changed QUERY or model does.
+
+Embedding entries are keyed by model and the hash of the whitespace-normalised text, and
+store the vector as float32 bytes. Paragraphs of unchanged TEI files, repeated selection
+runs, and new theory queries therefore only embed text that has not been seen before.
+
+Notes:
+- Each cache is a single SQLite file; point every stage at the same file to share it
+- Bounded by a maximum number of entries with least-recently-used eviction
+- Hit/miss/eviction counters are kept per process for run summaries
+"""
+
+
+import hashlib
+import json
+import re
+import sqlite3
+import time
+
+import numpy as np
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def normalise_text(text):
+    """Collapse whitespace (including the newlines the embedding calls replace) to single spaces."""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class ResponseCache:
+    """SQLite-backed LRU cache of chat-completion responses."""
+
+    def __init__(self, path, max_entries=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                prompt_hash TEXT,
+                input_hash TEXT,
+                temperature REAL,
+                iteration INTEGER,
+                response TEXT,
+                last_access REAL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._db.commit()
+        self._count = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def make_key(model, messages, temperature, iteration):
+        """Return (key, fields) for a chat request; the system message is treated as the prompt."""
+        prompt = "\n".join(m["content"] for m in messages if m["role"] == "system")
+        inputs = [m for m in messages if m["role"] != "system"]
+        fields = {
+            "model": model,
+            "prompt_hash": text_hash(prompt),
+            "input_hash": text_hash(json.dumps(inputs, sort_keys=True, ensure_ascii=False)),
+            "temperature": float(temperature),
+            "iteration": int(iteration),
+        }
+        key = text_hash(json.dumps(fields, sort_keys=True))
+        return key, fields
+
+    def get(self, key):
+        row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+        return json.loads(row[0])
+
+    def put(self, key, fields, response):
+        exists = self._db.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone()
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, fields["model"], fields["prompt_hash"], fields["input_hash"],
+             fields["temperature"], fields["iteration"], json.dumps(response), time.time()))
+        if not exists:
+            self._count += 1
+
+        # evict least recently used entries beyond the size bound
+        if self.max_entries and self._count > self.max_entries:
+            n_evict = self._count - self.max_entries
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                (n_evict,))
+            self._count -= n_evict
+            self.evictions += n_evict
+        self._db.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": self._count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        self._db.close()
+
+
+class EmbeddingCache:
+    """SQLite-backed LRU cache of embedding vectors keyed by model and normalised text hash."""
+
+    # SQLite limits the number of bound parameters per statement
+    LOOKUP_CHUNK = 500
+
+    def __init__(self, path, max_entries=2000000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                dim INTEGER,
+                vector BLOB,
+                last_access REAL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        self._db.commit()
+        self._count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model, text):
+        return text_hash(f"{model}\n{normalise_text(text)}")
+
+    def get_many(self, model, texts):
+        """Map each cached text of texts to its float32 vector."""
+        keys = {}
+        for text in texts:
+            keys.setdefault(self.make_key(model, text), []).append(text)
+
+        found = {}
+        hit_keys = []
+        key_list = list(keys)
+        for start in range(0, len(key_list), self.LOOKUP_CHUNK):
+            chunk = key_list[start:start + self.LOOKUP_CHUNK]
+            rows = self._db.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+            for key, vector in rows:
+                hit_keys.append(key)
+                for text in keys[key]:
+                    found[text] = np.frombuffer(vector, dtype=np.float32)
+
+        self.hits += len(hit_keys)
+        self.misses += len(keys) - len(hit_keys)
+        if hit_keys:
+            now = time.time()
+            self._db.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, k) for k in hit_keys])
+            self._db.commit()
+        return found
+
+    def put_many(self, model, texts, vectors):
+        now = time.time()
+        rows = {self.make_key(model, text): np.asarray(vector, dtype=np.float32)
+                for text, vector in zip(texts, vectors)}
+        new_keys = set(rows)
+        key_list = list(rows)
+        for start in range(0, len(key_list), self.LOOKUP_CHUNK):
+            chunk = key_list[start:start + self.LOOKUP_CHUNK]
+            existing = self._db.execute(
+                f"SELECT key FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+            new_keys -= {key for key, in existing}
+
+        self._db.executemany(
+            "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)",
+            [(key, model, len(vector), vector.tobytes(), now) for key, vector in rows.items()])
+        self._count += len(new_keys)
+
+        # evict least recently used entries beyond the size bound
+        if self.max_entries and self._count > self.max_entries:
+            n_evict = self._count - self.max_entries
+            self._db.execute(
+                "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                (n_evict,))
+            self._count -= n_evict
+            self.evictions += n_evict
+        self._db.commit()
+
+    def compact(self):
+        """Return the space freed by evictions to the file system."""
+        self._db.execute("VACUUM")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": self._count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,164 @@
+"""
+Project: Theory Discourse Analysis
+
+Local relevance classifier for the cascade mode of 04_screen_relevance_gpt4.py.
+
+A TF-IDF representation of each abstract and an L2-regularised logistic regression are
+trained on earlier screening results (mean_rating_relevance) and expert labels. At screening
+time, abstracts whose predicted probability of relevance is at or below a low threshold are
+decided as irrelevant, those at or above a high threshold as relevant, and only the uncertain
+band in between is sent to the LLM.
+
+Notes:
+- Plain numpy (no scikit-learn): dense TF-IDF over at most max_features unigrams and bigrams
+  (sublinear tf, smoothed idf, L2-normalised rows), logistic regression fitted with
+  accelerated gradient descent (FISTA); sized for corpora of a few thousand abstracts
+- Tokens as in the BM25 prefilter (tda/bm25.py): lowercased alphabetic words
+- Models are stored as one .npz file (vocabulary, idf, coefficients, intercept)
+- rating_labels only trains on articles the LLM rated, never on earlier cascade decisions
+- threshold_report estimates, with k-fold cross-validation, how many abstracts a pair of
+  thresholds would auto-decide and how many of those decisions disagree with the labels
+"""
+
+
+import math
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from tda.bm25 import tokenize
+
+
+def terms(text):
+    tokens = tokenize(text or "")
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class RelevanceModel:
+    """TF-IDF features with logistic regression; predict returns P(relevant) per text."""
+
+    def __init__(self, vocabulary, idf, coef, intercept):
+        self.vocabulary = list(vocabulary)
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.coef = np.asarray(coef, dtype=np.float32)
+        self.intercept = float(intercept)
+        self._columns = {term: j for j, term in enumerate(self.vocabulary)}
+
+    @staticmethod
+    def fit_vocabulary(texts, max_features=5000, min_df=2):
+        """Vocabulary (most frequent terms by document frequency) and smoothed idf."""
+        df = Counter()
+        for text in texts:
+            df.update(set(terms(text)))
+        kept = sorted(((count, term) for term, count in df.items() if count >= min_df), key=lambda x: (-x[0], x[1]))
+        kept = kept[:max_features]
+        vocabulary = [term for _, term in kept]
+        idf = [math.log((1 + len(texts)) / (1 + count)) + 1 for count, _ in kept]
+        return vocabulary, idf
+
+    def transform(self, texts):
+        X = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for term, tf in Counter(terms(text)).items():
+                j = self._columns.get(term)
+                if j is not None:
+                    X[i, j] = 1 + math.log(tf)
+        X *= self.idf
+        norms = np.linalg.norm(X, axis=1, keepdims=True)
+        return X / np.where(norms == 0, 1, norms)
+
+    @classmethod
+    def fit(cls, texts, labels, C=1.0, max_features=5000, min_df=2, iterations=1000):
+        """Fit on texts with 0/1 labels; C is the inverse regularisation strength (as in scikit-learn)."""
+        texts = list(texts)
+        y = np.asarray(labels, dtype=np.float32)
+        vocabulary, idf = cls.fit_vocabulary(texts, max_features, min_df)
+        model = cls(vocabulary, idf, np.zeros(len(vocabulary), dtype=np.float32), 0.0)
+        X = model.transform(texts)
+
+        # mean log-loss + l2/2 |w|^2; rows have norm <= 1, so with the intercept the
+        # gradient is Lipschitz with constant <= 0.25 * 2 + l2
+        n = max(len(y), 1)
+        l2 = 1.0 / (C * n)
+        step = 1.0 / (0.5 + l2)
+        w, b = model.coef.copy(), 0.0
+        w_y, b_y, t = w.copy(), b, 1.0
+        for _ in range(iterations):
+            residual = sigmoid(X @ w_y + b_y) - y
+            w_next = w_y - step * (X.T @ residual / n + l2 * w_y)
+            b_next = b_y - step * residual.mean()
+            t_next = (1 + math.sqrt(1 + 4 * t * t)) / 2
+            w_y = w_next + (t - 1) / t_next * (w_next - w)
+            b_y = b_next + (t - 1) / t_next * (b_next - b)
+            w, b, t = w_next, b_next, t_next
+
+        model.coef, model.intercept = w.astype(np.float32), float(b)
+        return model
+
+    def predict(self, texts):
+        return sigmoid(self.transform(list(texts)) @ self.coef + self.intercept)
+
+    def save(self, path):
+        np.savez(path, vocabulary=np.array(self.vocabulary, dtype=str), idf=self.idf,
+                 coef=self.coef, intercept=np.float32(self.intercept))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path, allow_pickle=False)
+        return cls(data["vocabulary"].tolist(), data["idf"], data["coef"], float(data["intercept"]))
+
+
+def rating_labels(ratings, threshold=0.5):
+    """
+    Training rows (filename, abstract, label) of a screening output: mean_rating_relevance at or
+    above threshold counts as relevant. Rows the cascade decided itself (cascade_decision other
+    than "llm") are left out, so a model is never trained on its own predictions.
+    """
+    if "cascade_decision" in ratings:
+        ratings = ratings[ratings["cascade_decision"] == "llm"]
+    mean_rating = pd.to_numeric(ratings["mean_rating_relevance"], errors="coerce")
+    ratings = ratings.assign(label=(mean_rating >= threshold).astype(float))[mean_rating.notna()]
+    return ratings[["filename", "abstract", "label"]].reset_index(drop=True)
+
+
+def decide(probabilities, low, high):
+    """Per probability: "irrelevant" (<= low), "relevant" (>= high), or "llm" (uncertain band)."""
+    probabilities = np.asarray(probabilities)
+    return np.where(probabilities <= low, "irrelevant", np.where(probabilities >= high, "relevant", "llm"))
+
+
+def threshold_report(texts, labels, thresholds, folds=5, seed=1, **fit_kwargs):
+    """
+    Cross-validated share of auto-decided abstracts and their error rate for each (low, high) pair.
+    """
+    texts = np.asarray(list(texts), dtype=object)
+    labels = np.asarray(labels, dtype=int)
+    fold_of = np.random.default_rng(seed).permutation(len(texts)) % folds
+
+    probabilities = np.zeros(len(texts))
+    for fold in range(folds):
+        test = fold_of == fold
+        if test.all() or not test.any():
+            continue
+        model = RelevanceModel.fit(texts[~test], labels[~test], **fit_kwargs)
+        probabilities[test] = model.predict(texts[test])
+
+    rows = []
+    for low, high in thresholds:
+        decision = decide(probabilities, low, high)
+        auto = decision != "llm"
+        wrong = auto & ((decision == "relevant") != (labels == 1))
+        rows.append({"low": low, "high": high, "n": len(texts),
+                     "auto_irrelevant": int((decision == "irrelevant").sum()),
+                     "auto_relevant": int((decision == "relevant").sum()),
+                     "forwarded": int((~auto).sum()),
+                     "auto_share": auto.mean() if len(texts) else 0.0,
+                     "errors": int(wrong.sum()),
+                     "error_rate": wrong.sum() / auto.sum() if auto.any() else 0.0,
+                     "missed_relevant": int((auto & (decision == "irrelevant") & (labels == 1)).sum())})
+    return pd.DataFrame(rows)
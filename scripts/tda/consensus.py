@@ -0,0 +1,26 @@
+"""
+Project: Theory Discourse Analysis
+
+Sequential consensus rule for repeated-iteration ratings.
+
+Instead of always spending the full --iterations budget on every article, the
+scripts can stop asking once the answers collected so far agree: after at least
+min_calls ratings, stop when the most frequent label accounts for at least the
+`agreement` share of all ratings (unparseable "NA" ratings count against agreement).
+Contested articles still receive the full budget.
+"""
+
+
+from collections import Counter
+
+
+def consensus_reached(ratings, min_calls=3, agreement=1.0):
+    if len(ratings) < min_calls:
+        return False
+
+    valid = [r for r in ratings if type(r) == int]
+    if not valid:
+        return False
+
+    n_modal = Counter(valid).most_common(1)[0][1]
+    return n_modal / len(ratings) >= agreement
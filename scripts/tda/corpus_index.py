@@ -0,0 +1,181 @@
+"""
+Project: Theory Discourse Analysis
+
+Persistent, incremental index of a TEI corpus (e.g., data_xml/grobid_output).
+
+Stores, per XML file, the MD5 idno, DOI, title, abstract, date, authors, and all
+paragraph texts in one SQLite file. Entries are keyed by path, modification time,
+and size, so a refresh only re-parses new or changed files and forgets deleted ones.
+Dedup, missing-abstract filtering, relevance screening, and paragraph extraction
+can then query the index (--index) instead of re-parsing the raw XML.
+
+Notes:
+- Files that fail to parse are stored with their error and retried once they change
+- Parsing during refresh runs on a process pool (see tda/scan.py)
+- Missing metadata fields are stored as "NA", matching tda.tei.read_tei_record
+- PARSER_VERSION is stored as the SQLite user_version; an index written by another version
+  of the TEI parsing is emptied on open, so every file is re-parsed on the next refresh
+"""
+
+
+import os
+import sqlite3
+from itertools import groupby
+
+from tda.scan import list_xml_files, scan_directory
+from tda.tei import TEI_FIELDS, read_tei_document
+
+# bump when tda.tei.read_tei_document extracts different fields or paragraphs
+# (2: only paragraphs of <body>; 3: empty MD5 idnos stored as None)
+PARSER_VERSION = 3
+
+
+class CorpusIndex:
+    """SQLite index of per-file TEI fields and paragraphs."""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                directory TEXT,
+                filename TEXT,
+                mtime REAL,
+                size INTEGER,
+                md5 TEXT,
+                title TEXT,
+                abstract TEXT,
+                has_abstract INTEGER,
+                doi TEXT,
+                date TEXT,
+                authors TEXT,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS files_directory ON files (directory, filename);
+            CREATE TABLE IF NOT EXISTS paragraphs (
+                path TEXT REFERENCES files (path) ON DELETE CASCADE,
+                paragraph_id INTEGER,
+                text TEXT,
+                PRIMARY KEY (path, paragraph_id)
+            );
+        """)
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != PARSER_VERSION:
+            self._db.execute("DELETE FROM files")
+            self._db.execute(f"PRAGMA user_version = {PARSER_VERSION}")
+        self._db.commit()
+
+    @staticmethod
+    def _directory(xml_dir):
+        return os.path.abspath(os.fsdecode(xml_dir))
+
+    def refresh(self, xml_dir, workers=None, chunksize=16):
+        """
+        Bring the index up to date with xml_dir.
+
+        Returns a dict with the number of parsed, unchanged, removed, and failed files.
+        """
+        directory = self._directory(xml_dir)
+        indexed = {row[0]: (row[1], row[2]) for row in self._db.execute(
+            "SELECT filename, mtime, size FROM files WHERE directory = ?", (directory,))}
+
+        current = {}
+        for filename in list_xml_files(directory):
+            stat = os.stat(os.path.join(directory, filename))
+            current[filename] = (stat.st_mtime, stat.st_size)
+
+        changed = [f for f, key in current.items() if indexed.get(f) != key]
+        removed = [f for f in indexed if f not in current]
+        self.forget(directory, removed)
+
+        parsed, failures = scan_directory(directory, read_tei_document, workers, chunksize, filenames=sorted(changed))
+
+        for filename, document in parsed:
+            path = os.path.join(directory, filename)
+            mtime, size = current[filename]
+            self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+            self._db.execute(
+                "INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, NULL)",
+                (path, directory, filename, mtime, size, document["md5"], document["title"],
+                 document["abstract"], int(document["has_abstract"]), document["DOI"],
+                 document["date"], document["authors"]))
+            self._db.executemany(
+                "INSERT INTO paragraphs VALUES (?, ?, ?)",
+                [(path, i + 1, text) for i, text in enumerate(document["paragraphs"])])
+
+        for filename, error in failures:
+            path = os.path.join(directory, filename)
+            mtime, size = current[filename]
+            self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+            self._db.execute(
+                "INSERT INTO files (path, directory, filename, mtime, size, error) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, directory, filename, mtime, size, error))
+        self._db.commit()
+
+        return {"parsed": len(parsed), "unchanged": len(current) - len(changed),
+                "removed": len(removed), "failed": len(failures)}
+
+    def forget(self, xml_dir, filenames):
+        """Drop files from the index, e.g. after a stage deleted them."""
+        directory = self._directory(xml_dir)
+        self._db.executemany("DELETE FROM files WHERE path = ?",
+                             [(os.path.join(directory, f),) for f in filenames])
+        self._db.commit()
+
+    def _select(self, xml_dir, columns, where=""):
+        return self._db.execute(
+            f"SELECT {columns} FROM files WHERE directory = ? AND error IS NULL {where} ORDER BY filename",
+            (self._directory(xml_dir),))
+
+    def records(self, xml_dir):
+        """Metadata records (as returned by tda.tei.read_tei_record) in filename order."""
+        for row in self._select(xml_dir, "filename, title, abstract, doi, date, authors"):
+            yield dict(zip(TEI_FIELDS, row))
+
+    def abstract_flags(self, xml_dir):
+        """(filename, has_abstract) pairs in filename order."""
+        return [(f, bool(flag)) for f, flag in self._select(xml_dir, "filename, has_abstract")]
+
+    def failures(self, xml_dir):
+        """(filename, error) pairs for files that could not be parsed."""
+        return self._db.execute(
+            "SELECT filename, error FROM files WHERE directory = ? AND error IS NOT NULL ORDER BY filename",
+            (self._directory(xml_dir),)).fetchall()
+
+    def paragraphs(self, xml_dir, filenames=None):
+        """Yield (filename, paragraph_id, text) in filename and document order."""
+        directory = self._directory(xml_dir)
+        if filenames is None:
+            rows = self._db.execute(
+                "SELECT f.filename, p.paragraph_id, p.text FROM paragraphs p JOIN files f ON f.path = p.path "
+                "WHERE f.directory = ? ORDER BY f.filename, p.paragraph_id", (directory,))
+            yield from rows
+            return
+
+        for filename in filenames:
+            yield from self._db.execute(
+                "SELECT ?, paragraph_id, text FROM paragraphs WHERE path = ? ORDER BY paragraph_id",
+                (filename, os.path.join(directory, filename)))
+
+    def documents(self, xml_dir):
+        """
+        Yield documents (as returned by tda.tei.read_tei_document, without the date, DOI,
+        and authors) in filename order.
+        """
+        paragraphs = groupby(self.paragraphs(xml_dir), key=lambda row: row[0])
+        current = next(paragraphs, None)
+        for filename, md5, title, abstract, flag in self._select(xml_dir, "filename, md5, title, abstract, has_abstract"):
+            # files without paragraphs have no rows in the paragraphs table
+            while current is not None and current[0] < filename:
+                current = next(paragraphs, None)
+            texts = []
+            if current is not None and current[0] == filename:
+                texts = [text for _, _, text in current[1]]
+                current = next(paragraphs, None)
+            yield {"filename": filename, "md5": md5, "title": title, "abstract": abstract,
+                   "has_abstract": bool(flag), "paragraphs": texts}
+
+    def close(self):
+        self._db.close()
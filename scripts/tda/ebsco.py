@@ -0,0 +1,137 @@
+"""
+Project: Theory Discourse Analysis
+
+Reading and indexing of EBSCO XML exports (records/rec/header/controlInfo).
+
+Notes:
+- Each <rec> is reduced to a flat record: identifiers (<ui>), article and book titles
+  (<atl>, <btl>), authors (<au>), publication date (<dt>), and whether full-text formats
+  are listed (<artinfo/formats>)
+- read_ebsco_records streams the export with iterparse and clears each <rec> once it is
+  reduced, so memory stays bounded by one record even for exports of broad searches
+- EbscoIndex is built once per export: normalised identifiers go into a hash map and
+  normalised titles into a token index, so looking up a CSV row no longer scans the export
+- Lookups only match unique records, as the original per-row XPath matching did
+"""
+
+
+import re
+from collections import defaultdict
+
+from lxml import etree
+
+DOI_PREFIX = re.compile(r"^(https?://(dx\.)?doi\.org/|doi:\s*)")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def normalise_doi(doi):
+    """Lowercase DOI without URL or "doi:" prefix; None for missing values."""
+    if doi is None or doi != doi:
+        return None
+    doi = DOI_PREFIX.sub("", str(doi).strip().lower())
+    return doi if doi and doi != "nan" else None
+
+
+def title_tokens(title):
+    """Lowercase alphanumeric tokens of a title; [] for missing values."""
+    if title is None or title != title:
+        return []
+    tokens = TOKEN_PATTERN.findall(str(title).lower())
+    return tokens if tokens != ["nan"] else []
+
+
+def _text(element, path):
+    found = element.find(path)
+    return found.text if found is not None and found.text else None
+
+
+def _record(rec):
+    control_info = rec.find("header/controlInfo")
+    if control_info is None:
+        control_info = rec
+
+    date = None
+    dt = control_info.find(".//dt")
+    if dt is not None:
+        year, month, day = dt.get("year"), dt.get("month"), dt.get("day")
+        if year and month and day:
+            date = f"{year}-{month}-{day}"
+
+    doi = None
+    for ui in control_info.iterfind(".//ui"):
+        if ui.get("type") == "doi" and ui.text:
+            doi = ui.text
+            break
+
+    return {
+        "ids": [ui.text for ui in control_info.iterfind(".//ui") if ui.text],
+        "doi": doi,
+        "title": _text(control_info, ".//atl"),
+        "book_title": _text(control_info, ".//btl"),
+        "authors": [au.text for au in control_info.iterfind(".//au") if au.text],
+        "date": date,
+        "has_formats": control_info.find("artinfo/formats") is not None,
+    }
+
+
+def read_ebsco_records(path):
+    """Yield one flat record per <rec> of an EBSCO XML export, streaming in bounded memory."""
+    # huge_tree lifts libxml2's limits on very large exports
+    for _, rec in etree.iterparse(path, events=("end",), tag="rec", huge_tree=True):
+        yield _record(rec)
+
+        # drop the record and everything parsed before it, so the tree never grows
+        rec.clear()
+        parent = rec.getparent()
+        if parent is not None:
+            while rec.getprevious() is not None:
+                del parent[0]
+
+
+class EbscoIndex:
+    """Hash map of normalised identifiers and token index of normalised titles over EBSCO records."""
+
+    def __init__(self, records):
+        self.records = []
+        self._ids = {}
+        self._tokens = defaultdict(set)
+        self._titles = []
+
+        for position, record in enumerate(records):
+            self.records.append(record)
+            # identifiers shared by several records are ambiguous and never match
+            for key in {normalise_doi(ui) for ui in record["ids"]} - {None}:
+                self._ids[key] = position if key not in self._ids else None
+
+            titles = [" ".join(title_tokens(t)) for t in (record["title"], record["book_title"])]
+            titles = [t for t in titles if t]
+            self._titles.append(titles)
+            for title in titles:
+                for token in title.split():
+                    self._tokens[token].add(position)
+
+    def __len__(self):
+        return len(self.records)
+
+    def find_doi(self, doi):
+        """Position of the unique record with this identifier, or None."""
+        key = normalise_doi(doi)
+        return self._ids.get(key) if key is not None else None
+
+    def find_title(self, title):
+        """Position of the unique record whose title contains this title (as whole tokens), or None."""
+        tokens = title_tokens(title)
+        if not tokens:
+            return None
+
+        # blocking: only records sharing every token are candidates, starting from the rarest
+        postings = sorted((self._tokens.get(token, set()) for token in set(tokens)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates &= posting
+            if not candidates:
+                return None
+
+        query = f" {' '.join(tokens)} "
+        matches = [p for p in candidates if any(query in f" {t} " for t in self._titles[p])]
+        return matches[0] if len(matches) == 1 else None
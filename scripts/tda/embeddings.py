@@ -0,0 +1,114 @@
+"""
+Project: Theory Discourse Analysis
+
+Batched paragraph embeddings and their binary storage.
+
+Notes:
+- Texts are sent to the embeddings endpoint in batches (one request per batch instead of
+  one per paragraph), with exponential backoff on API errors
+- Newlines are replaced by spaces before embedding, as openai.embeddings_utils.get_embedding does
+- Vectors are stored as one float32 matrix in <prefix>.npy, written batch by batch through
+  a memory map, with a row-to-paragraph index in <prefix>.index.csv (row, filename,
+  paragraph_id, text); load_embeddings memory-maps the matrix, so reloading is near-instant
+- embed_cached consults a tda.cache.EmbeddingCache first and only sends texts that have not
+  been embedded with the same model before (texts that only differ in whitespace are sent once)
+"""
+
+
+import logging
+
+import backoff
+import numpy as np
+import openai
+import pandas as pd
+from openai.error import OpenAIError
+from tqdm import tqdm
+
+logger = logging.getLogger('rating_log')
+
+INDEX_COLUMNS = ["row", "filename", "paragraph_id", "text"]
+
+
+def log_backoff_exception(details):
+    logger.error("Backing off {wait:0.1f} seconds after {tries} tries for an embedding batch".format(**details))
+
+
+@backoff.on_exception(backoff.expo, OpenAIError, on_backoff=log_backoff_exception, logger="rating_log")
+def _embed_with_backoff(texts, model):
+    return openai.Embedding.create(input=texts, model=model)
+
+
+def embed_batch(texts, model):
+    """Embed a list of texts in one request; returns a float32 matrix with one row per text."""
+    response = _embed_with_backoff([t.replace("\n", " ") for t in texts], model)
+    data = sorted(response["data"], key=lambda d: d["index"])
+    return np.asarray([d["embedding"] for d in data], dtype=np.float32)
+
+
+def embed_cached(texts, model, cache, embed=embed_batch):
+    """Like embed_batch, but texts found in the EmbeddingCache are not sent again."""
+    found = cache.get_many(model, texts)
+
+    # one request per distinct normalised text
+    missing = {}
+    for text in texts:
+        if text not in found:
+            missing.setdefault(cache.make_key(model, text), []).append(text)
+    if missing:
+        unique = [group[0] for group in missing.values()]
+        vectors = embed(unique, model)
+        cache.put_many(model, unique, vectors)
+        for group, vector in zip(missing.values(), vectors):
+            found.update((text, vector) for text in group)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack([found[t] for t in texts]).astype(np.float32, copy=False)
+
+
+def iter_batches(texts, batch_size=256):
+    for start in range(0, len(texts), batch_size):
+        yield start, texts[start:start + batch_size]
+
+
+def paths(prefix):
+    return f"{prefix}.npy", f"{prefix}.index.csv"
+
+
+def embed_to_file(prefix, index, model, batch_size=256, embed=embed_batch):
+    """
+    Embed index["text"] batch by batch into <prefix>.npy and write the row index to <prefix>.index.csv.
+
+    index: DataFrame with filename, paragraph_id, and text columns (one row per paragraph).
+    embed: function (texts, model) -> float32 matrix, e.g. embed_batch or a cached variant.
+    Returns the number of rows written.
+    """
+    vectors_path, index_path = paths(prefix)
+    texts = list(index["text"])
+
+    matrix = None
+    n_batches = (len(texts) + batch_size - 1) // batch_size
+    for start, batch in tqdm(iter_batches(texts, batch_size), total=n_batches):
+        vectors = embed(batch, model)
+        if matrix is None:
+            # the dimension is only known once the first batch is back
+            matrix = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float32,
+                                               shape=(len(texts), vectors.shape[1]))
+        matrix[start:start + len(batch)] = vectors
+    if matrix is None:
+        np.save(vectors_path, np.zeros((0, 0), dtype=np.float32))
+    else:
+        matrix.flush()
+        del matrix
+
+    out = index[["filename", "paragraph_id", "text"]].reset_index(drop=True)
+    out.insert(0, "row", range(len(out)))
+    out[INDEX_COLUMNS].to_csv(index_path, index=False)
+    return len(out)
+
+
+def load_embeddings(prefix, mmap=True):
+    """Return (vectors, index): the float32 matrix (memory-mapped unless mmap=False) and the row index."""
+    vectors_path, index_path = paths(prefix)
+    vectors = np.load(vectors_path, mmap_mode="r" if mmap else None)
+    index = pd.read_csv(index_path, keep_default_na=False)
+    return vectors, index
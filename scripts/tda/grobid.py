@@ -0,0 +1,120 @@
+"""
+Project: Theory Discourse Analysis
+
+Asynchronous client for the GROBID full-text service and the PDF content hashes used to skip
+PDFs that already have a TEI output.
+
+Notes:
+- All requests share one pooled aiohttp session; an asyncio semaphore bounds the number of
+  PDFs in flight, which should not exceed the GROBID server's own pool (its concurrency setting)
+- GROBID answers 503 when all its workers are busy; 503, 429, 502, and 504 answers,
+  connection errors, and timeouts are retried with exponential backoff (max_tries attempts)
+- Other errors (400, 500 for PDFs GROBID cannot process, 204 for PDFs without extractable
+  content) fail the PDF immediately
+- pdf_md5 is the hash GROBID writes to the TEI header as <idno type="MD5">, so existing TEI
+  files can be matched to their PDFs with tda.tei.read_md5
+- Point url at a local stub (see tda/grobid_stub.py) to test without a GROBID installation
+"""
+
+
+import asyncio
+import hashlib
+import logging
+import os
+
+import aiohttp
+import backoff
+
+logger = logging.getLogger('rating_log')
+
+# answers that mean "try again later"
+RETRY_STATUSES = {429, 502, 503, 504}
+
+
+class GrobidError(Exception):
+    """A PDF GROBID could not convert."""
+
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+class GrobidBusy(GrobidError):
+    """A transient answer (server busy or overloaded); the request is retried."""
+
+
+def pdf_md5(path, chunk_size=1 << 20):
+    """Uppercase MD5 of a file's content, as GROBID writes it to the TEI header."""
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest().upper()
+
+
+def tei_filename(pdf_filename):
+    """Output name of a PDF's TEI file, as written by the GROBID client (<stem>.grobid.tei.xml)."""
+    return f"{os.path.splitext(pdf_filename)[0]}.grobid.tei.xml"
+
+
+def log_backoff_exception(details):
+    details["filename"] = details["args"][0]
+    logger.error("Backing off {wait:0.1f} seconds after {tries} tries for file '{filename}'".format(**details))
+
+
+class GrobidClient:
+    """
+    Convert PDFs with a GROBID service, at most `concurrency` at a time.
+
+    Use as an async context manager so that all requests share one pooled HTTP session:
+
+        async with GrobidClient("http://localhost:8070", concurrency=4) as client:
+            tei = await client.process_fulltext(filename, pdf_bytes)
+    """
+
+    def __init__(self, url="http://localhost:8070", concurrency=4, timeout=300.0, max_tries=6, options=None):
+        self.url = url.rstrip("/")
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.options = dict(options or {})
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._session = None
+        self._post = backoff.on_exception(backoff.expo, (GrobidBusy, aiohttp.ClientError, asyncio.TimeoutError),
+                                          max_tries=max_tries, on_backoff=log_backoff_exception,
+                                          logger="rating_log")(self._post_once)
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.concurrency),
+                                              timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    async def is_alive(self):
+        try:
+            async with self._session.get(f"{self.url}/api/isalive") as response:
+                return response.status == 200 and (await response.text()).strip().lower() == "true"
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+    async def _post_once(self, filename, data):
+        form = aiohttp.FormData()
+        form.add_field("input", data, filename=filename, content_type="application/pdf")
+        for name, value in self.options.items():
+            form.add_field(name, str(value))
+
+        async with self._session.post(f"{self.url}/api/processFulltextDocument", data=form) as response:
+            text = await response.text()
+            if response.status == 200:
+                return text
+            if response.status in RETRY_STATUSES:
+                raise GrobidBusy(response.status, text[:200])
+            if response.status == 204:
+                raise GrobidError(204, "no content could be extracted")
+            raise GrobidError(response.status, text[:200])
+
+    async def process_fulltext(self, filename, data):
+        """TEI XML of one PDF (filename is only sent along); raises GrobidError or the last transient error."""
+        async with self._semaphore:
+            return await self._post(filename, data)
@@ -0,0 +1,185 @@
+"""
+Project: Theory Discourse Analysis
+
+Local stub of the GROBID full-text service that returns canned TEI, for testing the PDF
+conversion stage without a GROBID installation.
+
+Usage:
+    python scripts/tda/grobid_stub.py --port 8070
+    python scripts/03_parse_xml/03_convert_pdfs_grobid.py -i data_raw/pdfs -o data_xml/grobid_output --grobid_url http://127.0.0.1:8070
+
+Notes:
+- POST /api/processFulltextDocument answers every uploaded file (form field "input") with a
+  GROBID-style TEI document after an optional latency; the header carries the MD5 of the
+  upload as <idno type="MD5">, like real GROBID output, and the title is the upload's filename
+- --tei_template replaces the canned document; {title} and {md5} are filled in
+- --max_concurrent makes the stub answer 503 while that many requests are in flight, as
+  GROBID does when its pool is exhausted; --error_rate_503 injects such answers at random
+- Uploads whose filename contains --fail_pattern are answered with 500, like PDFs GROBID
+  cannot process
+- GET /api/isalive answers "true"; request counts per status are in server.stats (also
+  served at GET /stats)
+"""
+
+
+import argparse
+import collections
+import email.parser
+import email.policy
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+TEI_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader><fileDesc><titleStmt><title level="a" type="main">{title}</title></titleStmt>
+<publicationStmt><date type="published" when="2001">2001</date></publicationStmt>
+<sourceDesc><biblStruct><analytic><author><persName><forename>Ann</forename><surname>Stub</surname></persName></author><idno type="MD5">{md5}</idno></analytic></biblStruct></sourceDesc></fileDesc>
+<profileDesc><abstract>
+<div><p>Canned abstract of {title}: memory traces decay over time unless they are rehearsed.</p></div></abstract></profileDesc></teiHeader>
+<text><body><div><p>Canned paragraph of {title} on forgetting and retention intervals.</p></div><div><p>Canned paragraph of {title} on interference in recall.</p></div></body></text></TEI>
+"""
+
+
+def read_upload(content_type, body):
+    """(filename, bytes) of the "input" field of a multipart/form-data body, or (None, None)."""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body)
+    for part in message.iter_parts():
+        if part.get_param("name", header="content-disposition") == "input":
+            return part.get_filename(), part.get_payload(decode=True)
+    return None, None
+
+
+class GrobidStubHandler(BaseHTTPRequestHandler):
+    tei_template = TEI_TEMPLATE
+    latency = 0.0
+    error_rate_503 = 0.0
+    max_concurrent = None
+    fail_pattern = None
+
+    # per-server state, replaced in start_grobid_stub
+    rng = random.Random()
+    lock = threading.Lock()
+    in_flight = 0
+    stats = collections.Counter()
+
+    def _admit(self):
+        """Status to answer before processing (503 when busy), or None to process the upload."""
+        cls = type(self)
+        with self.lock:
+            self.stats["requests"] += 1
+            if self.max_concurrent and cls.in_flight >= self.max_concurrent:
+                return 503
+            if self.rng.random() < self.error_rate_503:
+                return 503
+            cls.in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], cls.in_flight)
+        return None
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+
+        if not self.path.rstrip("/").endswith("/api/processFulltextDocument"):
+            self._send(404, f"Unknown endpoint {self.path}")
+            return
+
+        status = self._admit()
+        if status is not None:
+            with self.lock:
+                self.stats[f"status_{status}"] += 1
+            self._send(status, "Service unavailable: all GROBID workers are busy")
+            return
+
+        try:
+            if self.latency > 0:
+                time.sleep(self.latency)
+            filename, data = read_upload(self.headers.get("Content-Type", ""), body)
+            if data is None:
+                status, text = 400, "Missing input file"
+            elif self.fail_pattern and self.fail_pattern in (filename or ""):
+                status, text = 500, "[BAD_INPUT_DATA] PDF could not be parsed"
+            else:
+                title = escape((filename or "upload").rsplit(".", 1)[0])
+                status, text = 200, self.tei_template.format(title=title, md5=hashlib.md5(data).hexdigest().upper())
+        finally:
+            with self.lock:
+                type(self).in_flight -= 1
+
+        with self.lock:
+            self.stats[f"status_{status}"] += 1
+        self._send(status, text, "application/xml" if status == 200 else "text/plain")
+
+    def do_GET(self):
+        path = self.path.rstrip("/")
+        if path.endswith("/api/isalive"):
+            self._send(200, "true")
+        elif path.endswith("/stats"):
+            with self.lock:
+                self._send(200, json.dumps(dict(self.stats)), "application/json")
+        else:
+            self._send(404, f"Unknown endpoint {self.path}")
+
+    def _send(self, status, text, content_type="text/plain"):
+        data = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", f"{content_type}; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_grobid_stub(host="127.0.0.1", port=0, tei_template=None, latency=0.0, error_rate_503=0.0,
+                      max_concurrent=None, fail_pattern=None, seed=None):
+    """
+    Start the stub in a background thread and return it (server.server_address holds the
+    port, server.stats the request counts).
+    """
+    handler = type("ConfiguredGrobidStubHandler", (GrobidStubHandler,), {
+        "tei_template": tei_template if tei_template is not None else TEI_TEMPLATE,
+        "latency": latency,
+        "error_rate_503": error_rate_503,
+        "max_concurrent": max_concurrent,
+        "fail_pattern": fail_pattern,
+        "rng": random.Random(seed),
+        "lock": threading.Lock(),
+        "in_flight": 0,
+        "stats": collections.Counter(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.stats = handler.stats
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stub of the GROBID full-text service")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="interface to bind")
+    parser.add_argument("--port", type=int, default=8070, help="port to bind")
+    parser.add_argument("--tei_template", type=str, default=None, help="file with the TEI answer ({title} and {md5} are filled in)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--error_rate_503", type=float, default=0.0, help="probability of an injected 503 answer")
+    parser.add_argument("--max_concurrent", type=int, default=None, help="requests in flight before the stub answers 503")
+    parser.add_argument("--fail_pattern", type=str, default=None, help="answer 500 for uploads whose filename contains this text")
+    parser.add_argument("--seed", type=int, default=None, help="seed for injected errors")
+    args = parser.parse_args()
+
+    tei_template = None
+    if args.tei_template:
+        with open(args.tei_template, encoding="utf-8") as f:
+            tei_template = f.read()
+    server = start_grobid_stub(args.host, args.port, tei_template, args.latency, args.error_rate_503,
+                               args.max_concurrent, args.fail_pattern, args.seed)
+    print(f"GROBID stub on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,96 @@
+"""
+Project: Theory Discourse Analysis
+
+Append-only checkpoint journal for the LLM-assisted classification scripts.
+
+Each completed request is written once, as one JSON line, and flushed to disk
+before the script moves on. A crash therefore loses at most the requests that
+were in flight, and a rerun with --resume skips everything already journaled.
+The final CSV is materialised from the journal once, at the end of a run.
+
+Notes:
+- A partially written last line (e.g., after a power loss) is ignored on reload
+- Without resume the journal is truncated, mirroring how the scripts overwrite
+  their CSV and log outputs
+"""
+
+
+import json
+import os
+
+
+class Journal:
+    """Append-only JSONL journal of per-request results."""
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.records = self._load() if resume else []
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return []
+
+        records = []
+        valid_bytes = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated record")
+                    records.append(json.loads(line))
+                except ValueError:
+                    # interrupted write; the request is simply redone
+                    break
+                valid_bytes += len(line)
+
+        # drop the damaged tail so that new records start on a clean line
+        if valid_bytes < os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_bytes)
+        return records
+
+    def append(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.records.append(record)
+
+    def extend(self, records):
+        """Append many records with a single flush, e.g. when ingesting batch results."""
+        records = list(records)
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.records.extend(records)
+
+    def retain(self, keep, field="filename"):
+        """Rewrite the journal with only the records whose field is in keep (e.g. unchanged articles)."""
+        self._file.close()
+        self.records = [r for r in self.records if r.get(field) in keep]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in self.records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def completed(self, *fields):
+        """Return the set of key tuples (e.g., filename, iteration) already journaled."""
+        return {tuple(r[f] for f in fields) for r in self.records}
+
+    def results(self, *fields):
+        """Map key tuples to their most recent record."""
+        return {tuple(r[f] for f in fields): r for r in self.records}
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
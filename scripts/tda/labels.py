@@ -0,0 +1,114 @@
+"""
+Project: Theory Discourse Analysis
+
+Tolerant extraction of category labels from LLM answers, with bounded re-asks.
+
+The scripts ask for a category label on the first line followed by a rationale in a
+new paragraph. Answers often deviate in harmless ways: an extra blank line, a trailing
+period, bold markup, a "Label:" prefix, or "tacit acceptance" spelled with a space.
+LabelExtractor accepts all of these and maps aliases onto the canonical labels; only
+answers without a recognisable label are re-asked, at most max_reasks times per request.
+
+Notes:
+- The label is taken from the first non-empty line only; if that line mentions exactly one
+  label (e.g., "The abstract is relevant."), that label is used
+- The rationale is the rest of the answer after the label line ("NA" if there is none)
+- LabelExtractor counts re-asks and unparseable answers per run (reasks, unparseable)
+"""
+
+
+import re
+
+PREFIX = re.compile(r"^(label|category|rating|answer|classification)\s*[:\-]\s*")
+NON_WORD = re.compile(r"[^a-z0-9_\s-]+")
+SEPARATORS = re.compile(r"[\s\-]+")
+
+REASK_MESSAGE = """Your previous answer could not be read. Reply with exactly one of the category labels ({labels}) \
+on the first line, followed by your rationale in a new paragraph."""
+
+
+def normalise_label(text):
+    """Lowercase, drop punctuation and markup, and join words with underscores ("Tacit acceptance." -> "tacit_acceptance")."""
+    text = PREFIX.sub("", text.strip().lower())
+    text = NON_WORD.sub(" ", text).strip()
+    return SEPARATORS.sub("_", text)
+
+
+class LabelExtractor:
+    """
+    Map answers onto category ids.
+
+    labels: dict of canonical label -> category id, e.g. {"irrelevant": 0, "relevant": 1}
+    aliases: dict of alternative spelling -> canonical label, e.g. {"not relevant": "irrelevant"}
+    """
+
+    def __init__(self, labels, aliases=None, max_reasks=2):
+        self.labels = labels
+        self.aliases = {normalise_label(label): label for label in labels}
+        for alias, label in (aliases or {}).items():
+            self.aliases[normalise_label(alias)] = label
+        # longest spellings first, so "not_relevant" wins over "relevant"
+        self._spellings = sorted(self.aliases, key=len, reverse=True)
+        self.max_reasks = max_reasks
+        self.reasks = 0
+        self.unparseable = 0
+
+    def extract(self, result):
+        """Return (label, rationale); label is None if the answer has no recognisable label."""
+        lines = (result or "").strip().split("\n")
+        first = lines[0] if lines else ""
+        rationale = "\n".join(lines[1:]).strip() or "NA"
+
+        normalised = normalise_label(first)
+        if normalised in self.aliases:
+            return self.aliases[normalised], rationale
+
+        # otherwise accept a first line that mentions exactly one label
+        found = set()
+        remaining = f"_{normalised}_"
+        for spelling in self._spellings:
+            if f"_{spelling}_" in remaining:
+                found.add(self.aliases[spelling])
+                remaining = remaining.replace(f"_{spelling}_", "__")
+        if len(found) == 1:
+            return found.pop(), rationale
+        return None, rationale
+
+    def parse(self, result):
+        """Return (category id, rationale) with "NA" for unparseable answers, as the scripts' parsers do."""
+        label, rationale = self.extract(result)
+        if label is None:
+            self.unparseable += 1
+            return "NA", "NA"
+        return self.labels[label], rationale
+
+    def reask_messages(self, messages, result):
+        """Messages that repeat the conversation and ask for a readable label."""
+        self.reasks += 1
+        return messages + [
+            {"role": "assistant", "content": result or ""},
+            {"role": "user", "content": REASK_MESSAGE.format(labels=", ".join(f'"{l}"' for l in self.labels))},
+        ]
+
+    def complete(self, completion_function, messages, **kwargs):
+        """Call completion_function(messages=..., **kwargs) and re-ask until the answer has a label."""
+        result = completion_function(messages=messages, **kwargs).choices[0].message.content
+        for _ in range(self.max_reasks):
+            if self.extract(result)[0] is not None:
+                break
+            messages = self.reask_messages(messages, result)
+            result = completion_function(messages=messages, **kwargs).choices[0].message.content
+        return result
+
+    async def acomplete(self, completion_function, messages, **kwargs):
+        """Asynchronous variant of complete (e.g., for AsyncChatClient.complete)."""
+        result = (await completion_function(messages=messages, **kwargs)).choices[0].message.content
+        for _ in range(self.max_reasks):
+            if self.extract(result)[0] is not None:
+                break
+            messages = self.reask_messages(messages, result)
+            result = (await completion_function(messages=messages, **kwargs)).choices[0].message.content
+        return result
+
+    def stats(self):
+        return {"reasks": self.reasks, "unparseable": self.unparseable}
@@ -0,0 +1,234 @@
+"""
+Project: Theory Discourse Analysis
+
+Shared chat-completion wrappers and the asynchronous request engine for the
+LLM-assisted classification scripts.
+
+Notes:
+- completion_with_backoff and AsyncChatClient.complete consult the response cache
+  (tda/cache.py) before any API call when one is configured via set_response_cache()
+- Bounded concurrency via an asyncio semaphore
+- Client-side limiter for requests per minute (RPM) and tokens per minute (TPM); retries after
+  a backoff wait pass through the limiter again, so they count against the same budget
+- Prompt tokens are estimated from message length (~4 characters per token) and
+  corrected with the usage reported by the API once a response arrives
+- With a tda.telemetry.Telemetry configured via set_telemetry(), every call (cache hits,
+  re-asks, and packed requests included) is recorded with latency, limiter wait, tokens,
+  retries, and backoff time
+- Point openai.api_base at a local mock server (see tda/mock_server.py) to test
+  without spending API credits
+"""
+
+
+import asyncio
+import logging
+import time
+
+import aiohttp
+import backoff
+import openai
+from openai.error import OpenAIError
+
+from tda.telemetry import current_call, record_backoff, start_call
+
+logger = logging.getLogger('rating_log')
+
+# completion budget reserved per request until the actual usage is known
+COMPLETION_TOKENS_ESTIMATE = 256
+
+# optional tda.cache.ResponseCache shared by all calls in this process
+response_cache = None
+
+# optional tda.telemetry.Telemetry recording every call in this process
+telemetry = None
+
+
+def set_response_cache(cache):
+    global response_cache
+    response_cache = cache
+
+
+def set_telemetry(recorder):
+    global telemetry
+    telemetry = recorder
+
+
+def log_backoff_exception(details):
+    record_backoff(details)
+    details["filename"] = details["kwargs"]["filename"]
+    logger.error("Backing off {wait:0.1f} seconds after {tries} tries for file '{filename}'".format(**details))
+
+
+# access OpenAI API in exponential time intervals
+@backoff.on_exception(backoff.expo, OpenAIError, on_backoff=log_backoff_exception, logger="rating_log")
+def _create_with_backoff(**kwargs):
+    args = kwargs.copy()
+    args.pop("filename")
+    return openai.ChatCompletion.create(**args)
+
+
+def _cache_lookup(kwargs, iteration):
+    key, fields = response_cache.make_key(kwargs["model"], kwargs["messages"], kwargs.get("temperature", 1.0), iteration)
+    cached = response_cache.get(key)
+    if cached is not None:
+        logger.info(f"Cache hit for file '{kwargs['filename']}' (iteration {iteration})")
+        cached = openai.util.convert_to_openai_object(cached)
+    return key, fields, cached
+
+
+def _record_call(kwargs, iteration, latency, stats, completion=None, wait=0.0, cache_hit=False, error=None):
+    if telemetry is None:
+        return
+    usage = completion.get("usage") if completion is not None else None
+    telemetry.record(kwargs["filename"], iteration, kwargs.get("model"), latency, wait, usage,
+                     stats["retries"], stats["backoff_s"], cache_hit, error)
+
+
+def completion_with_backoff(iteration=1, **kwargs):
+    """Chat completion with exponential backoff; served from the response cache when possible."""
+    start = time.perf_counter()
+    stats = start_call()
+    if response_cache is not None:
+        key, fields, cached = _cache_lookup(kwargs, iteration)
+        if cached is not None:
+            _record_call(kwargs, iteration, time.perf_counter() - start, stats, cached, cache_hit=True)
+            return cached
+
+    try:
+        completion = _create_with_backoff(**kwargs)
+    except Exception as error:
+        _record_call(kwargs, iteration, time.perf_counter() - start, stats, error=type(error).__name__)
+        raise
+    _record_call(kwargs, iteration, time.perf_counter() - start, stats, completion)
+
+    if response_cache is not None:
+        response_cache.put(key, fields, completion.to_dict_recursive())
+    return completion
+
+
+def estimate_tokens(messages):
+    """Rough token estimate for a chat request, including the completion budget."""
+    n_chars = sum(len(m["content"]) for m in messages)
+    return n_chars // 4 + 4 * len(messages) + COMPLETION_TOKENS_ESTIMATE
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for requests and tokens per minute.
+
+    Both buckets refill continuously; a limit of None disables that bucket.
+    """
+
+    def __init__(self, rpm=None, tpm=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm or 0)
+        self._tokens = float(tpm or 0)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens=0):
+        if self.tpm:
+            # a single request larger than the whole budget would never be admitted
+            tokens = min(tokens, self.tpm)
+
+        # waiters queue on the lock, so capacity is handed out in arrival order
+        async with self._lock:
+            while True:
+                self._refill()
+                wait = 0.0
+                if self.rpm and self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+                if self.tpm and self._tokens < tokens:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+
+            if self.rpm:
+                self._requests -= 1
+            if self.tpm:
+                self._tokens -= tokens
+
+    def record_usage(self, estimated, actual):
+        # settle the difference between the reserved and the reported token count
+        if self.tpm:
+            self._tokens -= actual - estimated
+
+
+class AsyncChatClient:
+    """
+    Submit chat completions concurrently within RPM/TPM limits.
+
+    Use as an async context manager so that all requests share one pooled HTTP session:
+
+        async with AsyncChatClient(concurrency=8, rpm=500, tpm=40000) as client:
+            completion = await client.complete(filename=..., model=..., messages=..., temperature=0.0)
+    """
+
+    def __init__(self, concurrency=8, rpm=None, tpm=None):
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rpm, tpm)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._session = None
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.concurrency))
+        openai.aiosession.set(self._session)
+        return self
+
+    async def __aexit__(self, *exc):
+        openai.aiosession.set(None)
+        await self._session.close()
+
+    @backoff.on_exception(backoff.expo, OpenAIError, on_backoff=log_backoff_exception, logger="rating_log")
+    async def _acreate_with_backoff(self, estimated, **kwargs):
+        # every attempt, retries included, draws from the RPM/TPM budget
+        waiting = time.perf_counter()
+        await self.limiter.acquire(estimated)
+        current_call.get()["wait_s"] += time.perf_counter() - waiting
+
+        args = kwargs.copy()
+        args.pop("filename")
+        return await openai.ChatCompletion.acreate(**args)
+
+    async def complete(self, iteration=1, **kwargs):
+        start = time.perf_counter()
+        stats = start_call()
+        if response_cache is not None:
+            key, fields, cached = _cache_lookup(kwargs, iteration)
+            if cached is not None:
+                # cache hits cost nothing, so they bypass the limiter
+                _record_call(kwargs, iteration, time.perf_counter() - start, stats, cached, cache_hit=True)
+                return cached
+
+        estimated = estimate_tokens(kwargs["messages"])
+        sent = start
+        try:
+            async with self._semaphore:
+                sent = time.perf_counter()
+                completion = await self._acreate_with_backoff(estimated, **kwargs)
+        except Exception as error:
+            wait = sent - start + stats["wait_s"]
+            _record_call(kwargs, iteration, time.perf_counter() - start - wait, stats, wait=wait,
+                         error=type(error).__name__)
+            raise
+        wait = sent - start + stats["wait_s"]
+        _record_call(kwargs, iteration, time.perf_counter() - start - wait, stats, completion, wait=wait)
+
+        if response_cache is not None:
+            response_cache.put(key, fields, completion.to_dict_recursive())
+
+        usage = completion.get("usage")
+        if usage is not None and "total_tokens" in usage:
+            self.limiter.record_usage(estimated, usage["total_tokens"])
+        return completion
@@ -0,0 +1,40 @@
+"""
+Project: Theory Discourse Analysis
+
+Stage log files that also work when several stages run in one process.
+
+logging.basicConfig only configures the root logger once per process, so a second stage
+run in the same interpreter would keep writing to the first stage's log. log_to_file
+replaces the file handler of the previous stage instead.
+"""
+
+
+import logging
+
+LOG_FORMAT = "%(asctime)s,%(msecs)d %(name)s %(levelname)s %(message)s"
+
+
+def log_to_file(path, resume=False, name="rating_log"):
+    """Send all records to path (appending with resume) and return the stage logger."""
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if getattr(h, "tda_stage_log", False)]:
+        root.removeHandler(handler)
+        handler.close()
+
+    handler = logging.FileHandler(path, mode="a" if resume else "w")
+    handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt="%H:%M:%S"))
+    handler.tda_stage_log = True
+    root.addHandler(handler)
+    root.setLevel(logging.DEBUG)
+
+    logging.getLogger("openai").setLevel(logging.INFO)
+    logging.getLogger("urllib3").setLevel(logging.INFO)
+    return logging.getLogger(name)
+
+
+def close_log():
+    """Detach and close the current stage log file."""
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if getattr(h, "tda_stage_log", False)]:
+        root.removeHandler(handler)
+        handler.close()
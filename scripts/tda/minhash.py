@@ -0,0 +1,134 @@
+"""
+Project: Theory Discourse Analysis
+
+Near-duplicate detection for article texts with MinHash signatures and
+locality-sensitive hashing (LSH).
+
+Purpose:
+- Catch the same paper ingested twice from slightly different PDFs (e.g., EBSCO vs
+  Crossref copies), which byte-level MD5 identifiers cannot detect
+
+Notes:
+- The text of an article is its abstract followed by its body paragraphs (the title if it
+  has neither), see tda.tei.document_text
+- Texts are normalised (lowercase, alphanumeric tokens) and shingled into word k-grams
+- Signatures use num_perm universal hash functions over 32-bit shingle hashes
+- Candidate pairs share at least one LSH band; they are confirmed by the estimated
+  Jaccard similarity, so the cost grows roughly linearly with corpus size rather
+  than with the number of pairs
+"""
+
+
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+from tda.tei import document_text, read_tei_document
+
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def shingles(text, k=5):
+    """Set of 32-bit hashes of the word k-grams of a normalised text."""
+    tokens = TOKEN_PATTERN.findall(text.lower())
+    if 0 < len(tokens) < k:
+        # short texts become a single shingle
+        return {zlib.crc32(" ".join(tokens).encode("utf-8"))}
+    return {zlib.crc32(" ".join(tokens[i:i + k]).encode("utf-8"))
+            for i in range(len(tokens) - k + 1)}
+
+
+def permutations(num_perm=128, seed=1):
+    """Parameters (a, b) of the universal hash functions shared by all signatures."""
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def signature(text, perms, k=5):
+    """MinHash signature (uint32 array of length num_perm); None for texts without shingles."""
+    hashes = np.fromiter(shingles(text, k), dtype=np.uint64)
+    if hashes.size == 0:
+        return None
+
+    a, b = perms
+    # (a * x + b) stays below 2**64 because a, b, x < 2**32
+    values = (a[:, None] * hashes[None, :] + b[:, None]) % MERSENNE_PRIME & MAX_HASH
+    return values.min(axis=1).astype(np.uint32)
+
+
+def read_signature(path, perms, k=5):
+    """MinHash signature of the full text of one TEI file (see tda.tei.document_text)."""
+    return signature(document_text(read_tei_document(path)), perms, k)
+
+
+def optimal_bands(num_perm, threshold):
+    """Choose (bands, rows) with bands * rows == num_perm whose S-curve threshold is closest to `threshold`."""
+    best = None
+    for bands in range(1, num_perm + 1):
+        if num_perm % bands:
+            continue
+        rows = num_perm // bands
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+def near_duplicate_clusters(signatures, threshold=0.8):
+    """
+    Group near-duplicate items.
+
+    signatures: dict mapping item ids (e.g., filenames) to MinHash signatures (None is skipped).
+    Returns a list of clusters, each a sorted list of (item, estimated Jaccard with the first item).
+    """
+    items = sorted(k for k, sig in signatures.items() if sig is not None)
+    if not items:
+        return []
+
+    num_perm = len(signatures[items[0]])
+    bands, rows = optimal_bands(num_perm, threshold)
+
+    # bucket items by each band of their signature
+    candidates = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for i, item in enumerate(items):
+            buckets[signatures[item][band * rows:(band + 1) * rows].tobytes()].append(i)
+        for members in buckets.values():
+            for j in range(1, len(members)):
+                for i in members[:j]:
+                    candidates.add((i, members[j]))
+
+    # confirm candidates by estimated Jaccard similarity and join them with union-find
+    parent = list(range(len(items)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in candidates:
+        similarity = np.mean(signatures[items[i]] == signatures[items[j]])
+        if similarity >= threshold:
+            parent[find(j)] = find(i)
+
+    groups = defaultdict(list)
+    for i in range(len(items)):
+        groups[find(i)].append(items[i])
+
+    clusters = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        members = sorted(members)
+        first = signatures[members[0]]
+        clusters.append([(m, float(np.mean(signatures[m] == first))) for m in members])
+    return sorted(clusters)
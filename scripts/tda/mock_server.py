@@ -0,0 +1,249 @@
+"""
+Project: Theory Discourse Analysis
+
+Local mock of the OpenAI chat-completions and embeddings endpoints for testing the
+classification and embedding scripts without API credentials or costs.
+
+Usage:
+    python scripts/tda/mock_server.py --port 8000 --response "relevant\\n\\nMock rationale."
+    GPT4_KEY=mock python scripts/04_relevance_filter/04_screen_relevance_gpt4.py ... --api_base http://127.0.0.1:8000/v1
+
+Notes:
+- Every request receives the same canned answer after an optional latency, either fixed or
+  drawn from a distribution (--latency_dist uniform/exponential/lognormal around --latency)
+- --error_rate_429 and --error_rate_5xx inject rate-limit and server errors with the given
+  probabilities; --rpm_limit and --tpm_limit make the server answer 429 once the requests or
+  tokens of the last 60 seconds exceed the limit, as the real API does
+- Request counts per endpoint and status are kept in server.stats (also served at GET /stats)
+- Responses include a usage block so that token accounting can be exercised
+- Packed requests (texts introduced by "### ITEM <id>", see tda/packing.py) are answered
+  with a JSON array that repeats the canned label and rationale for every item;
+  --drop_items leaves the last items out to exercise the individual retries
+- Embeddings are deterministic hashed bags of words (--embedding_dim, L2-normalised), so
+  texts that share words get similar vectors and selection results are meaningful
+"""
+
+
+import argparse
+import collections
+import json
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+ITEM_PATTERN = re.compile(r"^### ITEM (\S+)$", re.MULTILINE)
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def mock_embedding(text, dim=1536):
+    """L2-normalised vector of hashed word counts."""
+    vector = [0.0] * dim
+    for token in TOKEN_PATTERN.findall(str(text).lower()):
+        vector[zlib.crc32(token.encode("utf-8")) % dim] += 1.0
+    norm = sum(v * v for v in vector) ** 0.5 or 1.0
+    return [v / norm for v in vector]
+
+
+class MockChatHandler(BaseHTTPRequestHandler):
+    response_text = "relevant\n\nMock rationale."
+    latency = 0.0
+    latency_dist = "fixed"
+    latency_sigma = 0.5
+    drop_items = 0
+    embedding_dim = 1536
+    error_rate_429 = 0.0
+    error_rate_5xx = 0.0
+    rpm_limit = None
+    tpm_limit = None
+
+    # per-server state, replaced in start_mock_server
+    rng = random.Random()
+    lock = threading.Lock()
+    window = collections.deque()
+    stats = collections.Counter()
+
+    def _delay(self):
+        if self.latency <= 0:
+            return
+        with self.lock:
+            if self.latency_dist == "uniform":
+                delay = self.rng.uniform(0, 2 * self.latency)
+            elif self.latency_dist == "exponential":
+                delay = self.rng.expovariate(1 / self.latency)
+            elif self.latency_dist == "lognormal":
+                # latency is the median
+                delay = self.latency * math.exp(self.rng.gauss(0, self.latency_sigma))
+            else:
+                delay = self.latency
+        time.sleep(delay)
+
+    def _fault(self, endpoint, n_tokens):
+        """(status, error payload) for a rate-limited or injected failure, or None to answer normally."""
+        with self.lock:
+            self.stats[f"{endpoint}_requests"] += 1
+            now = time.monotonic()
+            while self.window and self.window[0][0] < now - 60:
+                self.window.popleft()
+
+            fault = None
+            if self.rpm_limit and len(self.window) >= self.rpm_limit:
+                fault = (429, "rate_limit_error", "Rate limit reached for requests")
+            elif self.tpm_limit and sum(t for _, t in self.window) + n_tokens > self.tpm_limit:
+                fault = (429, "rate_limit_error", "Rate limit reached for tokens")
+            else:
+                draw = self.rng.random()
+                if draw < self.error_rate_429:
+                    fault = (429, "rate_limit_error", "Injected rate limit error")
+                elif draw < self.error_rate_429 + self.error_rate_5xx:
+                    fault = (self.rng.choice([500, 502, 503]), "server_error", "Injected server error")
+
+            if fault is None:
+                self.window.append((now, n_tokens))
+                self.stats[f"{endpoint}_ok"] += 1
+                return None
+            self.stats[f"{endpoint}_{fault[0]}"] += 1
+        return fault[0], {"error": {"message": fault[2], "type": fault[1], "code": None}}
+
+    def _answer(self, messages):
+        item_ids = ITEM_PATTERN.findall(str(messages[-1].get("content") or "")) if messages else []
+        if not item_ids:
+            return self.response_text
+
+        label, _, rationale = self.response_text.partition("\n\n")
+        item_ids = item_ids[:max(len(item_ids) - self.drop_items, 0)]
+        return json.dumps([{"id": i, "label": label, "rationale": rationale} for i in item_ids])
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+
+        if self.path.rstrip("/").endswith("/embeddings"):
+            texts = body.get("input", [])
+            texts = [texts] if isinstance(texts, str) else texts
+            n_tokens = sum(len(str(t)) for t in texts) // 4
+            # errors are answered at once, successful requests after the latency
+            fault = self._fault("embeddings", n_tokens)
+            if fault is not None:
+                self._send(*fault)
+                return
+            self._delay()
+            self._send(200, {
+                "object": "list",
+                "model": body.get("model", "mock"),
+                "data": [{"object": "embedding", "index": i, "embedding": mock_embedding(t, self.embedding_dim)}
+                         for i, t in enumerate(texts)],
+                "usage": {"prompt_tokens": n_tokens, "total_tokens": n_tokens},
+            })
+            return
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send(404, {"error": {"message": f"Unknown endpoint {self.path}", "type": "invalid_request_error"}})
+            return
+
+        answer = self._answer(body.get("messages", []))
+        prompt_chars = sum(len(str(m.get("content") or "")) for m in body.get("messages", []))
+        prompt_tokens = prompt_chars // 4
+        completion_tokens = len(answer) // 4
+
+        fault = self._fault("chat", prompt_tokens + completion_tokens)
+        if fault is not None:
+            self._send(*fault)
+            return
+        self._delay()
+        self._send(200, {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            with self.lock:
+                self._send(200, dict(self.stats))
+            return
+        self._send(404, {"error": {"message": f"Unknown endpoint {self.path}", "type": "invalid_request_error"}})
+
+    def _send(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(host="127.0.0.1", port=0, response_text=None, latency=0.0, drop_items=0, embedding_dim=1536,
+                      latency_dist="fixed", latency_sigma=0.5, error_rate_429=0.0, error_rate_5xx=0.0,
+                      rpm_limit=None, tpm_limit=None, seed=None):
+    """
+    Start the mock server in a background thread and return it (server.server_address holds the
+    port, server.stats the request counts).
+    """
+    handler = type("ConfiguredMockChatHandler", (MockChatHandler,), {
+        "response_text": response_text if response_text is not None else MockChatHandler.response_text,
+        "latency": latency,
+        "latency_dist": latency_dist,
+        "latency_sigma": latency_sigma,
+        "drop_items": drop_items,
+        "embedding_dim": embedding_dim,
+        "error_rate_429": error_rate_429,
+        "error_rate_5xx": error_rate_5xx,
+        "rpm_limit": rpm_limit,
+        "tpm_limit": tpm_limit,
+        "rng": random.Random(seed),
+        "lock": threading.Lock(),
+        "window": collections.deque(),
+        "stats": collections.Counter(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.stats = handler.stats
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local mock of the OpenAI chat-completions and embeddings endpoints")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="interface to bind")
+    parser.add_argument("--port", type=int, default=8000, help="port to bind")
+    parser.add_argument("--response", type=str, default=None, help="canned assistant answer (\\n is unescaped)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering (median for lognormal)")
+    parser.add_argument("--latency_dist", type=str, default="fixed", choices=["fixed", "uniform", "exponential", "lognormal"], help="distribution of the latency")
+    parser.add_argument("--latency_sigma", type=float, default=0.5, help="log-scale spread of lognormal latencies")
+    parser.add_argument("--error_rate_429", type=float, default=0.0, help="probability of an injected 429 answer")
+    parser.add_argument("--error_rate_5xx", type=float, default=0.0, help="probability of an injected 500/502/503 answer")
+    parser.add_argument("--rpm_limit", type=int, default=None, help="requests per minute before the server answers 429")
+    parser.add_argument("--tpm_limit", type=int, default=None, help="tokens per minute before the server answers 429")
+    parser.add_argument("--seed", type=int, default=None, help="seed for latencies and injected errors")
+    parser.add_argument("--drop_items", type=int, default=0, help="number of items to leave out of packed answers")
+    parser.add_argument("--embedding_dim", type=int, default=1536, help="dimension of mock embeddings")
+    args = parser.parse_args()
+
+    response_text = args.response.replace("\\n", "\n") if args.response is not None else None
+    server = start_mock_server(args.host, args.port, response_text, args.latency, args.drop_items, args.embedding_dim,
+                               args.latency_dist, args.latency_sigma, args.error_rate_429, args.error_rate_5xx,
+                               args.rpm_limit, args.tpm_limit, args.seed)
+    print(f"Mock chat-completions server on http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
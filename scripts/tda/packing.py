@@ -0,0 +1,112 @@
+"""
+Project: Theory Discourse Analysis
+
+Multi-item packing for the LLM-assisted classification scripts.
+
+Every request of the 04 and 06 scripts repeats the same long system prompt to label a
+single abstract or paragraph. In packing mode, up to N texts are sent per request, each
+introduced by a stable item ID, and the model is asked for one JSON object per item.
+
+Notes:
+- Item IDs are the 1-based positions of the texts within their pack, so a pack of the
+  same texts always produces the same request (and the same response-cache key)
+- Packed answers are rendered back into the single-item response format
+  ("label\\n\\nrationale"), so the scripts keep their own label parsers
+- Items that are missing from a packed response (or that come back malformed, or without a
+  label the tda.labels.LabelExtractor can read) are retried individually with the plain
+  single-item prompt, where the extractor's bounded re-asks apply
+"""
+
+
+import asyncio
+import json
+import re
+
+ITEM_HEADER = "### ITEM {}"
+
+PACKING_INSTRUCTIONS = """\n\nYou will receive several texts at once. Each text starts with a line "### ITEM <id>". \
+Rate every text independently, as described above. Instead of the answer format described above, respond only with a \
+JSON array that contains one object per text: [{"id": "<id>", "label": "<category label>", "rationale": "<rationale>"}]"""
+
+JSON_ARRAY = re.compile(r"\[.*\]", re.DOTALL)
+
+
+def pack_messages(query, texts):
+    """Chat messages that ask for labels of several texts in one request."""
+    user = "\n\n".join(f"{ITEM_HEADER.format(i)}\n{text}" for i, text in enumerate(texts, start=1))
+    return [{"role": "system", "content": query + PACKING_INSTRUCTIONS},
+            {"role": "user", "content": user}]
+
+
+def parse_packed(content, n_items):
+    """
+    Map 0-based item positions to "label\\n\\nrationale" texts for every item the response covers.
+
+    Items that are missing, duplicated after their first answer, or malformed are left out.
+    """
+    match = JSON_ARRAY.search(content or "")
+    if match is None:
+        return {}
+    try:
+        answers = json.loads(match.group(0))
+    except ValueError:
+        return {}
+
+    results = {}
+    for answer in answers if isinstance(answers, list) else []:
+        if not isinstance(answer, dict) or not isinstance(answer.get("label"), str):
+            continue
+        try:
+            position = int(str(answer.get("id")).strip()) - 1
+        except ValueError:
+            continue
+        if 0 <= position < n_items and position not in results:
+            results[position] = f"{answer['label'].strip()}\n\n{str(answer.get('rationale') or '').strip()}"
+    return results
+
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def complete_packed(client, query, items, pack_size, on_result, extractor=None, iteration=1, **kwargs):
+    """
+    Label items (a list of (key, text)) in packs of pack_size and call on_result(key, response_text)
+    for each of them. Items missing from a packed response (or unreadable by the optional
+    tda.labels.LabelExtractor) are retried one by one.
+
+    kwargs are passed to client.complete (model, temperature). Returns the number of individual retries.
+    """
+    async def complete_single(key, text):
+        messages = [{"role": "system", "content": query}, {"role": "user", "content": text}]
+        if extractor is not None:
+            result = await extractor.acomplete(client.complete, filename=str(key), iteration=iteration,
+                                               messages=messages, **kwargs)
+        else:
+            completion = await client.complete(filename=str(key), iteration=iteration, messages=messages, **kwargs)
+            result = completion.choices[0].message.content
+        on_result(key, result)
+
+    async def complete_pack(pack):
+        if len(pack) == 1:
+            await complete_single(*pack[0])
+            return 0
+
+        messages = pack_messages(query, [text for _, text in pack])
+        completion = await client.complete(filename=f"{pack[0][0]} (+{len(pack) - 1} packed)", iteration=iteration,
+                                           messages=messages, **kwargs)
+        content = completion.choices[0].message.content
+
+        answers = parse_packed(content, len(pack))
+        if extractor is not None:
+            answers = {i: text for i, text in answers.items() if extractor.extract(text)[0] is not None}
+        for position, response_text in sorted(answers.items()):
+            on_result(pack[position][0], response_text)
+
+        missing = [pack[i] for i in range(len(pack)) if i not in answers]
+        await asyncio.gather(*[complete_single(*item) for item in missing])
+        return len(missing)
+
+    retries = await asyncio.gather(*[complete_pack(pack) for pack in chunks(items, pack_size)])
+    return sum(retries)
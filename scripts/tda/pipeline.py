@@ -0,0 +1,299 @@
+"""
+Project: Theory Discourse Analysis
+
+Incremental runner for the stage scripts: each stage is declared with its script, arguments,
+inputs, and outputs, and only reruns when its fingerprint changed.
+
+A stage's fingerprint has two parts:
+- parameters: the script, its arguments (without --workers, --concurrency, and other
+  settings that do not change results), and the prompt constants of the script (QUERY)
+- inputs: content hashes of its input files, or of every file of an input directory
+
+Stages whose parameters, inputs, and outputs are unchanged are skipped. Stages with a
+journal (the LLM stages) are also incremental per article: each article has its own
+fingerprint (the hash of its TEI file, or of its rows in the input CSV), the journal
+records of changed and removed articles are dropped (Journal.retain), and the script is
+rerun with --resume, so only new and changed articles are sent to the API.
+
+Notes:
+- The state (fingerprints per stage and article, output hashes) is a JSON file that is
+  rewritten after every completed stage, so an interrupted run keeps its finished stages
+- Stages that modify their input directory in place (deduplication, missing-abstract
+  filter) are fingerprinted after they ran, so a rerun on the filtered directory is skipped
+- Changed parameters rerun the whole stage with a fresh journal; edited or deleted outputs
+  rerun the stage as well
+- Changes to the shared code in tda/ are not fingerprinted; force such stages to rerun
+- With in_process, stages are imported from tda.stages and run in this interpreter instead of
+  as subprocesses: one corpus index (index) is shared by the stages that parse TEI files, and
+  the table a stage returns is handed to the next stage (table_from) instead of re-reading its CSV;
+  it is normalised in memory as read_csv would see it (NA placeholders, dtypes), so the outputs
+  match those of subprocess runs
+"""
+
+
+import ast
+import hashlib
+import io
+import importlib
+import importlib.util
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+from tda.journal import Journal
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# arguments that change how a stage runs, not what it produces
+RUNTIME_ARGS = {"--workers", "--chunksize", "--index", "--async_requests", "--concurrency", "--rpm", "--tpm",
+                "--cache", "--cache_size", "--telemetry", "--api_base", "--resume", "--batch_size",
+                "--grobid_url", "--timeout", "--max_tries", "--journal"}
+
+
+def file_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def path_hashes(path):
+    """{path: hash} of a file, or of every file in a directory (by filename); None if missing."""
+    if os.path.isdir(path):
+        return {os.path.join(path, f): file_hash(os.path.join(path, f))
+                for f in sorted(os.listdir(path)) if os.path.isfile(os.path.join(path, f))}
+    if os.path.exists(path):
+        return {path: file_hash(path)}
+    return {path: None}
+
+
+def digest(value):
+    return hashlib.sha256(json.dumps(value, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def module_path(module):
+    """Source file of a module, found without importing it."""
+    return importlib.util.find_spec(module).origin
+
+
+def as_read_csv(df):
+    """The table as the next stage would get it from read_csv, without touching the disk."""
+    return pd.read_csv(io.StringIO(df.to_csv(index=False)))
+
+
+def script_constants(path, names=("QUERY",)):
+    """Module-level string constants of a script (e.g. the prompt), read without running it."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    constants = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id in names:
+                    constants[target.id] = node.value.value
+    return constants
+
+
+class Stage:
+    """
+    One stage script with its arguments, e.g. [("-i", "data_xml"), ("--async_requests", None)].
+
+    inputs and outputs are files or directories. Stages with a journal are incremental per
+    article: articles is a TEI directory (one article per file) or a CSV file (rows grouped by
+    filename; only the columns matching article_columns are fingerprinted).
+
+    module is the tda.stages module holding the logic of the script (its prompt constants
+    are read from there). In-process runs pass the shared corpus index to stages with
+    shares_index and the table returned by stage table_from as df_in.
+    """
+
+    def __init__(self, name, script, args, inputs=(), outputs=(), journal=None, articles=None,
+                 article_columns=None, constants=("QUERY",), module=None, shares_index=False, table_from=None):
+        self.name = name
+        self.script = script
+        self.module = module
+        self.shares_index = shares_index
+        self.table_from = table_from
+        self.args = list(args)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.journal = journal
+        self.articles = articles
+        self.article_columns = article_columns
+        self.constants = constants
+
+    def argv(self, resume=False):
+        argv = []
+        for flag, value in self.args:
+            argv += [flag] if value is None else [flag, str(value)]
+        return argv + (["--resume"] if resume else [])
+
+    def command(self, resume=False):
+        return [sys.executable, os.path.join(SCRIPTS_DIR, self.script)] + self.argv(resume)
+
+    def run_in_process(self, resume=False, index=None, tables=None):
+        """Import the stage module and call its run(); returns what run() returned."""
+        module = importlib.import_module(self.module)
+        args = module.parser.parse_args(self.argv(resume))
+        kwargs = {}
+        if self.shares_index and index is not None:
+            kwargs["index"] = index
+        if self.table_from is not None and (tables or {}).get(self.table_from) is not None:
+            kwargs["df_in"] = as_read_csv(tables[self.table_from])
+        return module.run(args, **kwargs)
+
+    def parameters(self):
+        source = module_path(self.module) if self.module else os.path.join(SCRIPTS_DIR, self.script)
+        constants = script_constants(source, self.constants)
+        return {
+            "script": self.script,
+            "args": [[flag, value] for flag, value in self.args if flag not in RUNTIME_ARGS],
+            "constants": {name: digest(text) for name, text in constants.items()},
+        }
+
+    def article_fingerprints(self):
+        """{filename: hash} of the articles of a per-article stage."""
+        if os.path.isdir(self.articles):
+            return {os.path.basename(path): h for path, h in path_hashes(self.articles).items()}
+        df = pd.read_csv(self.articles, dtype=str, keep_default_na=False)
+        columns = [c for c in df.columns if c != "filename"
+                   and (self.article_columns is None or re.fullmatch(self.article_columns, c))]
+        return {filename: digest(rows[columns].values.tolist()) for filename, rows in df.groupby("filename", sort=False)}
+
+    def input_fingerprint(self):
+        hashes = {}
+        for path in self.inputs:
+            hashes.update(path_hashes(path))
+        return digest(hashes)
+
+    def output_hashes(self):
+        hashes = {}
+        for path in self.outputs:
+            hashes.update(path_hashes(path))
+        return hashes
+
+
+class Pipeline:
+    """Stages in run order and the JSON state of their last successful runs."""
+
+    def __init__(self, stages, state_path, env=None, logger=None, in_process=False, index=None):
+        self.stages = stages
+        self.state_path = state_path
+        self.env = env
+        self.logger = logger
+        self.in_process = in_process
+        self.index = index
+        self.state = {}
+        if os.path.exists(state_path):
+            with open(state_path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def _save(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def decide(self, stage, force=False):
+        """(action, reason, articles to keep): action is "skip", "run", or "articles" (incremental)."""
+        record = self.state.get(stage.name)
+        if force:
+            return "run", "forced", None
+        if record is None:
+            return "run", "no previous run", None
+
+        parameters = stage.parameters()
+        if parameters != record["parameters"]:
+            changed = [key for key in ("script", "args") if parameters[key] != record["parameters"][key]]
+            changed += [name for name in sorted(set(parameters["constants"]) | set(record["parameters"]["constants"]))
+                        if parameters["constants"].get(name) != record["parameters"]["constants"].get(name)]
+            return "run", f"changed {', '.join(changed)}", None
+
+        outputs = stage.output_hashes()
+        inputs = stage.input_fingerprint()
+        if outputs == record["outputs"] and inputs == record["inputs"]:
+            return "skip", "up to date", None
+        if stage.journal is None or not os.path.exists(stage.articles):
+            return "run", "inputs changed" if inputs != record["inputs"] else "outputs changed", None
+
+        previous, current = record["articles"], stage.article_fingerprints()
+        keep = {filename for filename, h in current.items() if previous.get(filename) == h}
+        n_changed = sum(filename in previous for filename in current) - len(keep)
+        n_new = sum(filename not in previous for filename in current)
+        n_removed = sum(filename not in current for filename in previous)
+        return "articles", f"{n_changed} changed, {n_new} new, {n_removed} removed articles", keep
+
+    def run(self, force=(), dry_run=False):
+        """Run the stages that are out of date; returns [(stage name, action, reason, seconds)]."""
+        summary = []
+        pending_paths = set()
+        # tables returned by the stages run in this process, by stage name
+        tables = {}
+        if self.in_process and self.env is not None:
+            os.environ.update(self.env)
+        for stage in self.stages:
+            action, reason, keep = self.decide(stage, force=stage.name in force)
+            if dry_run:
+                # inputs of later stages are only known once earlier stages ran
+                if action == "skip" and pending_paths.intersection(stage.inputs + ([stage.articles] if stage.articles else [])):
+                    action, reason = "pending", "depends on stages that will run"
+                if action != "skip":
+                    # in-place stages change their inputs
+                    pending_paths.update(stage.outputs or stage.inputs)
+                print(f"PLAN {stage.name}: {action} ({reason})")
+                summary.append((stage.name, action, reason, 0.0))
+                continue
+
+            print(f"STAGE {stage.name}: {action} ({reason})")
+            self._log(f"STAGE {stage.name} {action} ({reason})")
+            if action == "skip":
+                summary.append((stage.name, action, reason, 0.0))
+                continue
+
+            resume = False
+            if action == "articles":
+                journal = Journal(stage.journal, resume=True)
+                journal.retain(keep)
+                journal.close()
+                resume = True
+
+            start = time.perf_counter()
+            if self.in_process:
+                try:
+                    tables[stage.name] = stage.run_in_process(resume, self.index, tables)
+                except SystemExit as e:
+                    # argument errors of the stage parser
+                    self._log(f"STAGE {stage.name} FAILED with exit code {e.code}")
+                    raise RuntimeError(f"Stage {stage.name} failed with exit code {e.code}") from e
+                except Exception as e:
+                    self._log(f"STAGE {stage.name} FAILED: {e!r}")
+                    raise RuntimeError(f"Stage {stage.name} failed: {e!r}") from e
+            else:
+                process = subprocess.run(stage.command(resume), env=self.env)
+                if process.returncode != 0:
+                    self._log(f"STAGE {stage.name} FAILED with exit code {process.returncode}")
+                    raise RuntimeError(f"Stage {stage.name} failed with exit code {process.returncode}")
+            seconds = time.perf_counter() - start
+
+            # fingerprints after the run: in-place stages have changed their inputs
+            self.state[stage.name] = {
+                "parameters": stage.parameters(),
+                "inputs": stage.input_fingerprint(),
+                "outputs": stage.output_hashes(),
+                "articles": stage.article_fingerprints() if stage.journal is not None else None,
+                "completed_utc": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()),
+            }
+            self._save()
+            self._log(f"STAGE {stage.name} DONE in {seconds:.1f} s")
+            summary.append((stage.name, action, reason, round(seconds, 1)))
+        return summary
+
+    def _log(self, message):
+        if self.logger is not None:
+            self.logger.info(message)
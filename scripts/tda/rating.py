@@ -0,0 +1,103 @@
+"""
+Project: Theory Discourse Analysis
+
+Repeated-iteration rating of abstracts, shared by the relevance screening (04) and the abstract
+stance classification (06).
+
+Every abstract is rated up to `iterations` times with the same prompt; each rating is journaled
+as {"filename", "iteration", "rating", "rationale"} as soon as it arrives, and ratings already in
+results (the journal of an earlier run, keyed by (filename, iteration)) are not requested again.
+
+Notes:
+- With an early-stop rule (see early_stop and tda/consensus.py), an abstract receives no further
+  iterations once its ratings agree
+- rate_iterations sends one request at a time; rate_iterations_packed goes iteration by iteration
+  and packs several abstracts into each request (see tda/packing.py)
+"""
+
+
+import functools
+import logging
+
+from tda.consensus import consensus_reached
+
+logger = logging.getLogger('rating_log')
+
+
+def early_stop(args):
+    """Stop rule stop(ratings) of the --early_stop, --min_iterations, and --agreement options, or None."""
+    if not args.early_stop:
+        return None
+    return functools.partial(consensus_reached, min_calls=args.min_iterations, agreement=args.agreement)
+
+
+def rate_iterations(extractor, query, filename, text, journal, iterations, results=None, stop=None, model="gpt-4"):
+    """Rate one abstract up to `iterations` times, one request at a time."""
+    from tqdm import tqdm
+    from tda.llm import completion_with_backoff
+
+    results = {} if results is None else results
+    ratings = []
+    for i in tqdm(range(iterations), leave=False):
+        if stop is not None and stop(ratings):
+            logger.info(f"Consensus for {filename} after {i} iterations")
+            break
+
+        if (filename, i+1) in results:
+            ratings.append(results[(filename, i+1)]["rating"])
+            continue
+
+        logger.info(f"Iteration {i+1} for {filename}")
+        messages = [{"role": "system", "content" : query},
+                    {"role": "user", "content" : text},
+                    ]
+
+        # submit the QUERY; answers without a readable label are re-asked
+        result = extractor.complete(
+            completion_with_backoff,
+            filename = filename,
+            iteration = i+1,
+            model = model,
+            messages = messages,
+            temperature = 0.0)
+
+        # tolerant of blank lines, punctuation, markup, and alias spellings (see tda/labels.py)
+        category_id, rationale = extractor.parse(result)
+
+        # checkpoint id and rationale
+        journal.append({"filename": filename, "iteration": i+1, "rating": category_id, "rationale": rationale})
+        ratings.append(category_id)
+
+
+async def rate_iterations_packed(client, query, articles, iterations, pack_size, extractor, journal, results=None,
+                                 stop=None, model="gpt-4"):
+    """
+    Rate (filename, text) articles iteration by iteration, pack_size texts per request of client
+    (a tda.llm.AsyncChatClient). Returns the number of texts retried individually.
+    """
+    from tqdm import tqdm
+    from tda.packing import complete_packed
+
+    results = {} if results is None else results
+    articles = list(articles)
+    n_retries = 0
+    for i in tqdm(range(iterations)):
+        items = []
+        for filename, text in articles:
+            if (filename, i+1) in results:
+                continue
+            if stop is not None:
+                ratings = [results[(filename, j+1)]["rating"] for j in range(i) if (filename, j+1) in results]
+                if stop(ratings):
+                    continue
+            items.append((filename, text))
+
+        def record(filename, result, iteration=i+1):
+            category_id, rationale = extractor.parse(result)
+            results[(filename, iteration)] = {"filename": filename, "iteration": iteration, "rating": category_id, "rationale": rationale}
+            journal.append(results[(filename, iteration)])
+
+        logger.info(f"Iteration {i+1}: {len(items)} abstracts in packs of {pack_size}")
+        n_retries += await complete_packed(client, query, items, pack_size, record, extractor,
+                                           iteration=i+1, model=model, temperature=0.0)
+    return n_retries
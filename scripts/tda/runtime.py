@@ -0,0 +1,76 @@
+"""
+Project: Theory Discourse Analysis
+
+Process-wide response cache and telemetry of one LLM stage run (the --cache, --cache_size, and
+--telemetry options of the 04 and 06 scripts).
+
+    with LLMRuntime(args, stage="04_relevance") as runtime:
+        ...
+        runtime.report(extractor)
+
+Notes:
+- The cache and telemetry recorder are installed in tda.llm while the runtime is open, so every
+  completion call of the stage goes through them
+- Both are uninstalled and closed when it closes, also after errors, so they do not leak into
+  the next stage run in the same process
+- report() prints and logs the label, cache, and telemetry statistics at the end of a run and
+  writes the Prometheus summary next to the telemetry file
+"""
+
+
+import logging
+
+logger = logging.getLogger('rating_log')
+
+
+class LLMRuntime:
+    """Response cache (args.cache) and telemetry (args.telemetry) of a stage, installed while open."""
+
+    def __init__(self, args, stage):
+        self.args = args
+        self.stage = stage
+        self.cache = None
+        self.telemetry = None
+
+    def __enter__(self):
+        from tda.cache import ResponseCache
+        from tda.llm import set_response_cache, set_telemetry
+        from tda.telemetry import Telemetry
+
+        # serve repeated requests from the shared response cache
+        if self.args.cache:
+            self.cache = ResponseCache(self.args.cache, max_entries=self.args.cache_size)
+            set_response_cache(self.cache)
+
+        # record latency, tokens, retries, and backoff time of every completion call
+        if self.args.telemetry:
+            self.telemetry = Telemetry(self.args.telemetry, stage=self.stage, resume=self.args.resume)
+            set_telemetry(self.telemetry)
+        return self
+
+    def __exit__(self, *exc):
+        from tda.llm import set_response_cache, set_telemetry
+
+        # the cache and telemetry are process-wide; do not leak them into the next stage
+        if self.cache is not None:
+            set_response_cache(None)
+            self.cache.close()
+        if self.telemetry is not None:
+            set_telemetry(None)
+            self.telemetry.close()
+
+    def report(self, extractor):
+        """Print and log the re-asks of extractor and the cache and telemetry statistics."""
+        print(f"RE-ASKS: {extractor.reasks} ({extractor.unparseable} answers left unparseable)")
+        logger.info(f"LABEL_STATS {extractor.stats()}")
+
+        if self.cache is not None:
+            print(f"RESPONSE CACHE: {self.cache.stats()}")
+            logger.info(f"CACHE_STATS {self.cache.stats()}")
+
+        if self.telemetry is not None:
+            summary = self.telemetry.summary()
+            for stage, values in summary.items():
+                print(f"TELEMETRY {stage}: {values}")
+            logger.info(f"TELEMETRY {summary}")
+            self.telemetry.write_prometheus(f"{self.args.telemetry}.prom")
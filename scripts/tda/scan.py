@@ -0,0 +1,68 @@
+"""
+Project: Theory Discourse Analysis
+
+Parallel scanner for directories of TEI XML files.
+
+Applies a per-file function (e.g., tda.tei.read_tei_record) to every .xml file in a
+directory on a process pool, dispatching files in chunks.
+
+Notes:
+- Results are returned in sorted filename order, independent of worker scheduling
+- A file that fails to parse is reported with its error instead of aborting the scan
+- The per-file function must be defined at module level (it is pickled to workers)
+- workers=1 runs in-process, which is convenient for debugging
+"""
+
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from tqdm import tqdm
+
+
+def _apply(func, path):
+    try:
+        return True, func(path)
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
+
+
+def list_xml_files(xml_dir):
+    directory = os.fsdecode(xml_dir)
+    return sorted(os.fsdecode(f) for f in os.listdir(directory) if os.fsdecode(f).endswith(".xml"))
+
+
+def scan_directory(xml_dir, func, workers=None, chunksize=16, filenames=None):
+    """
+    Apply func(path) to every .xml file in xml_dir (or to the given filenames).
+
+    Returns (results, failures): lists of (filename, value) and (filename, error message).
+    """
+    if filenames is None:
+        filenames = list_xml_files(xml_dir)
+    paths = [os.path.join(os.fsdecode(xml_dir), f) for f in filenames]
+
+    if workers == 1 or len(paths) <= 1:
+        outcomes = map(_apply, repeat(func), paths)
+        outcomes = list(tqdm(outcomes, total=len(paths), leave=False))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = pool.map(_apply, repeat(func), paths, chunksize=chunksize)
+            outcomes = list(tqdm(outcomes, total=len(paths), leave=False))
+
+    results = []
+    failures = []
+    for filename, (ok, value) in zip(filenames, outcomes):
+        if ok:
+            results.append((filename, value))
+        else:
+            failures.append((filename, value))
+    return results, failures
+
+
+def report_failures(failures, logger=None):
+    for filename, error in failures:
+        print(f"Failed to parse {filename}: {error}")
+        if logger is not None:
+            logger.error(f"Failed to parse {filename}: {error}")
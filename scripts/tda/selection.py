@@ -0,0 +1,133 @@
+"""
+Project: Theory Discourse Analysis
+
+Vectorised selection of the most query-similar paragraphs per article.
+
+Notes:
+- Cosine similarities of all paragraphs against one or more queries come from a single
+  matrix product of L2-normalised embeddings (computed in row blocks, so memory-mapped
+  corpora are streamed rather than loaded at once)
+- Per-article top-k uses one argpartition over a padded (articles x max paragraphs) score
+  matrix instead of sorting each article's paragraphs separately
+- to_wide orders each article's selected paragraphs by position in the document, as the
+  notebook's search_paragraphs did (sort_index after head(n))
+"""
+
+
+import numpy as np
+import pandas as pd
+
+
+def read_queries(queries=None, queries_file=None, default=None):
+    """Query texts of repeated --query options and a file of blank-line separated queries; [default] if none are given."""
+    queries = list(queries or [])
+    if queries_file:
+        with open(queries_file, encoding="utf-8") as f:
+            queries += [block.strip() for block in f.read().split("\n\n") if block.strip()]
+    if not queries and default is not None:
+        return [default]
+    return queries
+
+
+def normalise(vectors):
+    """Rows scaled to unit L2 norm (zero rows stay zero)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def cosine_scores(vectors, query_vectors, block_size=65536):
+    """(n_paragraphs, n_queries) cosine similarity matrix."""
+    queries = normalise(np.atleast_2d(query_vectors)).T
+    scores = np.empty((len(vectors), queries.shape[1]), dtype=np.float32)
+    for start in range(0, len(vectors), block_size):
+        scores[start:start + block_size] = normalise(vectors[start:start + block_size]) @ queries
+    return scores
+
+
+def group_bounds(groups):
+    """Start offsets and sizes of the contiguous runs of equal values in groups."""
+    groups = np.asarray(groups)
+    if len(groups) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    sizes = np.diff(np.r_[starts, len(groups)])
+    return starts, sizes
+
+
+def top_k_per_group(scores, groups, k):
+    """
+    Row indices of the k highest scores within each contiguous group, best first.
+
+    Returns (rows, ranks) for a 1-d scores array: rows holds global row indices and ranks
+    the 1-based rank within the group; groups with fewer than k rows contribute all of them.
+    """
+    starts, sizes = group_bounds(groups)
+    if len(starts) == 0 or k <= 0:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    width = int(sizes.max())
+    k = min(k, width)
+
+    # scatter scores into one padded row per group
+    group_of_row = np.repeat(np.arange(len(starts)), sizes)
+    position = np.arange(len(group_of_row)) - starts[group_of_row]
+    padded = np.full((len(starts), width), -np.inf, dtype=np.float32)
+    padded[group_of_row, position] = scores
+
+    top = np.argpartition(-padded, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(padded, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    valid = np.isfinite(top_scores)
+    rows = (starts[:, None] + top)[valid]
+    ranks = np.broadcast_to(np.arange(1, k + 1), top.shape)[valid]
+    return rows, ranks
+
+
+def select_paragraphs(vectors, index, query_vectors, k=3, query_ids=None):
+    """
+    Top-k paragraphs per article and query.
+
+    vectors: (n, dim) paragraph embeddings; index: DataFrame with filename, paragraph_id, and text per row.
+    Returns a long DataFrame with query_id, filename, rank, paragraph_id, similarity, and text.
+    """
+    query_vectors = np.atleast_2d(query_vectors)
+    if query_ids is None:
+        query_ids = list(range(1, len(query_vectors) + 1))
+    scores = cosine_scores(vectors, query_vectors)
+
+    # make each article's rows contiguous (they already are in files written by embed_to_file)
+    codes = pd.factorize(index["filename"])[0]
+    order = np.argsort(codes, kind="stable")
+
+    frames = []
+    for q, query_id in enumerate(query_ids):
+        rows, ranks = top_k_per_group(scores[order, q], codes[order], k)
+        rows = order[rows]
+        selected = index.iloc[rows][["filename", "paragraph_id", "text"]].reset_index(drop=True)
+        selected.insert(0, "query_id", query_id)
+        selected.insert(2, "rank", ranks)
+        selected.insert(4, "similarity", scores[rows, q])
+        frames.append(selected)
+    columns = ["query_id", "filename", "rank", "paragraph_id", "similarity", "text"]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+def to_wide(selected):
+    """
+    One row per query and article with p<j>, p<j>_paragraph_id, and p<j>_cos_similarity columns,
+    where p1, p2, ... are the selected paragraphs in document order.
+    """
+    selected = selected.sort_values(["query_id", "filename", "paragraph_id"], kind="stable")
+    selected = selected.assign(position=selected.groupby(["query_id", "filename"], sort=False).cumcount() + 1)
+
+    out = selected[["query_id", "filename"]].drop_duplicates().reset_index(drop=True)
+    for position, group in selected.groupby("position"):
+        group = group.rename(columns={"text": f"p{position}",
+                                      "paragraph_id": f"p{position}_paragraph_id",
+                                      "similarity": f"p{position}_cos_similarity"})
+        out = out.merge(group[["query_id", "filename", f"p{position}", f"p{position}_paragraph_id",
+                               f"p{position}_cos_similarity"]], on=["query_id", "filename"], how="left")
+    return out
@@ -0,0 +1,39 @@
+"""
+Project: Theory Discourse Analysis
+
+Importable stage logic behind the 03 PDF conversion and the 04 to 06 scripts.
+
+Each stage module has an argparse parser (nothing is parsed at import) and a run(args, ...)
+function that does what the script does and returns its result table, so stages can be
+called from other code and several stages can run in one process, sharing a corpus index
+and handing tables over in memory:
+
+    from tda import stages
+    args = stages.relevance.parser.parse_args(["-i", "data_xml", "-o", "outputs", "--output_filename", "relevance"])
+    relevance = stages.relevance.run(args)
+
+The scripts 03_parse_xml/03_convert_pdfs_grobid.py, 04_relevance_filter/, 05_extract_text/, and
+06_stance_classification/ are thin command-line shims around these functions.
+
+Notes:
+- Submodules are imported on first attribute access, and pandas, numpy, and openai are only
+  imported inside the functions that use them, so importing a stage (or --help) is cheap
+- The response cache and telemetry of the LLM stages are reset when a stage returns, so they
+  do not leak into the next stage run in the same process
+"""
+
+
+import importlib
+
+STAGES = ("convert_pdfs", "deduplicate", "missing_abstracts", "relevance", "filter_relevant", "stance_abstracts",
+          "embed_paragraphs", "select_paragraphs", "stance_paragraphs")
+
+
+def __getattr__(name):
+    if name in STAGES:
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(STAGES))
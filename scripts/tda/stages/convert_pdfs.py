@@ -0,0 +1,164 @@
+"""
+Project: Theory Discourse Analysis
+
+Convert PDFs to TEI XML with a GROBID service, skipping PDFs whose content hash already has
+a TEI output; the logic of 03_parse_xml/03_convert_pdfs_grobid.py, which documents the options.
+"""
+
+
+import argparse
+import asyncio
+import logging
+import os
+
+from tda.journal import Journal
+from tda.scan import scan_directory
+from tda.tei import read_md5
+
+logger = logging.getLogger('rating_log')
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-i", "--input_dir", type=str, required=True, help="directory with PDF files")
+parser.add_argument("-o", "--output_dir", type=str, required=True, help="directory for the TEI XML files")
+parser.add_argument("--grobid_url", type=str, default="http://localhost:8070", help="base URL of the GROBID service")
+parser.add_argument("--concurrency", type=int, default=4, help="maximum number of PDFs in flight (at most the GROBID pool size)")
+parser.add_argument("--timeout", type=float, default=300.0, help="seconds before a single request is abandoned and retried")
+parser.add_argument("--max_tries", type=int, default=6, help="attempts per PDF for busy answers, connection errors, and timeouts")
+parser.add_argument("--consolidate_header", type=int, default=0, choices=[0, 1, 2], help="GROBID header consolidation (0: none)")
+parser.add_argument("--consolidate_citations", type=int, default=0, choices=[0, 1, 2], help="GROBID citation consolidation (0: none)")
+parser.add_argument("--journal", type=str, default=None, help="JSONL record of converted PDFs, with the log next to it (default: grobid_conversions.jsonl beside the output directory)")
+parser.add_argument("--workers", type=int, default=None, help="number of processes reading the hashes of existing TEI files")
+parser.add_argument("--force", action="store_true", help="convert every PDF, even if its hash already has a TEI output")
+
+
+def list_pdf_files(pdf_dir):
+    return sorted(f for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf"))
+
+
+def existing_hashes(tei_dir, workers=None):
+    """{MD5 idno: filename} of the TEI files in tei_dir; files without an MD5 idno are left out."""
+    hashes, _ = scan_directory(tei_dir, read_md5, workers)
+    return {md5.upper(): filename for filename, md5 in hashes if md5}
+
+
+def default_journal(tei_dir):
+    """grobid_conversions.jsonl beside tei_dir: nothing but TEI files goes into the corpus directory."""
+    return os.path.join(os.path.dirname(os.path.abspath(tei_dir)), "grobid_conversions.jsonl")
+
+
+def write_atomic(path, text):
+    """Write text to path so that an interrupted run never leaves a truncated TEI file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+async def convert_pdfs(args, todo, journal):
+    """Convert the (filename, md5) pairs in todo; results are journaled as they arrive."""
+    import aiohttp
+    from tqdm import tqdm
+    from tda.grobid import GrobidClient, GrobidError, tei_filename
+
+    options = {"consolidateHeader": args.consolidate_header, "consolidateCitations": args.consolidate_citations}
+
+    async def convert(client, filename, md5):
+        with open(os.path.join(args.input_dir, filename), "rb") as f:
+            data = f.read()
+        try:
+            tei = await client.process_fulltext(filename, data)
+        except (GrobidError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # not journaled as done, so the PDF is tried again on the next run
+            logger.error(f"FAILED {filename}: {type(e).__name__}: {e}")
+            journal.append({"filename": filename, "md5": md5, "tei": None, "status": "failed", "error": f"{type(e).__name__}: {e}"})
+            return False
+        write_atomic(os.path.join(args.output_dir, tei_filename(filename)), tei)
+        logger.info(f"CONVERTED {filename} to {tei_filename(filename)}")
+        journal.append({"filename": filename, "md5": md5, "tei": tei_filename(filename), "status": "converted"})
+        return True
+
+    async def worker(client, queue, outcomes, progress):
+        # a PDF is only read once a worker takes it, so at most `concurrency` PDFs are in memory
+        while True:
+            try:
+                filename, md5 = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            outcomes.append(await convert(client, filename, md5))
+            progress.update(1)
+
+    async with GrobidClient(args.grobid_url, args.concurrency, args.timeout, args.max_tries, options) as client:
+        if not await client.is_alive():
+            raise SystemExit(f"GROBID service at {args.grobid_url} is not reachable")
+        queue = asyncio.Queue()
+        for item in todo:
+            queue.put_nowait(item)
+        outcomes = []
+        with tqdm(total=len(todo)) as progress:
+            await asyncio.gather(*(worker(client, queue, outcomes, progress) for _ in range(args.concurrency)))
+        return outcomes
+
+
+def run(args):
+    """Convert the new PDFs of args.input_dir and return a summary with the number of PDFs per outcome."""
+    import datetime, platform
+    from tda.grobid import pdf_md5
+    from tda.logs import close_log, log_to_file
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    journal_path = args.journal or default_journal(args.output_dir)
+    log_to_file(f"{os.path.splitext(journal_path)[0]}.log")
+
+    run_info = {
+        "timestamp_utc": datetime.datetime.utcnow().isoformat(),
+        "grobid_url": args.grobid_url,
+        "concurrency": args.concurrency,
+        "consolidate_header": args.consolidate_header,
+        "consolidate_citations": args.consolidate_citations,
+        "force": args.force,
+        "python": platform.python_version(),
+    }
+    logger.info(f"RUN_INFO {run_info}")
+
+    # the journal is a cache across runs: it is never truncated
+    journal = Journal(journal_path, resume=True)
+    try:
+        # hashes with a TEI output: converted in earlier runs (even if the 04 filters removed the
+        # TEI file since), or found in the MD5 idno of a TEI file already in the output directory
+        done = {} if args.force else {r["md5"]: r["tei"] for r in journal.records if r["status"] == "converted"}
+        if not args.force:
+            done.update(existing_hashes(args.output_dir, args.workers))
+
+        print(f"HASHING PDFS in {args.input_dir}...\n")
+        pdf_files = list_pdf_files(args.input_dir)
+        todo, skipped, duplicates = [], 0, 0
+        queued = set()
+        for filename in pdf_files:
+            md5 = pdf_md5(os.path.join(args.input_dir, filename))
+            if md5 in done:
+                logger.info(f"SKIPPING {filename}: hash {md5} already converted to {done[md5]}")
+                skipped += 1
+            elif md5 in queued:
+                logger.info(f"SKIPPING {filename}: same content as another PDF of this run")
+                duplicates += 1
+            else:
+                todo.append((filename, md5))
+                queued.add(md5)
+        print(f"PDFS: {len(pdf_files)} ({skipped} already converted, {duplicates} duplicates, {len(todo)} to convert)\n")
+        logger.info(f"PDFS {len(pdf_files)}: {skipped} already converted, {duplicates} duplicates, {len(todo)} to convert")
+
+        converted = 0
+        if todo:
+            print(f"CONVERTING PDFS with {args.grobid_url}...\n")
+            outcomes = asyncio.run(convert_pdfs(args, todo, journal))
+            converted = sum(outcomes)
+
+        summary = {"pdfs": len(pdf_files), "skipped": skipped, "duplicates": duplicates,
+                   "converted": converted, "failed": len(todo) - converted}
+        print(f"CONVERTED {converted} PDFs to {args.output_dir} ({summary['failed']} failed, see {journal_path})")
+        logger.info(f"SUMMARY {summary}")
+        print("DONE")
+        return summary
+    finally:
+        journal.close()
+        close_log()
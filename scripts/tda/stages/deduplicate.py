@@ -0,0 +1,134 @@
+"""
+Project: Theory Discourse Analysis
+
+Remove duplicate (and optionally near-duplicate) TEI files from a directory; the logic of
+04_relevance_filter/04_filter_deduplicate_xml.py, which documents the options.
+"""
+
+
+import argparse
+import os
+
+from tda.scan import scan_directory, report_failures
+from tda.tei import read_article_key, document_text, text_fingerprint
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-i", "--input_dir", required=True, help="Directory containing TEI XML files")
+parser.add_argument("--workers", type=int, default=None, help="number of parser processes (default: all cores)")
+parser.add_argument("--chunksize", type=int, default=16, help="files dispatched to a worker at a time")
+parser.add_argument("--index", type=str, default=None, help="SQLite corpus index to query instead of parsing every file")
+parser.add_argument("--near_duplicates", action="store_true", help="also detect near-duplicate articles with minhash/lsh")
+parser.add_argument("--threshold", type=float, default=0.8, help="estimated jaccard similarity at which two articles are near-duplicates")
+parser.add_argument("--num_perm", type=int, default=128, help="number of minhash permutations")
+parser.add_argument("--shingle_size", type=int, default=5, help="number of words per shingle")
+parser.add_argument("--report", type=str, default=None, help="csv file to write duplicate clusters to")
+parser.add_argument("--remove_near_duplicates", action="store_true", help="delete near-duplicates (all but the first file of each cluster)")
+
+
+def filter_duplicate_articles(directory, workers=None, chunksize=16, index=None):
+    """Returns (duplicate filenames, groups): groups maps each hash to all its files, the kept one first."""
+    # MD5 hash used as content-based article identifier, text hash where there is none
+    if index is None:
+        hashes, failures = scan_directory(directory, read_article_key, workers, chunksize)
+    else:
+        index.refresh(directory, workers, chunksize)
+        hashes = []
+        failures = index.failures(directory)
+        for document in index.documents(directory):
+            if document["md5"] is not None:
+                hashes.append((document["filename"], document["md5"]))
+                continue
+            try:
+                hashes.append((document["filename"], text_fingerprint(document_text(document))))
+            except ValueError as e:
+                failures.append((document["filename"], f"ValueError: {e}"))
+    report_failures(failures)
+
+    groups = {}
+    duplicate_files = []
+    for filename, article_hash in hashes:
+        if article_hash not in groups:
+            groups[article_hash] = [filename]
+        else:
+            groups[article_hash].append(filename)
+            duplicate_files.append(filename)
+
+    print("Total files: ", len(hashes) + len(failures))
+    print("Unparseable files: ", len(failures))
+    print("Files without MD5 (text hash used): ", sum(h.startswith("text:") for _, h in hashes))
+    print("Duplicate files: ", len(duplicate_files))
+    return duplicate_files, groups
+
+
+def filter_near_duplicate_articles(directory, filenames, threshold=0.8, num_perm=128, shingle_size=5,
+                                   workers=None, chunksize=16, index=None):
+    """Returns clusters of near-duplicates among filenames: lists of (filename, similarity to the first file)."""
+    from functools import partial
+    from tda.minhash import permutations, signature, read_signature, near_duplicate_clusters
+
+    perms = permutations(num_perm)
+    if index is None:
+        signatures, failures = scan_directory(directory, partial(read_signature, perms=perms, k=shingle_size),
+                                              workers, chunksize, filenames=filenames)
+        report_failures(failures)
+    else:
+        wanted = set(filenames)
+        signatures = [(document["filename"], signature(document_text(document), perms, shingle_size))
+                      for document in index.documents(directory) if document["filename"] in wanted]
+
+    clusters = near_duplicate_clusters(dict(signatures), threshold)
+    for cluster in clusters:
+        print("Near-duplicates: ", ", ".join(f"{f} ({similarity:.2f})" for f, similarity in cluster))
+    print("Near-duplicate clusters: ", len(clusters))
+    print("Near-duplicate files: ", sum(len(cluster) - 1 for cluster in clusters))
+    return clusters
+
+
+def write_report(path, groups, clusters):
+    import pandas as pd
+
+    # exact duplicate groups first, then near-duplicate clusters; the first file of each is kept
+    exact = [[(f, 1.0) for f in files] for files in groups.values() if len(files) > 1]
+    rows = []
+    for cluster_id, (match, cluster) in enumerate([("exact", c) for c in exact] + [("near", c) for c in clusters], start=1):
+        for i, (filename, similarity) in enumerate(cluster):
+            rows.append({"cluster": cluster_id, "filename": filename, "kept": i == 0, "match": match, "similarity": similarity})
+    pd.DataFrame(rows, columns=["cluster", "filename", "kept", "match", "similarity"]).to_csv(path, index=False)
+
+
+def remove_duplicate_articles(directory, duplicates):
+    for duplicate in duplicates:
+        os.remove(os.path.join(directory, duplicate))
+
+
+def run(args, index=None):
+    """Delete duplicates from args.input_dir and return the removed filenames; index overrides --index."""
+    from tda.corpus_index import CorpusIndex
+
+    articles_directory = args.input_dir
+    own_index = index is None and args.index is not None
+    if own_index:
+        index = CorpusIndex(args.index)
+
+    duplicates, groups = filter_duplicate_articles(articles_directory, args.workers, args.chunksize, index)
+    remove_duplicate_articles(articles_directory, duplicates)
+
+    clusters = []
+    if args.near_duplicates:
+        # exact duplicates are gone, compare the kept files only
+        kept = sorted(files[0] for files in groups.values())
+        clusters = filter_near_duplicate_articles(articles_directory, kept, args.threshold, args.num_perm,
+                                                  args.shingle_size, args.workers, args.chunksize, index)
+        if args.remove_near_duplicates:
+            near_duplicates = [filename for cluster in clusters for filename, _ in cluster[1:]]
+            remove_duplicate_articles(articles_directory, near_duplicates)
+            duplicates = duplicates + near_duplicates
+
+    if args.report:
+        write_report(args.report, groups, clusters)
+
+    if index is not None:
+        index.forget(articles_directory, duplicates)
+        if own_index:
+            index.close()
+    return duplicates
@@ -0,0 +1,170 @@
+"""
+Project: Theory Discourse Analysis
+
+Extract paragraphs from TEI XML files and embed them in batched requests; the logic of
+05_extract_text/05_embed_paragraphs.py, which documents the options.
+"""
+
+
+import argparse
+import functools
+import logging
+import os
+
+from tda.scan import scan_directory, report_failures
+from tda.tei import read_tei_document
+
+logger = logging.getLogger('rating_log')
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-i", "--input", type=str, required=True, help="directory with TEI XML files")
+parser.add_argument("-o", "--output", type=str, required=True, help="output prefix for <output>.npy and <output>.index.csv")
+parser.add_argument("--filenames", type=str, default=None, help="csv file with a filename column restricting the articles")
+parser.add_argument("--model", type=str, default="text-embedding-ada-002", help="OpenAI embedding model name")
+parser.add_argument("--batch_size", type=int, default=256, help="number of paragraphs per embedding request")
+parser.add_argument("--workers", type=int, default=None, help="number of TEI parser processes (default: all cores)")
+parser.add_argument("--index", type=str, default=None, help="SQLite corpus index to query instead of parsing every file")
+parser.add_argument("--cache", type=str, default=None, help="SQLite embedding cache shared across runs")
+parser.add_argument("--cache_size", type=int, default=2000000, help="maximum number of cached embeddings (LRU eviction)")
+parser.add_argument("--bm25_query", type=str, action="append", default=[], help="query text for the BM25 prefilter (repeatable)")
+parser.add_argument("--bm25_queries_file", type=str, default=None, help="text file with BM25 queries separated by blank lines")
+parser.add_argument("--bm25_top_m", type=int, default=None, help="keep the top M paragraphs per article by BM25 score (default: no prefilter)")
+parser.add_argument("--bm25_margin", type=int, default=5, help="additional paragraphs kept per article on top of --bm25_top_m")
+parser.add_argument("--recall_sample", type=int, default=0, help="number of articles embedded in full to report prefilter recall")
+parser.add_argument("--recall_top_n", type=int, default=3, help="number of selected paragraphs per article the recall refers to")
+parser.add_argument("--api_base", type=str, default=None, help="alternative API base URL, e.g. a local mock server")
+
+
+def read_paragraphs(xml_dir, filenames=None, workers=None, index=None, logger=None):
+    """DataFrame with one row per paragraph (filename, paragraph_id, text) in filename and document order."""
+    import pandas as pd
+
+    if index is not None:
+        if logger is not None:
+            logger.info(f"INDEX REFRESH {index.refresh(xml_dir, workers)}")
+        rows = index.paragraphs(xml_dir, filenames)
+    else:
+        if filenames is not None:
+            available = set(os.listdir(xml_dir))
+            filenames = [f for f in filenames if f in available]
+        documents, failures = scan_directory(xml_dir, read_tei_document, workers, filenames=filenames)
+        report_failures(failures, logger)
+        rows = ((filename, i + 1, text) for filename, document in documents
+                for i, text in enumerate(document["paragraphs"]))
+    return pd.DataFrame(rows, columns=["filename", "paragraph_id", "text"])
+
+
+def prefilter_recall(paragraphs, keep, queries, model, embed, sample_size, top_n, seed=1):
+    """Embed all paragraphs of sample_size random articles and compare selection with and without the prefilter."""
+    import numpy as np
+    from tda.bm25 import selection_recall
+    from tda.embeddings import iter_batches
+
+    filenames = paragraphs["filename"].drop_duplicates()
+    sample = filenames.sample(n=min(sample_size, len(filenames)), random_state=seed)
+    rows = np.flatnonzero(paragraphs["filename"].isin(sample).to_numpy())
+    texts = list(paragraphs["text"].iloc[rows])
+    vectors = np.vstack([embed(batch, model) for _, batch in iter_batches(texts)])
+    query_vectors = embed(queries, model)
+    return selection_recall(vectors, paragraphs.iloc[rows].reset_index(drop=True), keep[rows], query_vectors, top_n)
+
+
+def check_args(args):
+    from tda.selection import read_queries
+
+    if args.bm25_top_m is not None and not read_queries(args.bm25_query, args.bm25_queries_file):
+        parser.error("--bm25_top_m requires --bm25_query or --bm25_queries_file")
+
+
+def run(args, index=None):
+    """
+    Embed the paragraphs of args.input into <output>.npy and <output>.index.csv and return the
+    paragraph table; index (an open CorpusIndex) overrides --index.
+    """
+    import datetime, platform
+    import openai
+    import pandas as pd
+    from dotenv import load_dotenv
+    from tda.bm25 import prefilter
+    from tda.cache import EmbeddingCache
+    from tda.corpus_index import CorpusIndex
+    from tda.embeddings import embed_batch, embed_cached, embed_to_file
+    from tda.logs import close_log, log_to_file
+    from tda.selection import read_queries
+
+    check_args(args)
+    bm25_queries = read_queries(args.bm25_query, args.bm25_queries_file)
+    load_dotenv()
+    log_to_file(f"{args.output}.log")
+
+    run_info = {
+        "timestamp_utc": datetime.datetime.utcnow().isoformat(),
+        "model": args.model,
+        "batch_size": args.batch_size,
+        "bm25_top_m": args.bm25_top_m,
+        "bm25_margin": args.bm25_margin,
+        "python": platform.python_version(),
+    }
+    logger.info(f"RUN_INFO {run_info}")
+
+    # set OpenAI key
+    openai.api_key = os.getenv("GPT4_KEY")
+    if args.api_base:
+        openai.api_base = args.api_base
+
+    filenames = None
+    if args.filenames:
+        filenames = sorted(set(pd.read_csv(args.filenames)["filename"]))
+
+    cache = None
+    try:
+        print(f"READING PARAGRAPHS in {args.input}...\n")
+        logger.info(f"READING PARAGRAPHS in {args.input}")
+        own_index = index is None and args.index is not None
+        if own_index:
+            index = CorpusIndex(args.index)
+        paragraphs = read_paragraphs(args.input, filenames, args.workers, index, logger)
+        if own_index:
+            index.close()
+        print(f"PARAGRAPHS: {len(paragraphs)} in {paragraphs['filename'].nunique()} articles\n")
+        logger.info(f"PARAGRAPHS {len(paragraphs)} in {paragraphs['filename'].nunique()} articles")
+
+        # embed only paragraphs missing from the shared embedding cache
+        embed = embed_batch
+        if args.cache:
+            cache = EmbeddingCache(args.cache, max_entries=args.cache_size)
+            embed = functools.partial(embed_cached, cache=cache)
+
+        if args.bm25_top_m is not None:
+            keep = prefilter(paragraphs, bm25_queries, args.bm25_top_m, args.bm25_margin)
+            print(f"BM25 PREFILTER: keeping {keep.sum()} of {len(paragraphs)} paragraphs ({keep.mean():.1%})\n")
+            logger.info(f"BM25 PREFILTER kept {keep.sum()} of {len(paragraphs)} paragraphs")
+
+            if args.recall_sample:
+                report = prefilter_recall(paragraphs, keep, bm25_queries, args.model, embed,
+                                          args.recall_sample, args.recall_top_n)
+                report.to_csv(f"{args.output}.bm25_recall.csv", index=False)
+                recall = report["n_recovered"].sum() / max(report["n_selected"].sum(), 1)
+                complete = (report["n_recovered"] == report["n_selected"]).mean()
+                print(f"BM25 RECALL: {recall:.3f} of top {args.recall_top_n} paragraphs recovered "
+                      f"({complete:.1%} of sampled articles complete), see {args.output}.bm25_recall.csv\n")
+                logger.info(f"BM25 RECALL {recall:.3f} (articles complete {complete:.3f}) on "
+                            f"{report['filename'].nunique()} sampled articles")
+
+            paragraphs = paragraphs[keep].reset_index(drop=True)
+
+        print("EMBEDDING PARAGRAPHS...\n")
+        n_rows = embed_to_file(args.output, paragraphs, args.model, args.batch_size, embed=embed)
+        print(f"SAVED {n_rows} embeddings to {args.output}.npy and {args.output}.index.csv")
+        logger.info(f"SAVED {n_rows} embeddings to {args.output}.npy")
+
+        if cache is not None:
+            print(f"EMBEDDING CACHE: {cache.stats()}")
+            logger.info(f"CACHE_STATS {cache.stats()}")
+
+        print("DONE")
+        return paragraphs
+    finally:
+        if cache is not None:
+            cache.close()
+        close_log()
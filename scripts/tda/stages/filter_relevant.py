@@ -0,0 +1,42 @@
+"""
+Project: Theory Discourse Analysis
+
+Keep the articles of the relevance screening whose mean rating reaches a threshold; the logic
+of 04_relevance_filter/04_filter_relevant.py, which documents the options.
+"""
+
+
+import argparse
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-i", "--input", type=str, required=True, help="relevance csv file written by 04_screen_relevance_gpt4.py")
+parser.add_argument("-o", "--output", type=str, required=True, help="output csv file with the relevant articles")
+parser.add_argument("--threshold", type=float, default=0.5, help="mean_rating_relevance from which an article counts as relevant")
+
+
+def relevant_articles(df, threshold=0.5):
+    """Rows of df whose mean_rating_relevance is at least threshold; unrated rows ("NA") are dropped."""
+    import pandas as pd
+
+    rating = pd.to_numeric(df["mean_rating_relevance"], errors="coerce")
+    return df[rating >= threshold].reset_index(drop=True)
+
+
+def run(args, df_in=None):
+    """
+    Write the relevant rows of args.input (or of df_in, e.g. the table returned by the relevance
+    stage) to args.output and return them.
+    """
+    import pandas as pd
+
+    if df_in is None:
+        print(f"READING FILE {args.input}...\n")
+        df_in = pd.read_csv(args.input)
+
+    relevant = relevant_articles(df_in, args.threshold)
+    print(f"RELEVANT ARTICLES: {len(relevant)} of {len(df_in)} (mean_rating_relevance >= {args.threshold})\n")
+
+    relevant.to_csv(args.output, index=False)
+    print(f"SAVED {len(relevant)} rows to {args.output}")
+    print("DONE")
+    return relevant
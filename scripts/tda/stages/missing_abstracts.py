@@ -0,0 +1,49 @@
+"""
+Project: Theory Discourse Analysis
+
+Remove TEI files without an abstract from a directory; the logic of
+04_relevance_filter/04_filter_missing_abstracts.py, which documents the options.
+"""
+
+
+import argparse
+import os
+
+from tda.scan import scan_directory, report_failures
+from tda.tei import has_abstract
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-i", "--input_dir", required=True, help="Directory containing TEI XML files")
+parser.add_argument("--workers", type=int, default=None, help="number of parser processes (default: all cores)")
+parser.add_argument("--chunksize", type=int, default=16, help="files dispatched to a worker at a time")
+parser.add_argument("--index", type=str, default=None, help="SQLite corpus index to query instead of parsing every file")
+
+
+def run(args, index=None):
+    """Delete files without abstract from args.input_dir and return their filenames; index overrides --index."""
+    from tda.corpus_index import CorpusIndex
+
+    articles_directory = args.input_dir
+    own_index = index is None and args.index is not None
+    if own_index:
+        index = CorpusIndex(args.index)
+
+    # check every file in that directory
+    if index is not None:
+        index.refresh(articles_directory, args.workers, args.chunksize)
+        abstracts, failures = index.abstract_flags(articles_directory), index.failures(articles_directory)
+    else:
+        abstracts, failures = scan_directory(articles_directory, has_abstract, args.workers, args.chunksize)
+    report_failures(failures)
+
+    no_abstract_files = [filename for filename, found in abstracts if not found]
+    print("Files without abstract: ", len(no_abstract_files))
+
+    for file in no_abstract_files:
+        os.remove(os.path.join(articles_directory, file))
+
+    if index is not None:
+        index.forget(articles_directory, no_abstract_files)
+        if own_index:
+            index.close()
+    return no_abstract_files
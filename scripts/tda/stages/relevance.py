@@ -0,0 +1,345 @@
+"""
+Project: Theory Discourse Analysis
+
+Screen article abstracts for relevance to the target theory with repeated LLM ratings; the
+logic of 04_relevance_filter/04_screen_relevance_gpt4.py, which documents the options.
+"""
+
+
+import argparse
+import asyncio
+import logging
+import os
+
+from tda.journal import Journal
+from tda.batch import export_requests, ingest_results
+from tda.labels import LabelExtractor
+from tda.rating import early_stop, rate_iterations, rate_iterations_packed
+
+logger = logging.getLogger('rating_log')
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--model", type=str, default="gpt-4", help="OpenAI model name")
+parser.add_argument("--output_filename", type=str, required=True, help="Base name for output CSV/log")
+parser.add_argument("-i", "--input", type=str, required=True, help="directory with input files")
+parser.add_argument("-o", "--output", type=str, required=True, help="directory of output file")
+parser.add_argument("-iter", "--iterations", type=int, required=False, default=10, help="number of iterations per article")
+parser.add_argument("--workers", type=int, default=None, help="number of TEI parser processes (default: all cores)")
+parser.add_argument("--index", type=str, default=None, help="SQLite corpus index to query instead of parsing every file")
+parser.add_argument("--async_requests", action="store_true", help="submit requests concurrently instead of one at a time")
+parser.add_argument("--concurrency", type=int, default=8, help="maximum number of requests in flight (async mode)")
+parser.add_argument("--rpm", type=float, default=None, help="client-side limit for requests per minute (async mode)")
+parser.add_argument("--tpm", type=float, default=None, help="client-side limit for tokens per minute (async mode)")
+parser.add_argument("--early_stop", action="store_true", help="stop iterating once the ratings agree (sequential consensus)")
+parser.add_argument("--agreement", type=float, default=1.0, help="share of ratings that must agree to stop early")
+parser.add_argument("--min_iterations", type=int, default=3, help="minimum number of iterations before stopping early")
+parser.add_argument("--cache", type=str, default=None, help="SQLite response cache shared across stages and reruns")
+parser.add_argument("--cache_size", type=int, default=200000, help="maximum number of cached responses (LRU eviction)")
+parser.add_argument("--telemetry", type=str, default=None, help="JSONL file for per-call latency, token, and retry metrics")
+parser.add_argument("--resume", action="store_true", help="continue from the journal of a previous run")
+parser.add_argument("--batch_export", type=str, default=None, help="write all chat requests to this JSONL file and exit")
+parser.add_argument("--batch_ingest", type=str, default=None, help="read batch results from this JSONL file instead of calling the API")
+parser.add_argument("--api_base", type=str, default=None, help="alternative API base URL, e.g. a local mock server")
+parser.add_argument("--pack_size", type=int, default=1, help="number of abstracts per request (packing mode if > 1)")
+parser.add_argument("--max_reasks", type=int, default=2, help="maximum number of re-asks for an answer without a readable label")
+parser.add_argument("--cascade", type=str, default=None, help="local relevance model (.npz) deciding confident abstracts before the LLM")
+parser.add_argument("--cascade_low", type=float, default=0.05, help="probability at or below which the local model decides 'irrelevant'")
+parser.add_argument("--cascade_high", type=float, default=0.95, help="probability at or above which the local model decides 'relevant'")
+
+QUERY = """Human rates will be given a set of scientific articles, and they will have to categorize each article into four categories, \
+        depending on how they relate to the concept of memory decay. The concept of memory decay in psychology describe the theory that \
+        memories traces are stored with an initial strength value and that this strength decays passively over time unless it is reactivated. \
+        They will receive the following instructions: Instructions for human raters: You will read an article about human memory and you \
+        should classify each article depending on how it discusses the idea that the strength of memories decay passively over time. \
+        You can assign one of four categories to the text. Use the following questions in this order to assign the categories: - \
+        Does the text disagree with the idea that memory decay exists or disagree with the idea that it is the major cause of forgetting? \
+        If so, respond 'against'. \
+        Only assign this category if the text explicitly rejects all forms of memory decay, rather than just some version of it. \
+        Does the article implicitly assume that the concept of memory decay is true and then builds on it? If so, respond 'tacit_acceptance'. \
+        Assign this category if the text doesn't explicitly mention or discuss evidence for or against the general idea. \
+        Does the article explicitly agree with or provide evidence for the idea that memory decays over time? If so, respond 'support'. \
+        Only assign this category if the text specifically discusses evidence for the idea, or explicitly agrees that the idea is true. \
+        Does the text explicitly mention memory decay as one of several possibilities without discussing evidence for or against or without \
+        assuming it's true? If so, respond 'neutral'. \
+        Only assign this category if 'tacit_acceptance' doesn't fit.\n\n \
+        We first have to select which articles to present to human raters. We only want to show them articles that can be categorized in one \
+        of the categories above. If articles cannot be categorized in one of the categories above, they are irrelevant. We have several thousand \
+        scientific articles, but many of them are not relevant for the QUERY above. Some articles are irrelevant because they are done with \
+        non-human animals. Others are irrelevant because they do not mention memory decay explicitly. \Others are irrelevant because they discuss \
+        degradation of memory in old age. We will give you an abstract and your task is to rate the abstract as relevant or irrelevant for the \
+        human raters. Provide a clear category label ("relevant" or "irrelevant") on the first line for the abstract below followed by your rationale in a new paragraph."""
+
+
+def check_args(args):
+    if args.cascade and not args.cascade_low < args.cascade_high:
+        parser.error("--cascade_low must be lower than --cascade_high")
+
+    if args.pack_size > 1 and (args.batch_export or args.batch_ingest):
+        parser.error("--pack_size cannot be combined with --batch_export or --batch_ingest")
+
+
+def make_extractor(max_reasks=2):
+    # translate rating to distinct id
+    return LabelExtractor({"irrelevant": 0, "relevant": 1},
+                          aliases={"not relevant": "irrelevant"},
+                          max_reasks=max_reasks)
+
+
+async def chatGPT_rate_relevance_async(args, extractor, client, query, filename, abstract, journal, iterations=10, results=None):
+    results = {} if results is None else results
+    messages = [{"role": "system", "content" : query},
+                {"role": "user", "content" : abstract},
+                ]
+
+    async def rate(i):
+        if (filename, i+1) in results:
+            return results[(filename, i+1)]["rating"]
+
+        result = await extractor.acomplete(
+            client.complete,
+            filename = filename,
+            iteration = i+1,
+            model = args.model,
+            messages = messages,
+            temperature = 0.0)
+        category_id, rationale = extractor.parse(result)
+        journal.append({"filename": filename, "iteration": i+1, "rating": category_id, "rationale": rationale})
+        return category_id
+
+    stop = early_stop(args)
+    if stop is None:
+        # submit all iterations at once; the client bounds concurrency and rate
+        await asyncio.gather(*[rate(i) for i in range(iterations)])
+        return
+
+    # the first min_iterations ratings are always needed; further ones are requested one at a time
+    n_first = min(args.min_iterations, iterations)
+    ratings = list(await asyncio.gather(*[rate(i) for i in range(n_first)]))
+    for i in range(n_first, iterations):
+        if stop(ratings):
+            logger.info(f"Consensus for {filename} after {i} iterations")
+            break
+        ratings.append(await rate(i))
+
+
+async def rate_articles_packed(args, extractor, query, articles, journal, results=None):
+    """Rate all articles iteration by iteration, packing args.pack_size abstracts into each request."""
+    from tda.llm import AsyncChatClient
+
+    async with AsyncChatClient(args.concurrency if args.async_requests else 1, args.rpm, args.tpm) as client:
+        return await rate_iterations_packed(client, query, zip(articles["filename"], articles["abstract"]), args.iterations,
+                                            args.pack_size, extractor, journal, results, early_stop(args), args.model)
+
+
+def mean_rating(ratings):
+    import numpy as np
+
+    ratings = [x for x in ratings if type(x) == int]
+    if len(ratings) > 0:
+        return np.asarray(ratings, dtype=int).mean()
+    return "NA"
+
+
+async def rate_articles_async(args, extractor, query, articles, journal, iterations=10, results=None):
+    results = {} if results is None else results
+    from tqdm import tqdm
+    from tda.llm import AsyncChatClient
+
+    async def rate(filename, abstract):
+        await chatGPT_rate_relevance_async(args, extractor, client, query, filename, abstract, journal, iterations, results)
+        logger.info(f"RATED {filename}")
+
+    async with AsyncChatClient(args.concurrency, args.rpm, args.tpm) as client:
+        tasks = [asyncio.ensure_future(rate(filename, abstract))
+                 for filename, abstract in zip(articles["filename"], articles["abstract"])]
+        for task in tqdm(asyncio.as_completed(tasks), total=len(tasks)):
+            await task
+
+
+def cascade_decisions(articles, model, low, high):
+    """Add cascade_probability and cascade_decision; articles without an abstract always go to the LLM."""
+    import numpy as np
+    from tda.cascade import decide
+
+    has_abstract = ~articles["abstract"].astype(str).str.strip().isin(["", "NA"])
+    probability = np.full(len(articles), np.nan)
+    if has_abstract.any():
+        probability[has_abstract.to_numpy()] = model.predict(articles.loc[has_abstract, "abstract"].astype(str))
+    decision = np.where(has_abstract, decide(np.nan_to_num(probability, nan=0.5), low, high), "llm")
+    return articles.assign(cascade_probability=probability, cascade_decision=decision)
+
+
+def materialise_ratings(articles, journal, iterations=10):
+    results = journal.results("filename", "iteration")
+    df_final = articles.copy()
+    ratings = [[] for _ in range(len(df_final))]
+    for i in range(iterations):
+        records = [results.get((filename, i+1), {"rating": "NA", "rationale": "NA"}) for filename in df_final["filename"]]
+        df_final[f"rating_relevance{i+1}"] = [r["rating"] for r in records]
+        df_final[f"rationale{i+1}"] = [r["rationale"] for r in records]
+        for row_ratings, record in zip(ratings, records):
+            row_ratings.append(record["rating"])
+    df_final["mean_rating_relevance"] = [mean_rating(r) for r in ratings]
+    df_final["n_calls_relevance"] = [sum((filename, i+1) in results for i in range(iterations)) for filename in df_final["filename"]]
+    if "cascade_decision" in df_final:
+        # articles decided by the local model keep NA ratings and take its decision as mean
+        for decision, value in (("irrelevant", 0.0), ("relevant", 1.0)):
+            df_final.loc[df_final["cascade_decision"] == decision, "mean_rating_relevance"] = value
+    return df_final
+
+
+def read_articles(xml_dir, workers=None, index=None):
+    """Table of TEI metadata records (one row per file), parsed in parallel or read from the corpus index."""
+    import pandas as pd
+    from tda.scan import scan_directory, report_failures
+    from tda.tei import read_tei_record, collect_columns
+
+    if index is not None:
+        logger.info(f"INDEX REFRESH {index.refresh(xml_dir, workers)}")
+        records, failures = index.records(xml_dir), index.failures(xml_dir)
+    else:
+        records, failures = scan_directory(xml_dir, read_tei_record, workers)
+        records = (record for _, record in records)
+    report_failures(failures, logger)
+    return pd.DataFrame(collect_columns(records))
+
+
+def run(args, index=None):
+    """
+    Screen the abstracts of args.input and write <output>/<output_filename>.csv; returns the
+    table (None with --batch_export). index (a tda.corpus_index.CorpusIndex) overrides --index.
+    """
+    import datetime, platform
+    import openai
+    from dotenv import load_dotenv
+    from tda.cascade import RelevanceModel
+    from tda.corpus_index import CorpusIndex
+    from tda.logs import close_log, log_to_file
+    from tda.runtime import LLMRuntime
+
+    check_args(args)
+    os.makedirs(args.output, exist_ok=True)
+
+    out_log = os.path.join(args.output, f"{args.output_filename}.log")
+    out_csv = os.path.join(args.output, f"{args.output_filename}.csv")
+    out_journal = os.path.join(args.output, f"{args.output_filename}.jsonl")
+
+    log_to_file(out_log, resume=args.resume)
+    extractor = make_extractor(args.max_reasks)
+    load_dotenv()
+
+    run_info = {
+        "timestamp_utc": datetime.datetime.utcnow().isoformat(),
+        "model": args.model,
+        "temperature": 0.0,
+        "iterations": getattr(args, "iterations", None),
+        "early_stop": args.early_stop,
+        "agreement": args.agreement if args.early_stop else None,
+        "min_iterations": args.min_iterations if args.early_stop else None,
+        "async_requests": args.async_requests,
+        "concurrency": args.concurrency if args.async_requests else 1,
+        "pack_size": args.pack_size,
+        "max_reasks": args.max_reasks,
+        "cascade": args.cascade,
+        "cascade_low": args.cascade_low if args.cascade else None,
+        "cascade_high": args.cascade_high if args.cascade else None,
+        "python": platform.python_version(),
+    }
+    logger.info(f"RUN_INFO {run_info}")
+
+    # set OpenAI key
+    openai.api_key = os.getenv("GPT4_KEY")
+
+    if args.api_base:
+        openai.api_base = args.api_base
+
+    try:
+        with LLMRuntime(args, stage="04_relevance") as runtime:
+            print(f"READING FILES in {args.input}...\n")
+            logger.info(f"READING FILES in {args.input}")
+
+            # parse TEI files in parallel (or query the corpus index) and stream one metadata
+            # record per file into a columnar table
+            own_index = index is None and args.index is not None
+            if own_index:
+                index = CorpusIndex(args.index)
+            articles = read_articles(args.input, args.workers, index)
+            if own_index:
+                index.close()
+
+            # cascade: confident abstracts are decided locally, only the uncertain band is rated by the LLM
+            to_rate = articles
+            if args.cascade:
+                articles = cascade_decisions(articles, RelevanceModel.load(args.cascade), args.cascade_low, args.cascade_high)
+                to_rate = articles[articles["cascade_decision"] == "llm"]
+                counts = articles["cascade_decision"].value_counts()
+                cascade_stats = {decision: int(counts.get(decision, 0)) for decision in ("irrelevant", "relevant", "llm")}
+                print(f"CASCADE: {cascade_stats['irrelevant']} irrelevant and {cascade_stats['relevant']} relevant decided locally, "
+                      f"{cascade_stats['llm']} forwarded to the LLM\n")
+                logger.info(f"CASCADE {cascade_stats}")
+
+            if args.batch_export:
+                # write every request to one file for a bulk endpoint; nothing is sent
+                print(f"EXPORTING REQUESTS to {args.batch_export}...\n")
+                n_requests = export_requests(args.batch_export, (
+                    (filename, i+1, None, {
+                        "model": args.model,
+                        "messages": [{"role": "system", "content" : QUERY},
+                                     {"role": "user", "content" : abstract},
+                                     ],
+                        "temperature": 0.0})
+                    for filename, abstract in zip(to_rate["filename"], to_rate["abstract"])
+                    for i in range(args.iterations)))
+                logger.info(f"EXPORTED {n_requests} requests to {args.batch_export}")
+                print(f"EXPORTED {n_requests} requests")
+                print("DONE")
+                return None
+
+            print("RATING ARTICLES...\n")
+            logger.info(f"RATING ARTICLES")
+            journal = Journal(out_journal, resume=args.resume)
+            results = journal.results("filename", "iteration")
+            if results:
+                print(f"RESUMING: {len(results)} ratings already journaled\n")
+                logger.info(f"RESUMING with {len(results)} journaled ratings from {out_journal}")
+
+            if args.batch_ingest:
+                print(f"INGESTING RESULTS from {args.batch_ingest}...\n")
+                n_ingested, n_failed = ingest_results(args.batch_ingest, journal, extractor, results)
+                print(f"INGESTED {n_ingested} results ({n_failed} failed requests)")
+                logger.info(f"INGESTED {n_ingested} results, {n_failed} failed requests from {args.batch_ingest}")
+            elif args.pack_size > 1:
+                n_retries = asyncio.run(rate_articles_packed(args, extractor, QUERY, to_rate, journal, results))
+                print(f"PACKED: {n_retries} abstracts retried individually")
+                logger.info(f"PACKED {n_retries} abstracts retried individually")
+            elif args.async_requests:
+                asyncio.run(rate_articles_async(args, extractor, QUERY, to_rate, journal, args.iterations, results))
+            else:
+                from tqdm import tqdm
+
+                # rate relevance for each article; every result is journaled as it arrives
+                for i, (filename, abstract) in enumerate(tqdm(zip(to_rate["filename"], to_rate["abstract"]), total=len(to_rate))):
+                    print(f"RATING {filename} ({i}/{len(to_rate)}) ...")
+                    logger.info(f"RATING {filename} ({i}/{len(to_rate)})")
+                    rate_iterations(extractor, QUERY, filename, abstract, journal, args.iterations, results, early_stop(args), args.model)
+            journal.close()
+
+            # calculate mean of relevance ratings and write the csv once
+            logger.info(f"SAVING RATINGS to {out_csv}")
+            df_final = materialise_ratings(articles, journal, args.iterations)
+            df_final.to_csv(out_csv, index=False)
+
+            n_budget = len(df_final) * args.iterations
+            n_calls = int(df_final["n_calls_relevance"].sum()) if n_budget else 0
+            print(f"CALLS: {n_calls} of {n_budget} budgeted")
+            logger.info(f"CALLS {n_calls} of {n_budget} budgeted")
+            if args.cascade:
+                n_avoided = (len(articles) - len(to_rate)) * args.iterations
+                print(f"CASCADE: {n_avoided} of {n_budget} budgeted calls avoided by the local model")
+                logger.info(f"CASCADE_STATS {dict(cascade_stats, calls_avoided=n_avoided)}")
+            runtime.report(extractor)
+
+            print("DONE")
+            return df_final
+    finally:
+        close_log()
@@ -0,0 +1,76 @@
+"""
+Project: Theory Discourse Analysis
+
+Select the paragraphs of each article that are most similar to one or more theory queries; the
+logic of 05_extract_text/05_select_paragraphs.py, which documents the options.
+"""
+
+
+import argparse
+import os
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-e", "--embeddings", type=str, required=True, help="embedding prefix written by 05_embed_paragraphs.py")
+parser.add_argument("-o", "--output", type=str, required=True, help="output csv file")
+parser.add_argument("--query", type=str, action="append", default=None, help="theory query (repeat for several queries)")
+parser.add_argument("--queries_file", type=str, default=None, help="text file with queries separated by blank lines")
+parser.add_argument("--top_n", type=int, default=3, help="number of paragraphs to select per article and query")
+parser.add_argument("--format", type=str, default="wide", choices=["wide", "long"], help="output layout")
+parser.add_argument("--merge_csv", type=str, default=None, help="csv file to merge the selection onto by filename")
+parser.add_argument("--model", type=str, default="text-embedding-ada-002", help="OpenAI embedding model name (must match the paragraphs)")
+parser.add_argument("--cache", type=str, default=None, help="SQLite embedding cache shared across runs")
+parser.add_argument("--api_base", type=str, default=None, help="alternative API base URL, e.g. a local mock server")
+
+QUERY = """The concept of memory decay in scientific psychology describes that
+memory traces are stored with an initial strength value and that this strength decays passively over time unless it is reactivated.
+Reactivation of memory traces according to the memory decay theory can be done by practice.
+Once the activation level for a stored memory trace becomes too low, the memory trace is lost.
+The memory decay theory concerns memory loss in healthy individuals.
+Changes solely due to aging processes and abnormal changes in memory capacity due to impairments like dementia are not the explanatory focus of this theory."""
+
+
+def run(args):
+    """Write the selection of paragraphs to args.output and return it."""
+    import openai
+    import pandas as pd
+    from dotenv import load_dotenv
+    from tda.cache import EmbeddingCache
+    from tda.embeddings import embed_batch, embed_cached, load_embeddings
+    from tda.selection import read_queries, select_paragraphs, to_wide
+
+    load_dotenv()
+
+    # set OpenAI key
+    openai.api_key = os.getenv("GPT4_KEY")
+    if args.api_base:
+        openai.api_base = args.api_base
+
+    print(f"LOADING EMBEDDINGS from {args.embeddings}...\n")
+    vectors, index = load_embeddings(args.embeddings)
+    print(f"PARAGRAPHS: {len(index)} in {index['filename'].nunique()} articles\n")
+
+    queries = read_queries(args.query, args.queries_file, default=QUERY)
+    print(f"QUERIES: {len(queries)}\n")
+    if args.cache:
+        # queries seen before (in this or any other run sharing the cache) are not sent again
+        cache = EmbeddingCache(args.cache)
+        try:
+            query_vectors = embed_cached(queries, args.model, cache)
+            print(f"EMBEDDING CACHE: {cache.stats()}\n")
+        finally:
+            cache.close()
+    else:
+        query_vectors = embed_batch(queries, args.model)
+
+    print(f"SELECTING top {args.top_n} paragraphs per article...\n")
+    selected = select_paragraphs(vectors, index, query_vectors, args.top_n)
+    if args.format == "wide":
+        selected = to_wide(selected)
+
+    if args.merge_csv:
+        selected = pd.merge(pd.read_csv(args.merge_csv), selected, on="filename", how="left")
+
+    selected.to_csv(args.output, index=False)
+    print(f"SAVED {len(selected)} rows to {args.output}")
+    print("DONE")
+    return selected
@@ -0,0 +1,209 @@
+"""
+Project: Theory Discourse Analysis
+
+Classify article abstracts by stance toward the target theory with repeated LLM ratings; the
+logic of 06_stance_classification/06_classify_stance_abstracts_gpt4.py, which documents the options.
+"""
+
+
+import argparse
+import asyncio
+import logging
+import os
+
+from tda.journal import Journal
+from tda.batch import export_requests, ingest_results
+from tda.labels import LabelExtractor
+from tda.rating import early_stop, rate_iterations, rate_iterations_packed
+
+logger = logging.getLogger('rating_log')
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--model", type=str, default="gpt-4", help="OpenAI model name")
+parser.add_argument("-i", "--input", type=str, required=True, help="input csv file")
+parser.add_argument("-o", "--output", type=str, required=True, help="output csv file")
+parser.add_argument("-iter", "--iterations", type=int, required=False, default=3, help="number of iterations per article")
+parser.add_argument("--early_stop", action="store_true", help="stop iterating once the ratings agree (sequential consensus)")
+parser.add_argument("--agreement", type=float, default=1.0, help="share of ratings that must agree to stop early")
+parser.add_argument("--min_iterations", type=int, default=2, help="minimum number of iterations before stopping early")
+parser.add_argument("--cache", type=str, default=None, help="SQLite response cache shared across stages and reruns")
+parser.add_argument("--cache_size", type=int, default=200000, help="maximum number of cached responses (LRU eviction)")
+parser.add_argument("--telemetry", type=str, default=None, help="JSONL file for per-call latency, token, and retry metrics")
+parser.add_argument("--batch_export", type=str, default=None, help="write all chat requests to this JSONL file and exit")
+parser.add_argument("--batch_ingest", type=str, default=None, help="read batch results from this JSONL file instead of calling the API")
+parser.add_argument("--resume", action="store_true", help="continue from the journal of a previous run")
+parser.add_argument("--max_reasks", type=int, default=2, help="maximum number of re-asks for an answer without a readable label")
+parser.add_argument("--pack_size", type=int, default=1, help="number of abstracts per request (packing mode if > 1)")
+
+QUERY = """Human rates will be given three paragraphs of scientific articles, and they will have to categorize each paragraph into four categories, \
+        depending on how they relate to the concept of memory decay. The concept of memory decay in psychology describe the theory that \
+        memories traces are stored with an initial strength value and that this strength decays passively over time unless it is reactivated. \
+        They will receive the following instructions: Instructions for human raters: You will read an article about human memory and you \
+        should classify each article depending on how it discusses the idea that the strength of memories decay passively over time. \
+        You can assign one of four categories to the text. Use the following questions in this order to assign the categories: - \
+        Does the text disagree with the idea that memory decay exists or disagree with the idea that it is the major cause of forgetting? \
+        If so, respond 'against'. \
+        Only assign this category if the text explicitly rejects all forms of memory decay, rather than just some version of it. \
+        Does the article implicitly assume that the concept of memory decay is true and then builds on it? If so, respond 'tacit_acceptance'. \
+        Assign this category if the text doesn't explicitly mention or discuss evidence for or against the general idea. \
+        Does the article explicitly agree with or provide evidence for the idea that memory decays over time? If so, respond 'support'. \
+        Only assign this category if the text specifically discusses evidence for the idea, or explicitly agrees that the idea is true. \
+        Does the text explicitly mention memory decay as one of several possibilities without discussing evidence for or against or without \
+        assuming it's true? If so, respond 'ambiguous'. \
+        Only assign this category if 'tacit_acceptance' doesn't fit.\n\n \
+        Provide a clear category label ("ambiguous" or "support" or "against" or "tacit_acceptance") on the first line for the paragraph below followed by your rationale in a new paragraph."""
+
+
+def check_args(args):
+    if args.pack_size > 1 and (args.batch_export or args.batch_ingest):
+        parser.error("--pack_size cannot be combined with --batch_export or --batch_ingest")
+
+
+def make_extractor(max_reasks=2):
+    # translate rating to distinct id; "neutral" is the relevance prompt's name for "ambiguous"
+    return LabelExtractor({"ambiguous": 0, "against": 1, "support": 2, "tacit_acceptance": 3},
+                          aliases={"neutral": "ambiguous"},
+                          max_reasks=max_reasks)
+
+
+async def rate_abstracts_packed(args, extractor, query, df_in, journal, iterations=3, results=None):
+    """Rate all abstracts iteration by iteration, packing args.pack_size abstracts into each request."""
+    from tda.llm import AsyncChatClient
+
+    async with AsyncChatClient(concurrency=1) as client:
+        return await rate_iterations_packed(client, query, zip(df_in["filename"], df_in["abstract"]), iterations,
+                                            args.pack_size, extractor, journal, results, early_stop(args), args.model)
+
+
+def materialise_ratings(df_in, journal, iterations=3):
+    import numpy as np
+    import pandas as pd
+
+    results = journal.results("filename", "iteration")
+    rows = []
+    for _, row in df_in.iterrows():
+        row = row.to_dict()
+        ratings = []
+        n_calls = 0
+        for i in range(iterations):
+            n_calls += (row["filename"], i+1) in results
+            record = results.get((row["filename"], i+1), {"rating": "NA", "rationale": "NA"})
+            row[f"abstract_rating_category{i+1}"] = record["rating"]
+            row[f"abstract_rating_rationale{i+1}"] = record["rationale"]
+            ratings.append(record["rating"])
+
+        ratings = [x for x in ratings if type(x) == int]
+        if len(ratings) > 0:
+            row["abstract_rating_category_mean"] = np.asarray(ratings, dtype=int).mean()
+        else:
+            row["abstract_rating_category_mean"] = "NA"
+        row["abstract_rating_n_calls"] = n_calls
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def run(args, df_in=None):
+    """
+    Rate the abstracts of args.input (or of df_in, e.g. the table returned by the relevance
+    stage) and write <output>.csv; returns the table (None with --batch_export).
+    """
+    import datetime, platform
+    import openai
+    import pandas as pd
+    from dotenv import load_dotenv
+    from tda.logs import close_log, log_to_file
+    from tda.runtime import LLMRuntime
+
+    check_args(args)
+    log_to_file(f"{args.output}.log", resume=args.resume)
+    extractor = make_extractor(args.max_reasks)
+    load_dotenv()
+
+    run_info = {
+        "timestamp_utc": datetime.datetime.utcnow().isoformat(),
+        "model": args.model,
+        "temperature": 0.0,
+        "iterations": getattr(args, "iterations", None),
+        "early_stop": args.early_stop,
+        "agreement": args.agreement if args.early_stop else None,
+        "min_iterations": args.min_iterations if args.early_stop else None,
+        "pack_size": args.pack_size,
+        "max_reasks": args.max_reasks,
+        "python": platform.python_version(),
+    }
+    logger.info(f"RUN_INFO {run_info}")
+
+    # set OpenAI key
+    openai.api_key = os.getenv("GPT4_KEY")
+
+    try:
+        with LLMRuntime(args, stage="06_stance_abstracts") as runtime:
+            if df_in is None:
+                input_csv = args.input
+
+                print(f"READING FILE {input_csv}...\n")
+                logger.info(f"READING FILE {input_csv}")
+
+                # start populating dataframe list
+                df_in = pd.read_csv(input_csv)
+
+            if args.batch_export:
+                # write every request to one file for a bulk endpoint; nothing is sent
+                print(f"EXPORTING REQUESTS to {args.batch_export}...\n")
+                n_requests = export_requests(args.batch_export, (
+                    (row["filename"], i+1, None, {
+                        "model": args.model,
+                        "messages": [{"role": "system", "content" : QUERY},
+                                     {"role": "user", "content" : row["abstract"]},
+                                     ],
+                        "temperature": 0.0})
+                    for _, row in df_in.iterrows() for i in range(args.iterations)))
+                logger.info(f"EXPORTED {n_requests} requests to {args.batch_export}")
+                print(f"EXPORTED {n_requests} requests")
+                print("DONE")
+                return None
+
+            journal = Journal(f"{args.output}.jsonl", resume=args.resume)
+            results = journal.results("filename", "iteration")
+            if results:
+                print(f"RESUMING: {len(results)} ratings already journaled\n")
+                logger.info(f"RESUMING with {len(results)} journaled ratings from {args.output}.jsonl")
+
+            if args.batch_ingest:
+                print(f"INGESTING RESULTS from {args.batch_ingest}...\n")
+                n_ingested, n_failed = ingest_results(args.batch_ingest, journal, extractor, results)
+                print(f"INGESTED {n_ingested} results ({n_failed} failed requests)")
+                logger.info(f"INGESTED {n_ingested} results, {n_failed} failed requests from {args.batch_ingest}")
+            elif args.pack_size > 1:
+                print("RATING ARTICLES...\n")
+                logger.info(f"RATING ARTICLES in packs of {args.pack_size}")
+                n_retries = asyncio.run(rate_abstracts_packed(args, extractor, QUERY, df_in, journal, args.iterations, results))
+                print(f"PACKED: {n_retries} abstracts retried individually")
+                logger.info(f"PACKED {n_retries} abstracts retried individually")
+            else:
+                print("RATING ARTICLES...\n")
+                logger.info(f"RATING ARTICLES")
+                # rate each abstract; every result is journaled as it arrives
+                for i, row in df_in.iterrows():
+                    print(f"RATING {row['filename']} ({i}/{len(df_in)}) ...")
+                    logger.info(f"RATING {row['filename']} ({i}/{len(df_in)})")
+                    rate_iterations(extractor, QUERY, row["filename"], row["abstract"], journal, args.iterations, results,
+                                    early_stop(args), args.model)
+            journal.close()
+
+            # calculate mean of stance ratings and write the csv once
+            logger.info(f"SAVING RATINGS to {args.output}.csv")
+            df_final = materialise_ratings(df_in, journal, args.iterations)
+            df_final.to_csv(f"{args.output}.csv", index=False)
+
+            n_budget = len(df_final) * args.iterations
+            n_calls = int(df_final["abstract_rating_n_calls"].sum()) if n_budget else 0
+            print(f"CALLS: {n_calls} of {n_budget} budgeted")
+            logger.info(f"CALLS {n_calls} of {n_budget} budgeted")
+
+            runtime.report(extractor)
+
+            print("DONE")
+            return df_final
+    finally:
+        close_log()
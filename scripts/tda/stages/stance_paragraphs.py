@@ -0,0 +1,291 @@
+"""
+Project: Theory Discourse Analysis
+
+Classify theory-relevant paragraphs by stance toward the target theory with LLM ratings; the
+logic of 06_stance_classification/06_classify_stance_paragraphs_gpt4.py, which documents the options.
+"""
+
+
+import argparse
+import asyncio
+import logging
+import os
+import re
+
+from tda.journal import Journal
+from tda.batch import export_requests, ingest_results
+from tda.labels import LabelExtractor
+
+logger = logging.getLogger('rating_log')
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--model", type=str, default="gpt-4", help="OpenAI model name")
+parser.add_argument("-i", "--input", type=str, required=True, help="input csv file")
+parser.add_argument("-o", "--output", type=str, required=True, help="output csv file")
+parser.add_argument("--long_format", action="store_true", help="input csv has one row per paragraph (filename, paragraph_id, text)")
+parser.add_argument("--async_requests", action="store_true", help="submit requests concurrently instead of one at a time")
+parser.add_argument("--concurrency", type=int, default=8, help="maximum number of requests in flight (async mode)")
+parser.add_argument("--rpm", type=float, default=None, help="client-side limit for requests per minute (async mode)")
+parser.add_argument("--tpm", type=float, default=None, help="client-side limit for tokens per minute (async mode)")
+parser.add_argument("--cache", type=str, default=None, help="SQLite response cache shared across stages and reruns")
+parser.add_argument("--cache_size", type=int, default=200000, help="maximum number of cached responses (LRU eviction)")
+parser.add_argument("--telemetry", type=str, default=None, help="JSONL file for per-call latency, token, and retry metrics")
+parser.add_argument("--batch_export", type=str, default=None, help="write all chat requests to this JSONL file and exit")
+parser.add_argument("--batch_ingest", type=str, default=None, help="read batch results from this JSONL file instead of calling the API")
+parser.add_argument("--resume", action="store_true", help="continue from the journal of a previous run")
+parser.add_argument("--max_reasks", type=int, default=2, help="maximum number of re-asks for an answer without a readable label")
+parser.add_argument("--pack_size", type=int, default=1, help="number of paragraphs per request (packing mode if > 1)")
+
+QUERY = """Human rates will be given three paragraphs of scientific articles, and they will have to categorize each paragraph into four categories, \
+        depending on how they relate to the concept of memory decay. The concept of memory decay in psychology describe the theory that \
+        memories traces are stored with an initial strength value and that this strength decays passively over time unless it is reactivated. \
+        They will receive the following instructions: Instructions for human raters: You will read an articcle about human memory and you \
+        should classify each article depending on how it discusses the idea that the strength of memories decay passively over time. \
+        You can assign one of four categories to the text. Use the following questions in this order to assign the categories: - \
+        Does the text disagree with the idea that memory decay exists or disagree with the idea that it is the major cause of forgetting? \
+        If so, respond 'against'. \
+        Only assign this category if the text explicitly rejects all forms of memory decay, rather than just some version of it. \
+        Does the article implicitly assume that the concept of memory decay is true and then builds on it? If so, respond 'tacit_acceptance'. \
+        Assign this category if the text doesn't explicitly mention or discuss evidence for or against the general idea. \
+        Does the article explicitly agree with or provide evidence for the idea that memory decays over time? If so, respond 'support'. \
+        Only assign this category if the text specifically discusses evidence for the idea, or explicitly agrees that the idea is true. \
+        Does the text explicitly mention memory decay as one of several possibilities without discussing evidence for or against or without \
+        assuming it's true? If so, respond 'ambiguous'. \
+        Only assign this category if 'tacit_acceptance' doesn't fit.\n\n \
+        Provide a clear category label ("ambiguous" or "support" or "against" or "tacit acceptance") on the first line for the paragraph below followed by your rationale in a new paragraph."""
+
+
+def check_args(args):
+    if args.pack_size > 1 and (args.batch_export or args.batch_ingest):
+        parser.error("--pack_size cannot be combined with --batch_export or --batch_ingest")
+
+
+def make_extractor(max_reasks=2):
+    # translate rating to distinct id; "neutral" is the relevance prompt's name for "ambiguous"
+    return LabelExtractor({"ambiguous": 0, "against": 1, "support": 2, "tacit_acceptance": 3},
+                          aliases={"neutral": "ambiguous"},
+                          max_reasks=max_reasks)
+
+
+def chatGPT_rate_category(args, extractor, query, paragraph, filename, paragraph_idx=None):
+    from tda.llm import completion_with_backoff
+
+    if paragraph_idx is None:
+        logger.info(f"Rating paragraph for {filename}")
+    else:
+        logger.info(f"Rating paragraph {paragraph_idx} for {filename}")
+
+    messages = [{"role": "system", "content" : query},
+                {"role": "user", "content" : paragraph},
+                ]
+
+    # define parameters
+    model_engine = args.model
+    temperature = 0.0
+
+    # submit the QUERY; answers without a readable label are re-asked
+    result = extractor.complete(
+        completion_with_backoff,
+        filename = filename,
+        model = model_engine,
+        messages = messages,
+        temperature = temperature)
+
+    # tolerant of blank lines, punctuation, markup, and alias spellings (see tda/labels.py)
+    category_id, rationale = extractor.parse(result)
+
+    return category_id, rationale
+
+
+def paragraph_items(df_in, long_format=False):
+    """
+    List of ((filename, paragraph_id), text) for every non-empty paragraph of the input table,
+    each paragraph once even if several queries selected it. Paragraphs without an id are
+    left out (and logged): they cannot be told apart, so their rating stays NA.
+    """
+    import pandas as pd
+
+    if long_format:
+        rows = zip(df_in["filename"], as_paragraph_ids(df_in["paragraph_id"]), df_in["text"])
+    else:
+        rows = ((filename, paragraph_id, text) for p in paragraph_columns(df_in)
+                for filename, paragraph_id, text in zip(df_in["filename"], paragraph_ids(df_in, p), df_in[f"p{p}"]))
+
+    items, missing = [], 0
+    for filename, paragraph_id, text in rows:
+        if pd.isna(text):
+            continue
+        if paragraph_id is None:
+            missing += 1
+            continue
+        items.append(((filename, paragraph_id), text))
+    if missing:
+        logger.warning(f"SKIPPING {missing} paragraphs without a paragraph id")
+    if long_format:
+        return list(dict(items).items())
+
+    # article by article, in paragraph order
+    order = {}
+    for filename in df_in["filename"]:
+        order.setdefault(filename, len(order))
+    return sorted(dict(items).items(), key=lambda item: (order[item[0][0]], item[0][1]))
+
+
+def paragraph_columns(df_in):
+    """Numbers k of the p<k> paragraph columns of a wide input table, in ascending order."""
+    return sorted(int(c[1:]) for c in df_in.columns if re.fullmatch(r"p\d+", c))
+
+
+def as_paragraph_ids(values):
+    """Integer paragraph ids, None where the id is missing."""
+    import pandas as pd
+
+    return [None if pd.isna(i) else int(i) for i in values]
+
+
+def paragraph_ids(df_in, p):
+    """
+    Paragraph ids of column p<p>: p<p>_paragraph_id where the table has it (05_select_paragraphs.py),
+    else the column number, as in tables without ids (one row per article).
+    """
+    if f"p{p}_paragraph_id" not in df_in.columns:
+        return [p] * len(df_in)
+    return as_paragraph_ids(df_in[f"p{p}_paragraph_id"])
+
+
+async def rate_paragraphs_async(args, extractor, query, items, journal):
+    """Rate paragraphs concurrently (or args.pack_size at a time per request); results are journaled as they arrive."""
+    from tda.llm import AsyncChatClient
+    from tda.packing import complete_packed
+
+    def record(key, result):
+        category_id, rationale = extractor.parse(result)
+        journal.append({"filename": key[0], "paragraph": key[1], "rating": category_id, "rationale": rationale})
+
+    concurrency = args.concurrency if args.async_requests else 1
+    async with AsyncChatClient(concurrency, args.rpm, args.tpm) as client:
+        return await complete_packed(client, query, items, args.pack_size, record, extractor, model=args.model, temperature=0.0)
+
+
+def materialise_ratings(df_in, journal, long_format=False):
+    results = journal.results("filename", "paragraph")
+    df_out = df_in.copy()
+    if long_format:
+        records = [results.get((filename, p), {"rating": "NA", "rationale": "NA"})
+                   for filename, p in zip(df_out["filename"], as_paragraph_ids(df_out["paragraph_id"]))]
+        df_out["rating_category"] = [r["rating"] for r in records]
+        df_out["rating_rationale"] = [r["rationale"] for r in records]
+        return df_out
+
+    for p in paragraph_columns(df_in):
+        records = [results.get((filename, paragraph_id), {"rating": "NA", "rationale": "NA"})
+                   for filename, paragraph_id in zip(df_out["filename"], paragraph_ids(df_in, p))]
+        df_out[f"p{p}_rating_category"] = [r["rating"] for r in records]
+        df_out[f"p{p}_rating_rationale"] = [r["rationale"] for r in records]
+    return df_out
+
+
+def run(args, df_in=None):
+    """
+    Rate the paragraphs of args.input (or of df_in, e.g. the table returned by the paragraph
+    selection stage) and write <output>.csv; returns the table (None with --batch_export).
+    """
+    import datetime, platform
+    import openai
+    import pandas as pd
+    from dotenv import load_dotenv
+    from tqdm import tqdm
+    from tda.logs import close_log, log_to_file
+    from tda.runtime import LLMRuntime
+
+    check_args(args)
+    log_to_file(f"{args.output}.log", resume=args.resume)
+    extractor = make_extractor(args.max_reasks)
+    load_dotenv()
+
+    run_info = {
+        "timestamp_utc": datetime.datetime.utcnow().isoformat(),
+        "model": args.model,
+        "temperature": 0.0,
+        "iterations": getattr(args, "iterations", None),
+        "pack_size": args.pack_size,
+        "long_format": args.long_format,
+        "async_requests": args.async_requests,
+        "concurrency": args.concurrency if args.async_requests else 1,
+        "max_reasks": args.max_reasks,
+        "python": platform.python_version(),
+    }
+    logger.info(f"RUN_INFO {run_info}")
+
+    # set OpenAI key
+    openai.api_key = os.getenv("GPT4_KEY")
+
+    try:
+        with LLMRuntime(args, stage="06_stance_paragraphs") as runtime:
+            if df_in is None:
+                input_csv = args.input
+
+                print(f"READING FILE {input_csv}...\n")
+                logger.info(f"READING FILE {input_csv}")
+                df_in = pd.read_csv(input_csv)
+
+            # one item per paragraph, from wide (p1, p2, ...) or long (filename, paragraph_id, text) input
+            items = paragraph_items(df_in, args.long_format)
+            print(f"PARAGRAPHS: {len(items)} in {df_in['filename'].nunique()} articles\n")
+
+            if args.batch_export:
+                # write every request to one file for a bulk endpoint; nothing is sent
+                print(f"EXPORTING REQUESTS to {args.batch_export}...\n")
+                n_requests = export_requests(args.batch_export, (
+                    (filename, 1, p, {
+                        "model": args.model,
+                        "messages": [{"role": "system", "content" : QUERY},
+                                     {"role": "user", "content" : paragraph},
+                                     ],
+                        "temperature": 0.0})
+                    for (filename, p), paragraph in items))
+                logger.info(f"EXPORTED {n_requests} requests to {args.batch_export}")
+                print(f"EXPORTED {n_requests} requests")
+                print("DONE")
+                return None
+
+            journal = Journal(f"{args.output}.jsonl", resume=args.resume)
+            done = journal.completed("filename", "paragraph")
+            if done:
+                print(f"RESUMING: {len(done)} paragraph ratings already journaled\n")
+                logger.info(f"RESUMING with {len(done)} journaled paragraph ratings from {args.output}.jsonl")
+
+            if args.batch_ingest:
+                print(f"INGESTING RESULTS from {args.batch_ingest}...\n")
+                n_ingested, n_failed = ingest_results(args.batch_ingest, journal, extractor, done, field="paragraph")
+                print(f"INGESTED {n_ingested} results ({n_failed} failed requests)")
+                logger.info(f"INGESTED {n_ingested} results, {n_failed} failed requests from {args.batch_ingest}")
+            elif args.pack_size > 1 or args.async_requests:
+                print("RATING ARTICLES...\n")
+                logger.info(f"RATING ARTICLES ({args.concurrency if args.async_requests else 1} concurrent requests, packs of {args.pack_size})")
+                n_retries = asyncio.run(rate_paragraphs_async(args, extractor, QUERY, [item for item in items if item[0] not in done], journal))
+                if args.pack_size > 1:
+                    print(f"PACKED: {n_retries} paragraphs retried individually")
+                    logger.info(f"PACKED {n_retries} paragraphs retried individually")
+            else:
+                print("RATING ARTICLES...\n")
+                logger.info(f"RATING ARTICLES")
+                # rate each paragraph; every result is journaled as it arrives
+                for (filename, p), paragraph in tqdm(items):
+                    if (filename, p) in done:
+                        continue
+                    category_id, rationale = chatGPT_rate_category(args, extractor, QUERY, paragraph, filename, paragraph_idx=p)
+                    journal.append({"filename": filename, "paragraph": p, "rating": category_id, "rationale": rationale})
+            journal.close()
+
+            # write the csv once
+            logger.info(f"SAVING RATINGS to {args.output}.csv")
+            df_final = materialise_ratings(df_in, journal, args.long_format)
+            df_final.to_csv(f"{args.output}.csv", index=False)
+
+            runtime.report(extractor)
+
+            print("DONE")
+            return df_final
+    finally:
+        close_log()
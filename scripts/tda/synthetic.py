@@ -0,0 +1,79 @@
+"""
+Project: Theory Discourse Analysis
+
+Synthetic TEI corpus for benchmarks and tests without real articles.
+
+Each article is a GROBID-style TEI file with title, date, authors, DOI and MD5 identifiers,
+an abstract, and body paragraphs, readable by tda/tei.py. Texts are random word sequences:
+"relevant" articles mix theory vocabulary (decay, forgetting, retention, ...) into memory
+research vocabulary, the others use off-topic vocabulary (animal studies, ageing, ...), so
+lexical prefilters, embedding selection, and local classifiers behave plausibly.
+
+Notes:
+- Deterministic for a given seed
+- Only a share of the body paragraphs of relevant articles carries theory vocabulary, so
+  paragraph selection has something to select
+"""
+
+
+import os
+import random
+from xml.sax.saxutils import escape
+
+THEORY_WORDS = ("decay forgetting trace strength retention interval passive rehearsal reactivation "
+                "activation loss time delay").split()
+MEMORY_WORDS = ("memory recall recognition list items working term long interference encoding "
+                "retrieval cue span test").split()
+OFF_TOPIC_WORDS = ("rats mice hippocampus lesion aging older adults dementia neurons sleep attention "
+                   "perception reading language motor vision reward").split()
+FILLER_WORDS = ("study results participants experiment we show data effect analysis condition group "
+                "trial task performance evidence model findings").split()
+
+TEI_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader><fileDesc><titleStmt><title level="a" type="main">{title}</title></titleStmt>
+<publicationStmt><date type="published" when="{year}">{year}</date></publicationStmt>
+<sourceDesc><biblStruct><analytic>{authors}<idno type="MD5">{md5}</idno><idno type="DOI">{doi}</idno></analytic></biblStruct></sourceDesc></fileDesc>
+<profileDesc><abstract>
+<div><p>{abstract}</p></div></abstract></profileDesc></teiHeader><text><body>{body}</body></text></TEI>
+"""
+
+
+def _text(rng, topic_words, n_words, topic_share=0.4):
+    words = [rng.choice(topic_words) if rng.random() < topic_share else rng.choice(FILLER_WORDS)
+             for _ in range(n_words)]
+    return " ".join(words).capitalize() + "."
+
+
+def tei_document(i, rng, n_paragraphs=20, relevant=True, theory_share=0.2, words_per_paragraph=80):
+    topic_words = THEORY_WORDS + MEMORY_WORDS if relevant else OFF_TOPIC_WORDS + MEMORY_WORDS
+    paragraphs = []
+    for _ in range(n_paragraphs):
+        on_theory = relevant and rng.random() < theory_share
+        words = THEORY_WORDS + MEMORY_WORDS if on_theory else MEMORY_WORDS + OFF_TOPIC_WORDS
+        paragraphs.append(_text(rng, words, words_per_paragraph))
+
+    authors = "".join(f"<author><persName><forename>{escape(first)}</forename><surname>{escape(last)}{i}</surname></persName></author>"
+                      for first, last in (("Ann", "Smith"), ("Bob", "Jones"))[:rng.randint(1, 2)])
+    return TEI_TEMPLATE.format(
+        title=escape(_text(rng, topic_words, 8).rstrip(".")),
+        year=rng.randint(1960, 2023),
+        authors=authors,
+        md5=f"{i:032X}",
+        doi=f"10.9999/synthetic.{i}",
+        abstract=escape(_text(rng, topic_words, 150)),
+        body="".join(f"<div><p>{escape(p)}</p></div>" for p in paragraphs),
+    )
+
+
+def write_synthetic_corpus(directory, n_articles=50, n_paragraphs=20, relevant_share=0.5, seed=1):
+    """Write n_articles TEI files to directory and return their filenames."""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    filenames = []
+    for i in range(n_articles):
+        filename = f"synthetic_{i:05d}.xml"
+        document = tei_document(i, rng, n_paragraphs, relevant=rng.random() < relevant_share)
+        with open(os.path.join(directory, filename), "w", encoding="utf-8") as f:
+            f.write(document)
+        filenames.append(filename)
+    return filenames
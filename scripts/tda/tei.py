@@ -0,0 +1,176 @@
+"""
+Project: Theory Discourse Analysis
+
+Streaming extraction of article metadata from TEI XML files (e.g., GROBID output).
+
+Notes:
+- Uses iterparse and clears elements once they are no longer needed, so memory per
+  file stays small regardless of body length
+- read_tei_record stops at the end of <teiHeader>: title, abstract, DOI, date, and authors
+  all live in the header, and the (much larger) body and reference list are never read.
+  DOIs of cited works in the reference list can therefore no longer be mistaken for
+  the article DOI when the header has none
+- read_tei_document additionally walks the body for paragraph texts (used by the corpus index);
+  only <p> elements inside <body> count, so abstract paragraphs are never selected as body text
+- read_article_key falls back to a fingerprint of the normalised text for files without an
+  MD5 idno (e.g., TEI not produced by GROBID), so deduplication does not have to skip them
+- Missing fields are reported as "NA", as in the original per-file ET.parse extraction
+"""
+
+
+import os
+import hashlib
+import xml.etree.ElementTree as ET
+
+TEI_NS = "{http://www.tei-c.org/ns/1.0}"
+
+TEI_FIELDS = ["filename", "title", "abstract", "DOI", "date", "authors"]
+
+
+def _parse_tei(path, full=False):
+    record = {field: "NA" for field in TEI_FIELDS}
+    record["filename"] = os.path.basename(path)
+    record["md5"] = None
+    record["has_abstract"] = False
+    record["paragraphs"] = []
+
+    seen = set()
+    authors = []
+    in_file_desc = False
+    in_body = False
+    # > 0 while inside an element whose full text is read at its end tag
+    keep = 0
+
+    with open(path, "rb") as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                if tag == f"{TEI_NS}fileDesc":
+                    in_file_desc = True
+                elif tag == f"{TEI_NS}body":
+                    in_body = True
+                elif tag in (f"{TEI_NS}abstract", f"{TEI_NS}persName", f"{TEI_NS}p"):
+                    keep += 1
+                continue
+
+            # only the first matching element counts, even if it is empty
+            if tag == f"{TEI_NS}title" and in_file_desc and "title" not in seen:
+                seen.add("title")
+                if elem.text is not None:
+                    record["title"] = elem.text
+            elif tag == f"{TEI_NS}date" and in_file_desc and "date" not in seen:
+                seen.add("date")
+                if elem.text is not None:
+                    record["date"] = elem.text
+            elif tag == f"{TEI_NS}idno" and elem.get("type") == "DOI" and "DOI" not in seen:
+                seen.add("DOI")
+                if elem.text is not None:
+                    record["DOI"] = elem.text
+            elif tag == f"{TEI_NS}idno" and elem.get("type") == "MD5" and "md5" not in seen:
+                seen.add("md5")
+                if elem.text is not None and elem.text.strip():
+                    record["md5"] = elem.text.strip()
+            elif tag == f"{TEI_NS}abstract":
+                keep -= 1
+                if "abstract" not in seen:
+                    seen.add("abstract")
+                    if elem.text is not None:
+                        record["has_abstract"] = True
+                        record["abstract"] = ''.join(elem.itertext()).strip("\n")
+            elif tag == f"{TEI_NS}persName":
+                keep -= 1
+                if in_file_desc:
+                    authors.append(' '.join(elem.itertext()))
+            elif tag == f"{TEI_NS}p":
+                keep -= 1
+                # all non-empty <p> elements of the body; abstract paragraphs are not body text
+                text = "".join(elem.itertext()).strip()
+                if text and in_body:
+                    record["paragraphs"].append(text)
+            elif tag == f"{TEI_NS}fileDesc":
+                in_file_desc = False
+            elif tag == f"{TEI_NS}body":
+                in_body = False
+            elif tag == f"{TEI_NS}teiHeader" and not full:
+                break
+
+            if keep == 0:
+                elem.clear()
+
+    if authors:
+        record["authors"] = "\n".join(authors)
+    return record
+
+
+def read_tei_record(path):
+    """Extract filename, title, abstract, DOI, date, and authors from one TEI file."""
+    record = _parse_tei(path)
+    return {field: record[field] for field in TEI_FIELDS}
+
+
+def read_tei_document(path):
+    """
+    Parse a whole TEI file: the metadata fields of read_tei_record plus the MD5 idno,
+    an abstract flag, and the text of every non-empty paragraph of <body>.
+    """
+    return _parse_tei(path, full=True)
+
+
+def read_md5(path):
+    """Return the text of the first <idno type="MD5"> (content hash of the source PDF); ValueError if it is missing or empty."""
+    with open(path, "rb") as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == f"{TEI_NS}idno" and elem.get("type") == "MD5":
+                # an empty idno is no hash: the caller falls back as if there were none
+                if elem.text is None or not elem.text.strip():
+                    raise ValueError("empty <idno type=\"MD5\"> in TEI header")
+                return elem.text.strip()
+            if elem.tag == f"{TEI_NS}teiHeader":
+                break
+            elem.clear()
+    raise ValueError("no <idno type=\"MD5\"> in TEI header")
+
+
+def document_text(document):
+    """Text used for content comparisons: the abstract and all body paragraphs, else the title."""
+    parts = [document["abstract"]] if document["abstract"] != "NA" and document["abstract"].strip() else []
+    parts += document["paragraphs"]
+    if parts:
+        return "\n".join(parts)
+    return document["title"] if document["title"] != "NA" else ""
+
+
+def text_fingerprint(text):
+    """MD5 of the normalised text (lowercase, collapsed whitespace), prefixed to tell it apart from MD5 idnos."""
+    normalised = " ".join(text.lower().split())
+    if not normalised:
+        raise ValueError("no text to fingerprint")
+    return "text:" + hashlib.md5(normalised.encode("utf-8")).hexdigest()
+
+
+def read_article_key(path):
+    """MD5 idno of a TEI file, or a fingerprint of its text when the header has none (or an empty one)."""
+    try:
+        return read_md5(path)
+    except ValueError:
+        return text_fingerprint(document_text(read_tei_document(path)))
+
+
+def has_abstract(path):
+    """True if the first <abstract> exists and has text content (as in the original ET.parse check)."""
+    with open(path, "rb") as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == f"{TEI_NS}abstract":
+                return elem.text is not None
+            if elem.tag == f"{TEI_NS}teiHeader":
+                break
+    return False
+
+
+def collect_columns(records, fields=TEI_FIELDS):
+    """Gather records into one list per field, ready for a columnar table (e.g., pd.DataFrame)."""
+    columns = {field: [] for field in fields}
+    for record in records:
+        for field in fields:
+            columns[field].append(record[field])
+    return columns
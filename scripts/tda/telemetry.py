@@ -0,0 +1,173 @@
+"""
+Project: Theory Discourse Analysis
+
+Structured per-call telemetry for the chat completions of the classification scripts.
+
+Every completion call made through tda/llm.py (serial or async, including re-asks and
+packed requests) is recorded as one JSON line with the stage, filename, iteration, model,
+wall latency, time spent waiting for the concurrency/rate limits, prompt and completion
+tokens, retries, cumulative backoff wait, and whether the response cache answered it.
+At the end of a run, summary() aggregates throughput, p50/p95/p99 latency, and token
+totals per stage, and write_prometheus() writes the same summary in the Prometheus text
+exposition format.
+
+Notes:
+- Enabled per process with tda.llm.set_telemetry(); without it nothing is recorded
+- Retries and backoff waits are attributed to the call that incurred them through a
+  context variable, so concurrent async calls do not mix up their counts
+- Latency percentiles and token totals only cover calls that reached the API; cache hits
+  are counted separately
+- python tda/telemetry.py FILE [FILE ...] summarises the telemetry files of several stages
+"""
+
+
+import argparse
+import contextvars
+import json
+import os
+import time
+
+import numpy as np
+
+# retries, backoff wait, and rate-limit wait of the call currently running in this context
+current_call = contextvars.ContextVar("current_call", default=None)
+
+
+def start_call():
+    stats = {"retries": 0, "backoff_s": 0.0, "wait_s": 0.0}
+    current_call.set(stats)
+    return stats
+
+
+def record_backoff(details):
+    stats = current_call.get()
+    if stats is not None:
+        stats["retries"] += 1
+        stats["backoff_s"] += details["wait"]
+
+
+class Telemetry:
+    """Append-only JSONL file of per-call metrics, kept in memory for the end-of-run summary."""
+
+    def __init__(self, path, stage, resume=False):
+        self.path = path
+        self.stage = stage
+        self.records = []
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def record(self, filename, iteration, model, latency_s, wait_s=0.0, usage=None, retries=0,
+               backoff_s=0.0, cache_hit=False, error=None):
+        usage = usage or {}
+        record = {
+            "timestamp": time.time(),
+            "stage": self.stage,
+            "filename": filename,
+            "iteration": iteration,
+            "model": model,
+            "latency_s": round(latency_s, 4),
+            "wait_s": round(wait_s, 4),
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+            "retries": retries,
+            "backoff_s": round(backoff_s, 3),
+            "cache_hit": cache_hit,
+            "error": error,
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.records.append(record)
+
+    def summary(self):
+        return summarise(self.records)
+
+    def write_prometheus(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(prometheus_text(self.summary()))
+
+    def close(self):
+        self._file.close()
+
+
+def summarise(records):
+    """Per-stage summary of call records (e.g. read back from one or more telemetry files)."""
+    stages = {}
+    for stage in sorted({r["stage"] for r in records}):
+        calls = [r for r in records if r["stage"] == stage]
+        api = [r for r in calls if not r["cache_hit"]]
+        latency = np.asarray([r["latency_s"] for r in api], dtype=float)
+        start = min(r["timestamp"] - r["latency_s"] - r["wait_s"] for r in calls)
+        elapsed = max(r["timestamp"] for r in calls) - start
+
+        def total(field):
+            return int(sum(r[field] or 0 for r in api))
+
+        stages[stage] = {
+            "calls": len(calls),
+            "api_calls": len(api),
+            "cache_hits": len(calls) - len(api),
+            "errors": sum(r["error"] is not None for r in calls),
+            "elapsed_s": round(elapsed, 2),
+            "calls_per_s": round(len(calls) / elapsed, 3) if elapsed > 0 else None,
+            "latency_p50_s": round(float(np.percentile(latency, 50)), 3) if len(latency) else None,
+            "latency_p95_s": round(float(np.percentile(latency, 95)), 3) if len(latency) else None,
+            "latency_p99_s": round(float(np.percentile(latency, 99)), 3) if len(latency) else None,
+            "wait_s": round(sum(r["wait_s"] for r in api), 2),
+            "retries": sum(r["retries"] for r in api),
+            "backoff_s": round(sum(r["backoff_s"] for r in api), 2),
+            "prompt_tokens": total("prompt_tokens"),
+            "completion_tokens": total("completion_tokens"),
+        }
+    return stages
+
+
+def read_telemetry(*paths):
+    records = []
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            records += [json.loads(line) for line in f if line.strip()]
+    return records
+
+
+def prometheus_text(summary):
+    """Prometheus text exposition of a summarise() result."""
+    metrics = [
+        ("tda_llm_calls_total", "counter", "Completion calls, including cache hits", "calls", {}),
+        ("tda_llm_api_calls_total", "counter", "Completion calls that reached the API", "api_calls", {}),
+        ("tda_llm_cache_hits_total", "counter", "Completion calls answered by the response cache", "cache_hits", {}),
+        ("tda_llm_errors_total", "counter", "Completion calls that raised an error", "errors", {}),
+        ("tda_llm_retries_total", "counter", "Retries after API errors", "retries", {}),
+        ("tda_llm_backoff_seconds_total", "counter", "Time spent in backoff waits", "backoff_s", {}),
+        ("tda_llm_wait_seconds_total", "counter", "Time spent waiting for concurrency and rate limits", "wait_s", {}),
+        ("tda_llm_tokens_total", "counter", "Tokens reported by the API", "prompt_tokens", {"type": "prompt"}),
+        ("tda_llm_tokens_total", "counter", None, "completion_tokens", {"type": "completion"}),
+        ("tda_llm_calls_per_second", "gauge", "Completion calls per second of stage wall time", "calls_per_s", {}),
+        ("tda_llm_latency_seconds", "summary", "Wall latency of API calls", "latency_p50_s", {"quantile": "0.5"}),
+        ("tda_llm_latency_seconds", "summary", None, "latency_p95_s", {"quantile": "0.95"}),
+        ("tda_llm_latency_seconds", "summary", None, "latency_p99_s", {"quantile": "0.99"}),
+    ]
+    lines = []
+    for name, kind, help_text, field, labels in metrics:
+        if help_text is not None:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for stage, values in summary.items():
+            if values[field] is None:
+                continue
+            label_text = ",".join(f'{k}="{v}"' for k, v in dict(stage=stage, **labels).items())
+            lines.append(f"{name}{{{label_text}}} {values[field]}")
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise telemetry files of one or more stages")
+    parser.add_argument("paths", type=str, nargs="+", help="telemetry JSONL files")
+    parser.add_argument("--prometheus", type=str, default=None, help="also write the summary in Prometheus text format")
+    args = parser.parse_args()
+
+    summary = summarise(read_telemetry(*args.paths))
+    for stage, values in summary.items():
+        print(f"{stage}: {values}")
+    if args.prometheus:
+        with open(args.prometheus, "w", encoding="utf-8") as f:
+            f.write(prometheus_text(summary))
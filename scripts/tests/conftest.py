@@ -0,0 +1,11 @@
+"""
+Project: Theory Discourse Analysis
+
+Shared pytest setup: the tests import tda/ as the stage scripts do, from the scripts directory.
+"""
+
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
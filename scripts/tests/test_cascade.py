@@ -0,0 +1,26 @@
+"""
+Project: Theory Discourse Analysis
+
+Tests of the training labels of the relevance cascade (tda/cascade.py).
+"""
+
+
+import pandas as pd
+
+from tda.cascade import rating_labels
+
+
+def test_rating_labels_skip_cascade_decisions():
+    ratings = pd.DataFrame({
+        "filename": ["a.xml", "b.xml", "c.xml", "d.xml", "e.xml"],
+        "abstract": ["A", "B", "C", "D", "E"],
+        "mean_rating_relevance": [0.8, 0.2, 1.0, 0.0, "NA"],
+        "cascade_decision": ["llm", "llm", "relevant", "irrelevant", "llm"],
+    })
+    labels = rating_labels(ratings, threshold=0.5)
+    assert labels.to_dict("list") == {"filename": ["a.xml", "b.xml"], "abstract": ["A", "B"], "label": [1.0, 0.0]}
+
+
+def test_rating_labels_without_cascade():
+    ratings = pd.DataFrame({"filename": ["a.xml", "b.xml"], "abstract": ["A", "B"], "mean_rating_relevance": [0.5, 0.4]})
+    assert rating_labels(ratings, threshold=0.5)["label"].tolist() == [1.0, 0.0]
@@ -0,0 +1,54 @@
+"""
+Project: Theory Discourse Analysis
+
+Tests of the PDF conversion stage (tda/stages/convert_pdfs.py) against the GROBID stub
+(tda/grobid_stub.py).
+"""
+
+
+import os
+
+import pytest
+
+from tda.grobid_stub import start_grobid_stub
+from tda.stages import convert_pdfs
+
+CONCURRENCY = 2
+
+
+@pytest.fixture
+def pdf_dir(tmp_path):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    for i in range(6):
+        (pdf_dir / f"article_{i}.pdf").write_bytes(f"%PDF-1.4 article {i}".encode())
+    (pdf_dir / "broken_scan.pdf").write_bytes(b"%PDF-1.4 unreadable scan")
+    return pdf_dir
+
+
+def convert(pdf_dir, tei_dir, stub):
+    args = convert_pdfs.parser.parse_args([
+        "-i", str(pdf_dir), "-o", str(tei_dir), "--grobid_url", f"http://127.0.0.1:{stub.server_address[1]}",
+        "--concurrency", str(CONCURRENCY), "--max_tries", "10", "--timeout", "10"])
+    try:
+        return convert_pdfs.run(args)
+    finally:
+        stub.shutdown()
+
+
+def test_convert_and_resume(pdf_dir, tmp_path):
+    tei_dir = tmp_path / "tei"
+
+    stub = start_grobid_stub(latency=0.02, error_rate_503=0.3, fail_pattern="broken", seed=3)
+    summary = convert(pdf_dir, tei_dir, stub)
+    assert summary == {"pdfs": 7, "skipped": 0, "duplicates": 0, "converted": 6, "failed": 1}
+    assert stub.stats["status_503"] > 0
+    assert stub.stats["max_in_flight"] <= CONCURRENCY
+    assert sorted(os.listdir(tei_dir)) == [f"article_{i}.grobid.tei.xml" for i in range(6)]
+
+    # the failed PDF is the only one sent again once GROBID can process it
+    stub = start_grobid_stub()
+    summary = convert(pdf_dir, tei_dir, stub)
+    assert summary == {"pdfs": 7, "skipped": 6, "duplicates": 0, "converted": 1, "failed": 0}
+    assert stub.stats["requests"] == 1
+    assert (tei_dir / "broken_scan.grobid.tei.xml").exists()
@@ -0,0 +1,44 @@
+"""
+Project: Theory Discourse Analysis
+
+The asynchronous request engine (tda/llm.py) must draw every attempt, retries included, from
+the client-side RPM/TPM budget.
+"""
+
+
+import asyncio
+
+import openai
+from openai.error import RateLimitError
+
+from tda.llm import AsyncChatClient
+
+
+def test_retries_pass_through_the_limiter(monkeypatch):
+    attempts = []
+
+    async def acreate(**kwargs):
+        attempts.append(kwargs)
+        if len(attempts) == 1:
+            raise RateLimitError("Rate limit reached")
+        return openai.util.convert_to_openai_object({"choices": [{"message": {"role": "assistant", "content": "relevant"}}]})
+
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", acreate)
+
+    async def complete():
+        async with AsyncChatClient(concurrency=1, rpm=60) as client:
+            acquired = []
+            acquire = client.limiter.acquire
+
+            async def count(tokens=0):
+                acquired.append(tokens)
+                await acquire(tokens)
+
+            client.limiter.acquire = count
+            completion = await client.complete(filename="a.xml", model="gpt-4",
+                                               messages=[{"role": "user", "content": "Rate this abstract."}])
+            return completion, acquired
+
+    completion, acquired = asyncio.run(complete())
+    assert completion["choices"][0]["message"]["content"] == "relevant"
+    assert len(attempts) == 2 and len(acquired) == 2
@@ -0,0 +1,111 @@
+"""
+Project: Theory Discourse Analysis
+
+Smoke tests of the mock API server (tda/mock_server.py) and the benchmark harness
+(benchmark/benchmark_pipeline.py) built on it.
+"""
+
+
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from tda.mock_server import start_mock_server
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(**kwargs):
+        server = start_mock_server(**kwargs)
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def post(url, payload):
+    """(status, JSON answer) of a POST request."""
+    request = urllib.request.Request(url, json.dumps(payload).encode("utf-8"), {"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def chat(base):
+    return post(f"{base}/chat/completions", {"model": "gpt-4", "messages": [{"role": "user", "content": "Rate this abstract."}]})
+
+
+def test_chat_and_embedding_responses(serve):
+    server, base = serve(response_text="relevant\n\nMock rationale.", embedding_dim=16)
+
+    status, answer = chat(base)
+    assert status == 200
+    assert answer["choices"][0]["message"] == {"role": "assistant", "content": "relevant\n\nMock rationale."}
+    usage = answer["usage"]
+    assert usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"]
+
+    status, answer = post(f"{base}/embeddings", {"model": "text-embedding-ada-002", "input": ["memory decay", "sleep"]})
+    assert status == 200
+    vectors = [item["embedding"] for item in sorted(answer["data"], key=lambda item: item["index"])]
+    assert [len(v) for v in vectors] == [16, 16]
+    assert all(math.isclose(sum(x * x for x in v), 1.0) for v in vectors)
+
+    with urllib.request.urlopen(f"{base}/stats") as response:
+        assert json.load(response) == {"chat_requests": 1, "chat_ok": 1, "embeddings_requests": 1, "embeddings_ok": 1}
+
+
+def test_injected_latency(serve):
+    _, base = serve(latency=0.2)
+    start = time.perf_counter()
+    assert chat(base)[0] == 200
+    assert time.perf_counter() - start >= 0.2
+
+
+def test_injected_errors(serve):
+    server, base = serve(error_rate_429=1.0)
+    status, answer = chat(base)
+    assert status == 429 and answer["error"]["type"] == "rate_limit_error"
+
+    server, base = serve(error_rate_5xx=1.0, seed=1)
+    assert {chat(base)[0] for _ in range(10)} <= {500, 502, 503}
+    assert server.stats["chat_requests"] == 10 and server.stats["chat_ok"] == 0
+
+
+def test_rpm_limit(serve):
+    server, base = serve(rpm_limit=2)
+    assert [chat(base)[0] for _ in range(3)] == [200, 200, 429]
+    assert server.stats["chat_429"] == 1
+
+
+def test_benchmark_smoke(tmp_path):
+    output = tmp_path / "results.csv"
+    process = subprocess.run(
+        [sys.executable, os.path.join(SCRIPTS_DIR, "benchmark", "benchmark_pipeline.py"),
+         "--stages", "04_relevance_async", "05_embed_paragraphs", "--articles", "4", "--paragraphs", "3",
+         "--iterations", "1", "--latency", "0", "--baselines", str(tmp_path / "baselines.json"),
+         "--save_baseline", "--output", str(output)],
+        capture_output=True, text=True, env=dict(os.environ, GPT4_KEY="mock"))
+    assert process.returncode == 0, process.stdout + process.stderr
+
+    results = pd.read_csv(output).set_index("stage")
+    assert (results["status"] == "ok").all()
+    assert results.loc["04_relevance_async", "requests"] == 4
+    assert not results["regression"].any()
+    with open(tmp_path / "baselines.json", encoding="utf-8") as f:
+        assert set(json.load(f)["default"]["stages"]) == {"04_relevance_async", "05_embed_paragraphs"}
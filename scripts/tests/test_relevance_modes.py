@@ -0,0 +1,47 @@
+"""
+Project: Theory Discourse Analysis
+
+The concurrent relevance screening (--async_requests) must produce the same CSV as the serial
+mode, checked against the local mock server (tda/mock_server.py).
+"""
+
+
+import filecmp
+import os
+
+import openai
+import pytest
+
+from tda.mock_server import start_mock_server
+from tda.stages import relevance
+from tda.synthetic import write_synthetic_corpus
+
+
+@pytest.fixture
+def mock_server():
+    server = start_mock_server(response_text="relevant\n\nMock rationale.", latency=0.01, seed=1)
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+
+
+def screen(tei_dir, output_dir, api_base, *extra):
+    args = relevance.parser.parse_args(["-i", str(tei_dir), "-o", str(output_dir), "--output_filename", "relevance",
+                                        "-iter", "3", "--workers", "1", "--api_base", api_base, *extra])
+    relevance.run(args)
+    return os.path.join(output_dir, "relevance.csv")
+
+
+def test_async_matches_serial(tmp_path, mock_server, monkeypatch):
+    monkeypatch.setenv("GPT4_KEY", "mock")
+    # the stage points the process-wide openai client at the mock
+    monkeypatch.setattr(openai, "api_base", openai.api_base)
+    write_synthetic_corpus(tmp_path / "tei", n_articles=8, n_paragraphs=3, seed=2)
+    (tmp_path / "serial").mkdir()
+    (tmp_path / "async").mkdir()
+
+    serial = screen(tmp_path / "tei", tmp_path / "serial", mock_server)
+    concurrent = screen(tmp_path / "tei", tmp_path / "async", mock_server, "--async_requests", "--concurrency", "4")
+
+    assert filecmp.cmp(serial, concurrent, shallow=False)
+    with open(serial, encoding="utf-8") as f:
+        assert "Mock rationale." in f.read()
@@ -0,0 +1,45 @@
+"""
+Project: Theory Discourse Analysis
+
+Tests of the paragraph keys of the paragraph stance stage (tda/stages/stance_paragraphs.py).
+"""
+
+
+import numpy as np
+import pandas as pd
+
+from tda.journal import Journal
+from tda.stages.stance_paragraphs import materialise_ratings, paragraph_items
+
+
+def test_wide_items_skip_missing_paragraph_ids(tmp_path):
+    # two queries of a.xml; the second query's p2 has text but no id
+    df_in = pd.DataFrame({
+        "query_id": [1, 2, 1],
+        "filename": ["a.xml", "a.xml", "b.xml"],
+        "p1": ["a7", "a2", "b1"],
+        "p1_paragraph_id": [7, 2, 1],
+        "p2": ["a9", "a-orphan", "b-orphan"],
+        "p2_paragraph_id": [9, np.nan, np.nan],
+    })
+    items = paragraph_items(df_in)
+    assert items == [(("a.xml", 2), "a2"), (("a.xml", 7), "a7"), (("a.xml", 9), "a9"), (("b.xml", 1), "b1")]
+
+    with Journal(str(tmp_path / "ratings.jsonl")) as journal:
+        for (filename, paragraph_id), text in items:
+            journal.append({"filename": filename, "paragraph": paragraph_id, "rating": 1, "rationale": text})
+        df_out = materialise_ratings(df_in, journal)
+    assert df_out["p1_rating_rationale"].tolist() == ["a7", "a2", "b1"]
+    assert df_out["p2_rating_rationale"].tolist() == ["a9", "NA", "NA"]
+
+
+def test_long_items_skip_missing_paragraph_ids(tmp_path):
+    df_in = pd.DataFrame({"filename": ["a.xml", "a.xml", "a.xml"], "paragraph_id": [3, np.nan, np.nan],
+                          "text": ["a3", "x", "y"]})
+    items = paragraph_items(df_in, long_format=True)
+    assert items == [(("a.xml", 3), "a3")]
+
+    with Journal(str(tmp_path / "ratings.jsonl")) as journal:
+        journal.append({"filename": "a.xml", "paragraph": 3, "rating": 2, "rationale": "r"})
+        df_out = materialise_ratings(df_in, journal, long_format=True)
+    assert df_out["rating_category"].tolist() == [2, "NA", "NA"]
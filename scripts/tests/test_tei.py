@@ -0,0 +1,47 @@
+"""
+Project: Theory Discourse Analysis
+
+Tests of the TEI extraction (tda/tei.py) and of deduplication on files without a usable MD5 idno.
+"""
+
+
+import pytest
+
+from tda.corpus_index import CorpusIndex
+from tda.grobid_stub import TEI_TEMPLATE
+from tda.stages.deduplicate import filter_duplicate_articles
+from tda.tei import read_article_key, read_md5, read_tei_document, text_fingerprint, document_text
+
+
+def write_tei(path, title, md5):
+    path.write_text(TEI_TEMPLATE.format(title=title, md5=md5), encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize("md5", ["", "  \n "])
+def test_empty_md5_falls_back_to_text(tmp_path, md5):
+    path = write_tei(tmp_path / "a.tei.xml", "A", md5)
+    with pytest.raises(ValueError):
+        read_md5(path)
+    document = read_tei_document(path)
+    assert document["md5"] is None
+    assert read_article_key(path) == text_fingerprint(document_text(document))
+
+
+@pytest.mark.parametrize("use_index", [False, True])
+def test_empty_md5_files_are_not_duplicates(tmp_path, use_index):
+    for title in ("A", "B", "C"):
+        write_tei(tmp_path / f"{title}.tei.xml", title, "")
+    write_tei(tmp_path / "D.tei.xml", "D", "0123ABCD")
+    index = CorpusIndex(":memory:") if use_index else None
+    duplicates, groups = filter_duplicate_articles(str(tmp_path), workers=1, index=index)
+    assert duplicates == []
+    assert len(groups) == 4
+
+
+def test_document_text_covers_abstract_and_body(tmp_path):
+    document = read_tei_document(write_tei(tmp_path / "a.tei.xml", "A", "0123ABCD"))
+    text = document_text(document)
+    assert text.startswith("Canned abstract of A")
+    assert text.endswith("Canned paragraph of A on interference in recall.")
+    assert document_text(dict(document, abstract="NA", paragraphs=[])) == "A"